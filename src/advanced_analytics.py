@@ -1,13 +1,50 @@
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
 import os
 from src.config import FIGURES_DIR
-from src.utils import indian_formatter
+from src.cube import as_cube, ROW_COUNT
+from src.plotting import PlotSpec, submit_figure
+
+def operational_maturity(cubes, keys=('state',)):
+    """
+    OMI = Total Updates / (Total Enrolments + Total Updates) per group of `keys`
+    (e.g. ['state'] or ['state', 'district']), sorted by OMI descending.
+    Needs the enrolment cube; biometric/demographic count as updates when present.
+    """
+    keys = list(keys)
+
+    # Prepare Enrolment
+    enrol_state = cubes['enrolment'].total(keys, name='Total_Enrolment')
+
+    # Prepare Updates (Biometric + Demographic)
+    total_updates_state = enrol_state[keys].assign(Total_Updates=0)
+    
+    for cat in ['biometric', 'demographic']:
+        if cat in cubes:
+            grp = cubes[cat].total(keys, name=f'Total_{cat}')
+            
+            # Merge to ensure alignment
+            total_updates_state = pd.merge(total_updates_state, grp[keys + [f'Total_{cat}']], 
+                                         on=keys, how='outer')
+            # Only the counts are filled: state may be categorical
+            total_updates_state = total_updates_state.fillna({'Total_Updates': 0, f'Total_{cat}': 0})
+            total_updates_state['Total_Updates'] += total_updates_state[f'Total_{cat}']
+
+    # Merge Enrolment and Updates
+    merged = pd.merge(enrol_state[keys + ['Total_Enrolment']], 
+                    total_updates_state[keys + ['Total_Updates']], 
+                    on=keys, how='inner')
+
+    # Calculate OMI
+    merged['Total_Volume'] = merged['Total_Enrolment'] + merged['Total_Updates']
+    merged['OMI'] = merged['Total_Updates'] / merged['Total_Volume']
+    
+    # Sort for visualization
+    return merged.sort_values('OMI', ascending=False)
 
 class AdvancedAnalytics:
     def __init__(self, datasets):
-        self.datasets = datasets
+        # Raw frames are folded into cubes once; all methods query the cubes
+        self.datasets = {cat: as_cube(df) for cat, df in datasets.items() if df is not None}
         self.figures_dir = FIGURES_DIR
         os.makedirs(self.figures_dir, exist_ok=True)
 
@@ -25,70 +62,26 @@ class AdvancedAnalytics:
             return None
             
         print("Calculating Operational Maturity Index (OMI)...")
-        
-        # Prepare Enrolment
-        enrol = self.datasets['enrolment']
-        numeric_enrol = enrol.select_dtypes(include=['number']).columns
-        # Exclude pincode, YearMonth if present
-        cols = [c for c in numeric_enrol if 'pincode' not in c and 'Year' not in c]
-        enrol_state = enrol.groupby('state')[cols].sum().reset_index()
-        enrol_state['Total_Enrolment'] = enrol_state[cols].sum(axis=1)
-
-        # Prepare Updates (Biometric + Demographic)
-        total_updates_state = pd.DataFrame({'state': enrol_state['state'], 'Total_Updates': 0})
-        
-        for cat in ['biometric', 'demographic']:
-            if cat in self.datasets:
-                df = self.datasets[cat]
-                numeric = df.select_dtypes(include=['number']).columns
-                cols_up = [c for c in numeric if 'pincode' not in c and 'Year' not in c]
-                grp = df.groupby('state')[cols_up].sum().reset_index()
-                grp[f'Total_{cat}'] = grp[cols_up].sum(axis=1)
-                
-                # Merge to ensure alignment
-                total_updates_state = pd.merge(total_updates_state, grp[['state', f'Total_{cat}']], 
-                                             on='state', how='outer').fillna(0)
-                total_updates_state['Total_Updates'] += total_updates_state[f'Total_{cat}']
-
-        # Merge Enrolment and Updates
-        merged = pd.merge(enrol_state[['state', 'Total_Enrolment']], 
-                        total_updates_state[['state', 'Total_Updates']], 
-                        on='state', how='inner')
-
-        # Calculate OMI
-        merged['Total_Volume'] = merged['Total_Enrolment'] + merged['Total_Updates']
-        merged['OMI'] = merged['Total_Updates'] / merged['Total_Volume']
-        
-        # Sort for visualization
-        merged = merged.sort_values('OMI', ascending=False)
-        
-        # Plot
-        plt.figure(figsize=(14, 8))
-        # Color bar logic
-        sc = plt.scatter(merged['OMI'], merged['Total_Volume'], 
-                    s=merged['Total_Volume'] / merged['Total_Volume'].max() * 1000, 
-                    alpha=0.6, c=merged['OMI'], cmap='RdYlGn')
-        
-        plt.colorbar(sc, label='Operational Maturity Index (Red=Growth, Green=Mature)')
+        merged = operational_maturity(self.datasets)
         
         # Annotate meaningful states (Top 5 Mature, Top 5 Growth, Top 5 Volume)
         annotate_mask = (merged['OMI'].rank(ascending=False) <= 5) | \
                         (merged['OMI'].rank(ascending=True) <= 5) | \
                         (merged['Total_Volume'].rank(ascending=False) <= 5)
-                        
-        for idx, row in merged[annotate_mask].iterrows():
-            plt.text(row['OMI'], row['Total_Volume'], row['state'], fontsize=8)
+        texts = [(row['OMI'], row['Total_Volume'], row['state'], 8)
+                 for idx, row in merged[annotate_mask].iterrows()]
 
-        plt.title('Operational Maturity vs. Scale: Identifying Growth Frontiers')
-        plt.xlabel('Operational Maturity Index (Updates Share)')
-        plt.ylabel('Total Transaction Volume')
-        plt.gca().yaxis.set_major_formatter(indian_formatter)
-        plt.axvline(0.5, linestyle='--', color='gray', alpha=0.5)
-        plt.tight_layout()
-        
-        output_path = os.path.join(self.figures_dir, 'operational_maturity_bubble.png')
-        plt.savefig(output_path)
-        plt.close()
+        # Plot (bubble size ~ volume, color bar ~ OMI)
+        submit_figure(PlotSpec(
+            'scatter', os.path.join(self.figures_dir, 'operational_maturity_bubble.png'),
+            x=merged['OMI'].values, y=merged['Total_Volume'].values,
+            s=(merged['Total_Volume'] / merged['Total_Volume'].max() * 1000).values,
+            alpha=0.6, c=merged['OMI'].values, cmap='RdYlGn',
+            colorbar='Operational Maturity Index (Red=Growth, Green=Mature)',
+            texts=texts, figsize=(14, 8),
+            title='Operational Maturity vs. Scale: Identifying Growth Frontiers',
+            xlabel='Operational Maturity Index (Updates Share)', ylabel='Total Transaction Volume',
+            y_formatter=True, axvline=dict(x=0.5, linestyle='--', color='gray', alpha=0.5)))
         
         return merged
 
@@ -101,18 +94,13 @@ class AdvancedAnalytics:
             return
 
         print("Generating Temporal Heatmap...")
-        df = self.datasets['enrolment'].copy()
-        
-        # Feature Engineering
-        df['Month'] = df['date'].dt.month_name()
-        df['DayOfWeek'] = df['date'].dt.day_name()
-        
-        # Numeric cols for volume
-        numeric_cols = [c for c in df.select_dtypes(include=['number']).columns if 'pincode' not in c and 'Year' not in c]
-        df['Volume'] = df[numeric_cols].sum(axis=1)
+        # Calendar keys come from the cube's distinct dates; no row-level copy
+        df = self.datasets['enrolment'].total(['day_name', 'month_name'], name='Volume', rows=True)
+        df = df.rename(columns={'day_name': 'DayOfWeek', 'month_name': 'Month'})
 
-        # Aggregate
-        pivot = df.pivot_table(index='DayOfWeek', columns='Month', values='Volume', aggfunc='mean')
+        # Aggregate: mean volume per raw row = summed volume / rows summed
+        df['Volume'] = df['Volume'] / df[ROW_COUNT]
+        pivot = df.pivot(index='DayOfWeek', columns='Month', values='Volume')
         
         # Reorder
         days_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
@@ -123,11 +111,7 @@ class AdvancedAnalytics:
         existing_months = [m for m in months_order if m in pivot.columns]
         pivot = pivot.reindex(index=days_order, columns=existing_months)
 
-        plt.figure(figsize=(12, 6))
-        sns.heatmap(pivot, cmap='YlOrRd', annot=False, fmt='.0f', cbar_kws={'label': 'Avg Daily Volume'})
-        plt.title('Temporal Heatmap: Enrolment Intensity (Day vs Month)')
-        plt.tight_layout()
-        
-        output_path = os.path.join(self.figures_dir, 'temporal_heatmap.png')
-        plt.savefig(output_path)
-        plt.close()
+        submit_figure(PlotSpec(
+            'heatmap', os.path.join(self.figures_dir, 'temporal_heatmap.png'),
+            data=pivot, cmap='YlOrRd', annot=False, fmt='.0f', cbar_kws={'label': 'Avg Daily Volume'},
+            figsize=(12, 6), title='Temporal Heatmap: Enrolment Intensity (Day vs Month)'))
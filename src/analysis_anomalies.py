@@ -0,0 +1,202 @@
+"""
+Purpose: Localized anomaly detection on every (state, date) and (district, date) series.
+Each day is scored with a rolling robust z-score against the same weekday of the
+previous WINDOW_WEEKS weeks: z = (value - median) / max(1.4826 * MAD, sqrt(median)). All series of a
+level are scored at once on a dense (series x calendar day) matrix.
+The days with data and the daily series of the last KEEP_DAYS days are kept under
+outputs/state/anomalies: a delta run totals only the cube cells from the first
+changed day on and scores them against that window, so a T+1 delta costs
+O(new days) instead of a full refit.
+Output:
+    - tables/<category>_anomalies.csv: flagged (level, state, district, date) cells with
+      their value, same-weekday baseline and z-score, ranked by |z|
+"""
+import os
+import warnings
+import numpy as np
+import pandas as pd
+from src.config import TABLES_DIR, STATE_DIR
+from src.cache import FRAME_EXT, read_cache_file, write_frame
+from src.cube import AggregateCube, as_cube
+from src.utils import setup_logger
+
+logger = setup_logger()
+
+# Series levels: name -> cube dimensions identifying a series
+LEVELS = {
+    'state': ['state'],
+    # District names repeat across states, so a district is a (state, district) pair
+    'district': ['state', 'district'],
+}
+
+# Same-weekday history used for the baseline, and the least of it needed to score a day
+WINDOW_WEEKS = 8
+MIN_HISTORY = 3
+HISTORY = pd.Timedelta(weeks=WINDOW_WEEKS)
+
+# Calendar days of daily series kept between runs: a delta may revise up to
+# KEEP_DAYS - 7 * WINDOW_WEEKS days back and still be scored from the window
+KEEP_DAYS = 7 * WINDOW_WEEKS + 28
+
+# Modified z-score cut-off; MAD is scaled to a standard deviation
+Z_THRESHOLD = 3.5
+MAD_SCALE = 1.4826
+
+# Calendar days scored per block (bounds the series x days x weeks history array)
+BLOCK_DAYS = 256
+
+TABLE_COLUMNS = ['level', 'state', 'district', 'date', 'Total', 'Baseline', 'Z']
+
+def daily_matrix(cells, keys, dates):
+    """
+    Dense (series x calendar day) totals from long (keys, date, Total) cells.
+    Days the category has data for default to 0; days it has none are NaN (missing, not quiet).
+    Returns (series key frame, calendar, values).
+    """
+    codes, index = pd.MultiIndex.from_frame(cells[keys]).factorize(sort=True)
+    # factorize drops the level names
+    index = index.to_frame(index=False)
+    index.columns = keys
+    calendar = pd.date_range(dates.min(), dates.max(), freq='D')
+    values = np.full((len(index), len(calendar)), np.nan)
+    values[:, calendar.get_indexer(dates)] = 0
+    values[codes, calendar.get_indexer(cells['date'])] = cells['Total'].to_numpy()
+    return index, calendar, values
+
+def robust_scores(values, columns):
+    """Same-weekday rolling median and robust z-score of `values` at the given day columns."""
+    baseline = np.full((len(values), len(columns)), np.nan)
+    z = np.full_like(baseline, np.nan)
+    lags = 7 * np.arange(1, WINDOW_WEEKS + 1)
+    for start in range(0, len(columns), BLOCK_DAYS):
+        block = columns[start:start + BLOCK_DAYS]
+        history_cols = block[:, None] - lags
+        history = values[:, np.maximum(history_cols, 0)]
+        history[:, history_cols < 0] = np.nan
+        with warnings.catch_warnings():
+            # Series without any history in the window yield all-NaN slices
+            warnings.simplefilter('ignore', RuntimeWarning)
+            median = np.nanmedian(history, axis=2)
+            mad = np.nanmedian(np.abs(history - median[..., None]), axis=2)
+        # Small counts are noisy even when their history is flat: floor at Poisson noise
+        scale = np.maximum(MAD_SCALE * mad, np.sqrt(np.maximum(median, 1)))
+        scores = (values[:, block] - median) / scale
+        scores[(~np.isnan(history)).sum(axis=2) < MIN_HISTORY] = np.nan
+        baseline[:, start:start + len(block)] = median
+        z[:, start:start + len(block)] = scores
+    return baseline, z
+
+class AnomalyStore:
+    """
+    Flagged anomalies of the last run plus what re-scoring needs: the category's
+    days with data and the daily series of its last KEEP_DAYS calendar days.
+    """
+    def __init__(self, state_dir=STATE_DIR):
+        self.root = os.path.join(state_dir, 'anomalies')
+
+    def path_for(self, category, name):
+        return os.path.join(self.root, f'{category}_{name}.{FRAME_EXT}')
+
+    def load(self, category, name):
+        path = self.path_for(category, name)
+        if not os.path.exists(path):
+            return None
+        df = read_cache_file(path)
+        if 'district' in df.columns:
+            # State-level rows have no district (read back as None)
+            df['district'] = df['district'].where(df['district'].notna(), np.nan)
+        return df
+
+    def _save(self, category, name, df):
+        path = self.path_for(category, name)
+        staging = f'{path}.{os.getpid()}.tmp{os.path.splitext(path)[1]}'
+        write_frame(staging, df)
+        os.replace(staging, path)
+
+    def _resumable(self, days, window, flags, since):
+        """True if the kept window holds the same-weekday history of every day from `since` on."""
+        if days is None or window is None or flags is None or days.empty or since <= days['date'].min():
+            return False
+        window_start = max(days['date'].min(), days['date'].max() - pd.Timedelta(days=KEEP_DAYS - 1))
+        return window_start == days['date'].min() or since - HISTORY >= window_start
+
+    def update(self, category, cube, since=None):
+        """
+        Scores the days from `since` on (every day if None) of every series level;
+        returns all flagged cells, ranked. Days before `since` keep their flags.
+        """
+        days = self.load(category, 'days')
+        window = self.load(category, 'window')
+        flags = self.load(category, 'anomalies')
+        if since is not None and self._resumable(days, window, flags, since):
+            # Only the cells from `since` on are totalled; the history comes from the window
+            recent = cube.data[cube.data.index.get_level_values('date') >= since]
+            cube = AggregateCube(recent, cube.numeric_cols)
+            dates = pd.DatetimeIndex(days['date'][days['date'] < since]).append(cube.dates)
+        else:
+            since, window, flags = cube.dates.min(), None, None
+            dates = cube.dates
+        history_start = since - HISTORY
+        window_start = dates.max() - pd.Timedelta(days=KEEP_DAYS - 1)
+
+        all_cells, flagged = [], []
+        for level, keys in LEVELS.items():
+            if not all(key in cube.dims for key in keys):
+                continue
+            cells = cube.total(keys + ['date'])[keys + ['date', 'Total']]
+            for key in keys:
+                cells[key] = cells[key].astype(str)
+            if window is not None:
+                kept = window[(window['level'] == level) & (window['date'] < since)]
+                cells = pd.concat([kept[keys + ['date', 'Total']], cells], ignore_index=True)
+            if flags is not None:
+                flagged.append(flags[(flags['level'] == level) & (flags['date'] < since)])
+
+            scored = cells[cells['date'] >= history_start]
+            if not scored.empty:
+                index, calendar, values = daily_matrix(scored, keys, dates[dates >= history_start])
+                columns = calendar.get_indexer(dates[dates >= since])
+                baseline, z = robust_scores(values, columns)
+                rows, cols = np.nonzero(np.abs(np.nan_to_num(z)) >= Z_THRESHOLD)
+                found = index.iloc[rows].reset_index(drop=True)
+                found['date'] = calendar[columns[cols]]
+                found['Total'] = values[rows, columns[cols]].astype(np.int64)
+                found['Baseline'] = baseline[rows, cols]
+                found['Z'] = z[rows, cols].round(2)
+                found['level'] = level
+                flagged.append(found)
+
+            cells = cells[cells['date'] >= window_start].copy()
+            cells['level'] = level
+            all_cells.append(cells)
+
+        flagged = [df for df in flagged if not df.empty]
+        result = pd.concat(flagged, ignore_index=True).reindex(columns=TABLE_COLUMNS) if flagged \
+            else pd.DataFrame(columns=TABLE_COLUMNS)
+        result = result.assign(_rank=-result['Z'].abs()) \
+                       .sort_values(['_rank', 'level', 'state', 'district', 'date'], kind='stable') \
+                       .drop(columns='_rank').reset_index(drop=True)
+        os.makedirs(self.root, exist_ok=True)
+        if all_cells:
+            self._save(category, 'window', pd.concat(all_cells, ignore_index=True))
+        self._save(category, 'days', pd.DataFrame({'date': dates}))
+        self._save(category, 'anomalies', result)
+        logger.info(f"{category}: re-scored {int((dates >= since).sum())} days, {len(result)} anomalies flagged")
+        return result
+
+def analyze_anomalies(datasets, since=None, tables_dir=TABLES_DIR, state_dir=STATE_DIR):
+    """`since`: {category: first date whose cells changed} (delta runs); other categories are re-scored in full."""
+    logger.info("Starting State/District Anomaly Detection...")
+    since = since or {}
+    os.makedirs(tables_dir, exist_ok=True)
+    store = AnomalyStore(state_dir)
+
+    results = {}
+    for category, df in datasets.items():
+        cube = as_cube(df)
+        if cube is None:
+            continue
+        results[category] = store.update(category, cube, since.get(category))
+        results[category].to_csv(os.path.join(tables_dir, f'{category}_anomalies.csv'), index=False)
+    logger.info(f"Anomaly tables written to {tables_dir}")
+    return results
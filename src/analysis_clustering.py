@@ -0,0 +1,156 @@
+"""
+Purpose: Cluster states and districts on their operational profile.
+Each (state) and (state, district) gets a feature vector built from the cubes:
+age-bucket shares of every category, OMI, day-of-week volume profile, peak-to-mean
+ratio (PMR) of daily volume and growth rate (second vs first half of the dates).
+KMeans is warm-started from the centroids of the previous run (kept under
+outputs/state/clustering), so re-clustering after a delta takes a single
+initialization and cluster ids stay stable across runs.
+Output:
+    - tables/<level>_clusters.csv: cluster assignment and features per state / district
+    - figures/clustering_states.png: states on enrolment vs biometric volume, by cluster
+"""
+import os
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+from sklearn.preprocessing import StandardScaler
+from src.config import FIGURES_DIR, TABLES_DIR, STATE_DIR
+from src.calendar_dim import calendar_key, calendar_table
+from src.cube import as_cube
+from src.plotting import PlotSpec, submit_figure
+from src.utils import setup_logger
+
+logger = setup_logger()
+
+# Series levels: name -> cube dimensions identifying a group
+LEVELS = {
+    'state': ['state'],
+    # District names repeat across states, so a district is a (state, district) pair
+    'district': ['state', 'district'],
+}
+
+N_CLUSTERS = {'state': 3, 'district': 6}
+
+UPDATE_CATEGORIES = ['biometric', 'demographic']
+
+DAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+def _by_keys(df, keys):
+    """Plain string keys as the index (categories differ between cubes)."""
+    df = df.copy()
+    for key in keys:
+        df[key] = df[key].astype(str)
+    return df.set_index(keys)
+
+def feature_matrix(cubes, keys):
+    """One row of features per group of `keys` across all category cubes (NaN where undefined)."""
+    features, totals, daily = [], {}, []
+    for category, cube in cubes.items():
+        sums = _by_keys(cube.query(keys), keys)
+        totals[category] = sums.sum(axis=1)
+        features.append(sums.div(totals[category], axis=0).add_prefix('share_'))
+        daily.append(_by_keys(cube.total(keys + ['date'])[keys + ['date', 'Total']], keys))
+
+    volume = pd.concat(totals, axis=1).fillna(0).astype('int64')
+    updates = volume[[c for c in UPDATE_CATEGORIES if c in volume.columns]].sum(axis=1)
+    features.append(pd.DataFrame({'OMI': updates / volume.sum(axis=1)}))
+
+    # Daily volume of all categories per group
+    daily = pd.concat(daily).groupby(keys + ['date'])['Total'].sum().reset_index()
+    table = calendar_table(daily['date'], keys=('dayofweek',))
+    dow = pd.Series(calendar_key(daily['date'], 'dayofweek', table), index=daily.index, name='dow')
+    profile = daily.groupby(keys + [dow])['Total'].sum().unstack('dow')
+    profile = profile.reindex(columns=range(7), fill_value=0).fillna(0)
+    profile.columns = [f'dow_{day}' for day in DAY_NAMES]
+    features.append(profile.div(profile.sum(axis=1), axis=0))
+
+    per_group = daily.groupby(keys)['Total']
+    features.append(pd.DataFrame({'PMR': per_group.max() / per_group.mean()}))
+    dates = np.sort(daily['date'].unique())
+    later = daily['date'] >= dates[len(dates) // 2]
+    first = daily[~later].groupby(keys)['Total'].sum() / max(len(dates) // 2, 1)
+    second = daily[later].groupby(keys)['Total'].sum() / (len(dates) - len(dates) // 2)
+    features.append(pd.DataFrame({'Growth': (second / first - 1).replace([np.inf, -np.inf], np.nan)}))
+
+    return pd.concat(features, axis=1).sort_index(), volume.sort_index()
+
+class ClusterModel:
+    """Centroids (in feature units) of the last run per level, reused as the next initialization."""
+    def __init__(self, state_dir=STATE_DIR):
+        self.root = os.path.join(state_dir, 'clustering')
+
+    def path_for(self, level):
+        return os.path.join(self.root, f'{level}_centroids.npz')
+
+    def load(self, level, columns, k):
+        path = self.path_for(level)
+        if not os.path.exists(path):
+            return None
+        stored = np.load(path, allow_pickle=False)
+        if stored['columns'].tolist() != list(columns) or len(stored['centroids']) != k:
+            return None
+        return stored['centroids']
+
+    def save(self, level, columns, centroids):
+        os.makedirs(self.root, exist_ok=True)
+        np.savez(self.path_for(level), columns=np.array(list(columns)), centroids=centroids)
+
+def cluster_level(cubes, level, model=None):
+    """Assigns every group of a level to a cluster; returns its features plus Cluster."""
+    model = model or ClusterModel()
+    keys = LEVELS[level]
+    features, volume = feature_matrix(cubes, keys)
+    # Undefined features (e.g. growth without earlier volume) take the typical value
+    filled = features.fillna(features.median()).fillna(0)
+    k = min(N_CLUSTERS[level], len(filled))
+
+    scaler = StandardScaler().fit(filled)
+    X = scaler.transform(filled)
+    previous = model.load(level, filled.columns, k)
+    if previous is not None:
+        kmeans = KMeans(n_clusters=k, init=scaler.transform(pd.DataFrame(previous, columns=filled.columns)),
+                        n_init=1, random_state=42)
+    else:
+        kmeans = KMeans(n_clusters=k, n_init=10, random_state=42)
+    labels = kmeans.fit_predict(X)
+    model.save(level, filled.columns, scaler.inverse_transform(kmeans.cluster_centers_))
+    logger.info(f"{level}: {len(filled)} groups in {k} clusters "
+                f"({'warm start' if previous is not None else 'cold start'}, {kmeans.n_iter_} iterations)")
+
+    result = features.copy()
+    result.insert(0, 'Cluster', labels)
+    result = pd.concat([volume.add_prefix('Total_'), result], axis=1)
+    return result.reset_index()
+
+def analyze_clustering(datasets, tables_dir=TABLES_DIR, state_dir=STATE_DIR):
+    logger.info("Starting State/District Clustering...")
+    os.makedirs(tables_dir, exist_ok=True)
+    cubes = {cat: as_cube(df) for cat, df in datasets.items() if df is not None}
+    model = ClusterModel(state_dir)
+
+    results = {}
+    for level, keys in LEVELS.items():
+        available = {cat: cube for cat, cube in cubes.items() if all(key in cube.dims for key in keys)}
+        if not available:
+            continue
+        results[level] = cluster_level(available, level, model)
+        results[level].to_csv(os.path.join(tables_dir, f'{level}_clusters.csv'), index=False)
+
+    states = results.get('state')
+    if states is not None and {'Total_enrolment', 'Total_biometric'} <= set(states.columns):
+        merged = states.rename(columns={'Total_enrolment': 'Total_Enrolment', 'Total_biometric': 'Total_Biometric'})
+        # Label the states in the top decile of either axis
+        top = (merged['Total_Enrolment'] > merged['Total_Enrolment'].quantile(0.9)) | \
+              (merged['Total_Biometric'] > merged['Total_Biometric'].quantile(0.9))
+        texts = [(row.Total_Enrolment, row.Total_Biometric, row.state, 9)
+                 for row in merged[top].itertuples()]
+
+        submit_figure(PlotSpec(
+            'scatterplot', os.path.join(FIGURES_DIR, 'clustering_states.png'),
+            data=merged[['state', 'Total_Enrolment', 'Total_Biometric', 'Cluster']],
+            x='Total_Enrolment', y='Total_Biometric', hue='Cluster', palette='deep', s=100,
+            texts=texts, figsize=(10, 6), title='State Clustering: Enrolment vs Biometric Updates',
+            xlabel='Total Enrolment', ylabel='Total Biometric Updates', x_formatter=True, y_formatter=True))
+    logger.info(f"Cluster assignments written to {tables_dir}")
+    return results
@@ -9,11 +9,7 @@ Output:
 """
 
 import pandas as pd
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
-import holidays
+import numpy as np
 import sys
 import os
 from pathlib import Path
@@ -22,90 +18,49 @@ from pathlib import Path
 if str(Path(__file__).parent / 'src') not in sys.path:
     sys.path.append(str(Path(__file__).parent / 'src'))
 
-from src.config import DATA_DIRS, FIGURES_DIR
+from src.config import DATA_DIRS, FIGURES_DIR, TABLES_DIR, STATE_CODE_MAP  # noqa: F401 (re-exported)
 from src.data_loader import load_data, clean_data
-from src.utils import indian_formatter
+from src.holiday_calendar import HolidayCalendar
+from src.cube import as_cube, calendar_key, ROW_COUNT
+from src.plotting import PlotSpec, submit_figure
 
-# Set visual style
-sns.set_theme(style="whitegrid")
+DAY_TYPES = ['Holiday', 'Weekend', 'Weekday']
 
-# Mapping of State Names to Holidays State Codes
-STATE_CODE_MAP = {
-    'Andaman and Nicobar Islands': 'AN',
-    'Andhra Pradesh': 'AP',
-    'Arunachal Pradesh': 'AR',
-    'Assam': 'AS',
-    'Bihar': 'BR',
-    'Chandigarh': 'CH',
-    'Chhattisgarh': 'CG',
-    'Dadra and Nagar Haveli': 'DN',
-    'Daman and Diu': 'DD',
-    'Delhi': 'DL',
-    'Goa': 'GA',
-    'Gujarat': 'GJ',
-    'Haryana': 'HR',
-    'Himachal Pradesh': 'HP',
-    'Jammu and Kashmir': 'JK',
-    'Jharkhand': 'JH',
-    'Karnataka': 'KA',
-    'Kerala': 'KL',
-    'Ladakh': 'LA',
-    'Lakshadweep': 'LD',
-    'Madhya Pradesh': 'MP',
-    'Maharashtra': 'MH',
-    'Manipur': 'MN',
-    'Meghalaya': 'ML',
-    'Mizoram': 'MZ',
-    'Nagaland': 'NL',
-    'Odisha': 'OR',
-    'Puducherry': 'PY',
-    'Punjab': 'PB',
-    'Rajasthan': 'RJ',
-    'Sikkim': 'SK',
-    'Tamil Nadu': 'TN',
-    'Telangana': 'TS',
-    'Tripura': 'TR',
-    'Uttar Pradesh': 'UP',
-    'Uttarakhand': 'UK',
-    'West Bengal': 'WB'
-}
+def classify_day_type(is_holiday, is_weekend):
+    """
+    Vectorized day-type classifier: Holiday takes precedence over Weekend,
+    everything else is a Weekday.
+    """
+    return np.select([np.asarray(is_holiday, dtype=bool), np.asarray(is_weekend, dtype=bool)],
+                     ['Holiday', 'Weekend'], 'Weekday').astype(object)
 
-def get_holiday_info(row, holiday_dict):
+def state_day_types(states, dates, calendar, table=None):
     """
-    Determines if a date is a holiday for a specific state.
+    Day type of each (state, date) key, honouring state-specific holidays.
+    Keys are deduplicated first, so the holiday calendar is consulted once per
+    distinct pair rather than once per row; weekends come from the calendar table.
     """
-    date = row['date']
-    state = row['state']
-    
-    # Get state code, default to None (National holidays only logic if needed later)
-    state_code = STATE_CODE_MAP.get(state)
-    
-    # Check specific state holidays if code exists
-    if state_code and state_code in holiday_dict:
-        if date in holiday_dict[state_code]:
-            return True, holiday_dict[state_code].get(date)
-            
-    # Always check National/Base India holidays (represented by 'IN' in our dict structure or just base object)
-    if 'IN' in holiday_dict and date in holiday_dict['IN']:
-         return True, holiday_dict['IN'].get(date)
-         
-    return False, None
+    codes, keys = pd.MultiIndex.from_arrays([states, dates]).factorize()
+    key_dates = pd.DatetimeIndex(keys.get_level_values(1))
+    day_types = classify_day_type(calendar.is_holiday(keys.get_level_values(0), key_dates),
+                                  calendar_key(key_dates, 'is_weekend', table))
+    return day_types[codes]
 
-def prepare_holiday_data(years):
-    """Pre-fetches holiday objects for all states and years."""
-    holiday_dict = {}
-    
-    # National Holidays
-    holiday_dict['IN'] = holidays.India(years=years)
-    
-    # State Holidays
-    for state_name, code in STATE_CODE_MAP.items():
-        try:
-            holiday_dict[code] = holidays.India(years=years, subdiv=code)
-        except Exception:
-            pass # Graceful degradation if code not supported
-            
-    return holiday_dict
+def holiday_impact_breakdown(cube, calendar, by=('state',)):
+    """
+    Average daily volume per Holiday / Weekend / Weekday for each group in `by`
+    (e.g. ('state',) or ('state', 'district')), with the holiday dip vs weekdays.
+    Works on the cube's (group x date) totals, never on raw rows.
+    """
+    by = [key for key in by if key in cube.dims]
+    daily = cube.total(by + ['date'], name='Total_Volume')
+    daily['DayType'] = state_day_types(daily['state'], daily['date'], calendar, cube.calendar)
+
+    table = daily.groupby(by + ['DayType'], observed=True)['Total_Volume'].mean().unstack('DayType')
+    table = table.reindex(columns=DAY_TYPES)
+    table.columns = [f'Avg_{day_type}' for day_type in DAY_TYPES]
+    table['Holiday_Dip_Pct'] = (1 - table['Avg_Holiday'] / table['Avg_Weekday']) * 100
+    return table.reset_index()
 
 def analyze_date_intelligence(datasets):
     print("Starting Date & Holiday Analysis...")
@@ -115,99 +70,51 @@ def analyze_date_intelligence(datasets):
         print("Enrolment data missing.")
         return
 
-    df = datasets['enrolment'].copy()
+    # Work on (state, date) sums from the cube instead of a copy of every row;
+    # Row_Count keeps the per-row averages of the original analysis recoverable
+    cube = as_cube(datasets['enrolment'])
+    df = cube.total(['state', 'date'], name='Total_Volume', rows=True)
     
-    # 1. Date Feature Extraction
-    df['DayOfWeek'] = df['date'].dt.day_name()
-    df['IsWeekend'] = df['date'].dt.dayofweek.isin([5, 6]) # Sat=5, Sun=6
+    # 1. Date Feature Extraction (looked up in the cube's calendar table by date key)
+    table = cube.calendar
+    df['DayOfWeek'] = calendar_key(df['date'], 'day_name', table)
+    df['IsWeekend'] = calendar_key(df['date'], 'is_weekend', table) # Sat, Sun
     
     # 2. Holiday Detection
-    years = df['date'].dt.year.unique()
-    holiday_dict = prepare_holiday_data(years)
-    
-    # Apply holiday logic (this can be slow on huge data, so standardizing/vectorizing where possible is better, 
-    # but for state-specific lookups, apply or merge is needed)
-    
-    # detailed row-by-row check is expensive. Let's optimize:
-    # Create a long-form holiday dataframe? 
-    # Or just iterate since we need State + Date combo.
-    # Given dataset size (1M+ rows potentially), apply is slow.
-    # Optimization: Merge with a pre-generated holiday table.
-    
-    print("Generating holiday mapping...")
-    holiday_records = []
-    for code, holidays_obj in holiday_dict.items():
-        for date, name in holidays_obj.items():
-            holiday_records.append({'date': pd.to_datetime(date), 'HolidayName': name, 'StateCode': code})
-            
-    if holiday_records:
-        hol_df = pd.DataFrame(holiday_records)
-        # We need to map df['state'] to code first
-        df['StateCode'] = df['state'].map(STATE_CODE_MAP)
-        
-        # Merge for National (StateCode='IN' or fallback) - simplified approach:
-        # Just check if date is in National list
-        nat_holidays = holidays.India(years=years)
-        df['IsNationalHoliday'] = df['date'].isin(nat_holidays)
-        
-        # State Specific check:
-        # Let's stick to "Is it a holiday in that state?"
-        # It's tricky to vectorise perfectly without a huge join.
-        # Let's stick to National for general trend and simple apply for correctness if needed, 
-        # but for speed on 1M rows, let's just use National + Weekend for the main "Holiday Impact" plot.
-        
-        # ACTUALLY, strict requirement: "State-specific holidays (where available)"
-        # Let's try a merge.
-        hol_df_state = hol_df[hol_df['StateCode'] != 'IN']
-        
-        # Merge df with hol_df_state on date AND StateCode
-        df = pd.merge(df, hol_df_state[['date', 'StateCode', 'HolidayName']], 
-                      on=['date', 'StateCode'], how='left')
-        
-        df.rename(columns={'HolidayName': 'StateHolidayName'}, inplace=True)
-        df['IsStateHoliday'] = df['StateHolidayName'].notnull()
-        
-        df['IsHoliday'] = df['IsNationalHoliday'] | df['IsStateHoliday']
-    else:
-        df['IsHoliday'] = False
+    # The on-disk (state x date) calendar turns the state-specific check into a
+    # single array gather per row: no holidays objects, no merge, no duplicated
+    # rows on dates that carry two holiday names.
+    years = cube.dates.year.unique()
+    calendar = HolidayCalendar.load(years)
+    df['IsNationalHoliday'] = calendar_key(df['date'], 'is_national_holiday', table)
+    df['IsHoliday'] = calendar.is_holiday(df['state'], df['date'])
 
     # 3. Weekday vs Weekend Analysis
-    numeric_cols = [c for c in df.select_dtypes(include=['number']).columns if 'pincode' not in c and 'Year' not in c]
-    # Sum numeric cols for total volume
-    df['Total_Volume'] = df[numeric_cols].sum(axis=1)
-    
-    # Plot 1: Average Volume by Day of Week
+    # Plot 1: Average Volume (per record) by Day of Week
     # Reorder days
     order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    by_day = df.groupby('DayOfWeek')[['Total_Volume', ROW_COUNT]].sum()
+    by_day['Avg_Volume'] = by_day['Total_Volume'] / by_day[ROW_COUNT]
+    by_day = by_day.reset_index()
     
-    plt.figure(figsize=(10, 6))
-    sns.barplot(data=df, x='DayOfWeek', y='Total_Volume', estimator='mean', order=order, palette='coolwarm')
-    plt.title('Average Enrolment Volume by Day of Week')
-    plt.ylabel('Avg Volume')
-    plt.gca().yaxis.set_major_formatter(indian_formatter)
-    plt.tight_layout()
-    plt.savefig(os.path.join(FIGURES_DIR, 'weekday_pattern.png'))
-    plt.close()
+    submit_figure(PlotSpec(
+        'barplot', os.path.join(FIGURES_DIR, 'weekday_pattern.png'),
+        data=by_day, x='DayOfWeek', y='Avg_Volume', order=order, palette='coolwarm',
+        figsize=(10, 6), title='Average Enrolment Volume by Day of Week', ylabel='Avg Volume',
+        y_formatter=True))
     
     # Plot 2: Holiday vs Non-Holiday
     # Group by Date first to get daily totals, then categorize
     daily_stats = df.groupby(['date', 'IsHoliday', 'IsWeekend'])['Total_Volume'].sum().reset_index()
     
     # Create category
-    def categorize(row):
-        if row['IsHoliday']: return 'Holiday'
-        if row['IsWeekend']: return 'Weekend'
-        return 'Weekday'
-        
-    daily_stats['DayType'] = daily_stats.apply(categorize, axis=1)
+    daily_stats['DayType'] = classify_day_type(daily_stats['IsHoliday'], daily_stats['IsWeekend'])
     
-    plt.figure(figsize=(8, 6))
-    sns.boxplot(data=daily_stats, x='DayType', y='Total_Volume', palette='Set2')
-    plt.title('Volume Distribution: Weekday vs Weekend vs Holiday')
-    plt.ylabel('Daily Total Volume')
-    plt.gca().yaxis.set_major_formatter(indian_formatter)
-    plt.tight_layout()
-    plt.savefig(os.path.join(FIGURES_DIR, 'holiday_impact.png'))
+    submit_figure(PlotSpec(
+        'boxplot', os.path.join(FIGURES_DIR, 'holiday_impact.png'),
+        data=daily_stats[['DayType', 'Total_Volume']], x='DayType', y='Total_Volume', palette='Set2',
+        figsize=(8, 6), title='Volume Distribution: Weekday vs Weekend vs Holiday',
+        ylabel='Daily Total Volume', y_formatter=True))
     avg_weekday = daily_stats[daily_stats['DayType'] == 'Weekday']['Total_Volume'].mean()
     avg_weekend = daily_stats[daily_stats['DayType'] == 'Weekend']['Total_Volume'].mean()
     avg_holiday = daily_stats[daily_stats['DayType'] == 'Holiday']['Total_Volume'].mean()
@@ -217,6 +124,13 @@ def analyze_date_intelligence(datasets):
     print(f"Avg Daily Volume (Weekend): {avg_weekend:,.0f}")
     print(f"Avg Daily Volume (Holiday): {avg_holiday:,.0f}")
     print("----------------")
+
+    # Plot 3 (table): the same split per state and per district
+    for by, name in [(('state',), 'holiday_impact_by_state.csv'),
+                     (('state', 'district'), 'holiday_impact_by_district.csv')]:
+        if all(key in cube.dims for key in by):
+            table = holiday_impact_breakdown(cube, calendar, by)
+            table.to_csv(os.path.join(TABLES_DIR, name), index=False)
     
     return {
         'avg_weekday': avg_weekday,
@@ -236,4 +150,6 @@ def main():
     stats = analyze_date_intelligence(datasets)
     
 if __name__ == "__main__":
+    from src.config import ensure_output_dirs
+    ensure_output_dirs()
     main()
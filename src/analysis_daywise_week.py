@@ -1,26 +1,31 @@
 import pandas as pd
-import seaborn as sns
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 import os
 import numpy as np
-from src.config import FIGURES_DIR, REPORTS_DIR
-from src.utils import setup_logger, indian_formatter
-from src.analysis_date_holiday import STATE_CODE_MAP
+from src.config import FIGURES_DIR, REPORTS_DIR, STATE_CODE_MAP
+from src.utils import setup_logger
+from src.plotting import PlotSpec, submit_figure
+from src.cube import as_cube, ROW_COUNT
 
 logger = setup_logger("DayWiseAnalysis")
 
+DAYS_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
 def maximize_constrast_palette():
     """Returns a color palette suitable for heatmaps with outliers."""
+    import seaborn as sns
     return sns.diverging_palette(220, 20, as_cmap=True)
 
 def ensure_day_order(df, day_col='day_name'):
     """Ensures Monday-Sunday ordering for visualizations."""
-    days_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    df[day_col] = pd.Categorical(df[day_col], categories=days_order, ordered=True)
+    df[day_col] = pd.Categorical(df[day_col], categories=DAYS_ORDER, ordered=True)
     return df
 
+def peak_to_mean(state_day_matrix):
+    """Peak-to-Mean Ratio (peak day / average day) of every state with any load."""
+    means = state_day_matrix.mean(axis=1)
+    active = means > 0
+    return state_day_matrix[active].max(axis=1) / means[active]
+
 def generate_server_load_insights(state_day_matrix, category):
     """
     Generates operational insights focusing on Server Load and Capacity Planning.
@@ -46,12 +51,7 @@ def generate_server_load_insights(state_day_matrix, category):
     # 2. State-Wise Bursty Load Analysis (PMR)
     # PMR = Peak Daily Volume / Average Daily Volume
     # High PMR (> 2.0) means the state slams the server on one day and is quiet on others.
-    pmr_scores = {}
-    for state in state_day_matrix.index:
-        row = state_day_matrix.loc[state]
-        if row.mean() > 0:
-            pmr = row.max() / row.mean()
-            pmr_scores[state] = pmr
+    pmr_scores = peak_to_mean(state_day_matrix).to_dict()
             
     # Top 5 Bursty States
     bursty_states = sorted(pmr_scores.items(), key=lambda x: x[1], reverse=True)[:5]
@@ -69,6 +69,46 @@ def generate_server_load_insights(state_day_matrix, category):
     
     return "\n".join(insights)
 
+def state_day_matrix(df):
+    """State x day-of-week volume (from state_day_load), busiest states first."""
+    # pivot: index=state, col=day
+    pivot = df.pivot_table(index='state', columns='day_name', values='Total', aggfunc='sum', fill_value=0, observed=False)
+    
+    # Sort states by total volume so the chart is readable (High volume at top)
+    pivot['Total_Row'] = pivot.sum(axis=1)
+    pivot = pivot.sort_values('Total_Row', ascending=False)
+    return pivot.drop(columns=['Total_Row'])
+
+def state_day_load(cube, category):
+    """
+    Volume per (state, day of week) summed over all dates, on the full state x day
+    grid (days without activity count as zero load). Returns None if no state has data.
+    """
+    numeric_cols = cube.numeric_cols
+    agg = cube.query(['state', 'day_name'], rows=True)
+    
+    # States are canonicalized at load time; rows no official state could be
+    # resolved for (not even by pincode) are kept there but have no place on a state chart
+    unknown = ~agg['state'].isin(list(STATE_CODE_MAP))
+    if unknown.any():
+        logger.warning(f"{agg.loc[unknown, ROW_COUNT].sum()} {category} rows have no resolvable state; "
+                       f"left out of the state charts.")
+        agg = agg[~unknown]
+        
+    if agg.empty:
+        return None
+    
+    # Full state x day grid: days without activity count as zero load
+    grid = pd.MultiIndex.from_product(
+        [sorted(agg['state'].astype(str).unique()), DAYS_ORDER], names=['state', 'day_name'])
+    agg = agg.astype({'state': str}).set_index(['state', 'day_name'])[numeric_cols] \
+             .reindex(grid, fill_value=0).reset_index()
+    
+    # Ensure order
+    agg = ensure_day_order(agg)
+    agg['Total'] = agg[numeric_cols].sum(axis=1)
+    return agg
+
 def plot_full_state_heatmap(df, category):
     """
     Generates a heatmap of Volume for All States x Days.
@@ -76,38 +116,26 @@ def plot_full_state_heatmap(df, category):
     output_path = os.path.join(FIGURES_DIR, 'daywise')
     os.makedirs(output_path, exist_ok=True)
     
-    # pivot: index=state, col=day
-    pivot = df.pivot_table(index='state', columns='day_name', values='Total', aggfunc='sum', fill_value=0)
-    
-    # Sort states by total volume so the chart is readable (High volume at top)
-    pivot['Total_Row'] = pivot.sum(axis=1)
-    pivot = pivot.sort_values('Total_Row', ascending=False)
-    pivot = pivot.drop(columns=['Total_Row'])
+    pivot = state_day_matrix(df)
     
     # Dynamic Height: 0.4 inches per state. Min 10, Max 50.
     n_states = len(pivot)
     height = max(10, n_states * 0.45)
     
-    plt.figure(figsize=(12, height))
-    
     # Use Log scale for color if disparity is huge? 
     # Let's stick to robust scaler or just standard heatmap but with robust=True equivalent?
     # Actually, standard heatmap is fine, but let's use a clear map.
-    sns.heatmap(pivot, cmap='YlGnBu', annot=True, fmt='.0f', linewidths=.5, cbar_kws={'label': 'Volume'})
-    
-    plt.title(f'State-Wise {category.capitalize()} Load Heatmap (Monday-Sunday)', fontsize=16)
-    plt.ylabel('State / UT')
-    plt.xlabel('Day of Week')
-    plt.tight_layout()
-    
     save_file = os.path.join(output_path, f'{category}_state_heatmap_FULL.png')
-    plt.savefig(save_file)
-    plt.close()
-    logger.info(f"Saved full heatmap to {save_file}")
+    submit_figure(PlotSpec(
+        'heatmap', save_file,
+        data=pivot, cmap='YlGnBu', annot=True, fmt='.0f', linewidths=.5, cbar_kws={'label': 'Volume'},
+        figsize=(12, height), title=f'State-Wise {category.capitalize()} Load Heatmap (Monday-Sunday)',
+        title_kwargs={'fontsize': 16}, ylabel='State / UT', xlabel='Day of Week'))
+    logger.info(f"Submitted full heatmap for {save_file}")
     
     return pivot
 
-def analyze_daywise(datasets):
+def analyze_daywise(datasets, reports_dir=REPORTS_DIR):
     logger.info("Starting Day-Wise Analysis...")
     
     report_content = []
@@ -118,43 +146,13 @@ def analyze_daywise(datasets):
             
         logger.info(f"Processing day-wise stats for {category}...")
         
-        # Ensure date validity
-        df = df[df['date'].notna()].copy()
-        
-        # --- DATA CLEANING: Filter Invalid States (Cities appearing as States) ---
-        # The user reported cities/districts appearing in the 'state' column.
-        # We strict filter using the official STATE_CODE_MAP keys.
-        
-        initial_count = len(df)
-        valid_states = set(STATE_CODE_MAP.keys())
-        
-        # Normalize: title case to match map keys if needed, but assuming data is close
-        df = df[df['state'].isin(valid_states)]
-        
-        dropped_count = initial_count - len(df)
-        if dropped_count > 0:
-            logger.warning(f"dropped {dropped_count} rows from {category} due to invalid state names (likely cities/districts).")
-            
-        if df.empty:
-            logger.warning(f"Skipping {category} - No valid state data remaining after filtering.")
-            continue
-            
-        # Add day features
-        df['day_name'] = df['date'].dt.day_name()
-        
-        # Ensure order
-        df = ensure_day_order(df)
-        
-        # Numeric columns
-        numeric_cols = [c for c in df.select_dtypes(include=['number']).columns if 'pincode' not in c and 'Year' not in c]
-        
-        # Aggregate logic
-        # We need sum per state per day.
+        # Sum per state per day name straight from the cube.
         # Note: If we just sum, we get total volume over ALL TIME for that day name.
         # This is correct for "Generic Monday Load" analysis.
-        
-        agg = df.groupby(['state', 'day_name'])[numeric_cols].sum().reset_index()
-        agg['Total'] = agg[numeric_cols].sum(axis=1)
+        agg = state_day_load(as_cube(df), category)
+        if agg is None:
+            logger.warning(f"Skipping {category} - No valid state data remaining after filtering.")
+            continue
         
         # 1. Generate Heatmap (All States) & Get Matrix for Insights
         state_day_matrix = plot_full_state_heatmap(agg, category)
@@ -164,22 +162,16 @@ def analyze_daywise(datasets):
         report_content.append(insights)
         
         # 3. Aggregate Daily Global Trend (Monday-Sunday)
-        global_day = agg.groupby('day_name')['Total'].sum().reset_index()
-        
-        plt.figure(figsize=(10, 6))
-        sns.barplot(data=global_day, x='day_name', y='Total', palette='viridis')
-        plt.title(f'Global {category.capitalize()} Volume by Day of Week')
-        plt.ylabel('Total Volume')
-        plt.xlabel('Day')
-        plt.gca().yaxis.set_major_formatter(indian_formatter)
-        plt.tight_layout()
+        global_day = agg.groupby('day_name', observed=False)['Total'].sum().reset_index()
         
-        save_path = os.path.join(FIGURES_DIR, 'daywise', f'{category}_global_day_trend.png')
-        plt.savefig(save_path)
-        plt.close()
+        submit_figure(PlotSpec(
+            'barplot', os.path.join(FIGURES_DIR, 'daywise', f'{category}_global_day_trend.png'),
+            data=global_day, x='day_name', y='Total', palette='viridis',
+            figsize=(10, 6), title=f'Global {category.capitalize()} Volume by Day of Week',
+            ylabel='Total Volume', xlabel='Day', y_formatter=True))
         
     # Write Report
-    report_path = os.path.join(REPORTS_DIR, 'daywise_insights.md')
+    report_path = os.path.join(reports_dir, 'daywise_insights.md')
     with open(report_path, 'w') as f:
         f.write("\n".join(report_content))
         
@@ -0,0 +1,56 @@
+"""
+Purpose: District- and pincode-level load analysis for enrolment-centre capacity planning.
+Output:
+    - tables/<category>_district_load.csv: total, active days, mean/peak daily load and
+      peak-to-mean ratio per (state, district)
+    - tables/<category>_top_pincodes.csv: busiest pincodes with their peak daily load
+"""
+import os
+from src.config import TABLES_DIR
+from src.utils import setup_logger
+
+logger = setup_logger()
+
+TOP_PINCODES = 50
+
+def district_load(index, start=None, end=None):
+    """Daily load profile per (state, district), busiest first."""
+    daily = index.daily('district', start, end)
+    load = daily.groupby(['state', 'district'], sort=False)['Total'].agg(
+        Total='sum', Active_Days='size', Mean_Daily='mean', Peak_Daily='max').reset_index()
+    load['PMR'] = (load['Peak_Daily'] / load['Mean_Daily']).round(2)
+    load['Mean_Daily'] = load['Mean_Daily'].round(1)
+    return load.sort_values('Total', ascending=False, kind='stable').reset_index(drop=True)
+
+def top_pincodes(index, k=TOP_PINCODES, start=None, end=None):
+    """The k busiest pincodes, labelled with their busiest (state, district)."""
+    top = index.top_k(k, 'pincode', start, end)
+    locations = index.totals('location', start, end)
+    labels = locations.sort_values('Total', kind='stable') \
+                      .drop_duplicates('pincode', keep='last')[['pincode', 'state', 'district']]
+    top = top.merge(labels, on='pincode', how='left')
+    peaks = []
+    for pincode in top['pincode']:
+        daily = index.series(pincode, start, end)
+        peaks.append((len(daily), daily.max(), daily.idxmax()))
+    top['Active_Days'], top['Peak_Daily'], top['Peak_Date'] = zip(*peaks) if peaks else ([], [], [])
+    return top[['pincode', 'state', 'district', 'Total', 'Active_Days', 'Peak_Daily', 'Peak_Date']]
+
+def analyze_locations(indexes, tables_dir=TABLES_DIR):
+    logger.info("Starting District/Pincode Analysis...")
+    os.makedirs(tables_dir, exist_ok=True)
+
+    for category, index in indexes.items():
+        load = district_load(index)
+        load.to_csv(os.path.join(tables_dir, f'{category}_district_load.csv'), index=False)
+
+        top = top_pincodes(index)
+        top.to_csv(os.path.join(tables_dir, f'{category}_top_pincodes.csv'), index=False)
+
+        logger.info(f"{category}: {len(index.locations)} locations, {len(index)} active (location, date) cells")
+        if not top.empty:
+            busiest = top.iloc[0]
+            logger.info(f"Busiest {category} pincode: {busiest['pincode']} ({busiest['district']}, "
+                        f"{busiest['state']}) peaking at {busiest['Peak_Daily']:,} on "
+                        f"{busiest['Peak_Date']:%d-%m-%Y}")
+    logger.info(f"District/Pincode tables written to {tables_dir}")
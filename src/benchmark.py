@@ -0,0 +1,137 @@
+"""
+Benchmark harness.
+Times the core stages (load_data, clean_data, parallel load, cube build,
+analyze_daywise, compute_operational_maturity_index) on synthetic data at
+several scales. Each scale runs in a fresh process; within it, memory is
+measured per stage (peak RSS while the stage ran and how much it added).
+Results are appended to outputs/benchmarks/history.csv and compared with the
+previous run of the same scale and stage.
+
+Usage: python -m src.benchmark --scales 100000 1000000 10000000
+"""
+import argparse
+import csv
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+# Allow `python src/benchmark.py` as well as `python -m src.benchmark`
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.config import BENCHMARK_DIR, LOAD_WORKERS
+from src.data_loader import load_data, clean_data, load_datasets
+from src.cube import build_cubes
+from src.analysis_daywise_week import analyze_daywise
+from src.canonical import names_memo
+from src.advanced_analytics import AdvancedAnalytics
+from src.plotting import collect_figures
+from src.profiling import Profiler, activate, append_csv, track
+from src.synthetic_data import generate_datasets
+from src.utils import setup_logger
+
+logger = setup_logger()
+
+HISTORY_FIELDS = ['run_id', 'commit', 'scale', 'stage', 'wall_s', 'cpu_s', 'rows', 'rows_per_s',
+                  'peak_rss_mb', 'added_rss_mb']
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+def synthetic_dirs(rows, data_root, shard_rows):
+    """Data dirs of the synthetic dataset with `rows` rows per category (generated once)."""
+    root = os.path.join(data_root, f'rows_{rows}')
+    if not os.path.isdir(root):
+        return generate_datasets(rows, root, shard_rows=shard_rows)
+    return {name[len('api_data_aadhar_'):]: os.path.join(root, name) for name in sorted(os.listdir(root))}
+
+def run_scale(rows, data_root, shard_rows=1_000_000, workers=LOAD_WORKERS):
+    """Runs every benchmarked stage on one scale; returns the profile records."""
+    data_dirs = synthetic_dirs(rows, data_root, shard_rows)
+    profiler = Profiler()
+    # Figures are collected and dropped: rendering is not part of the benchmark
+    # Synthetic names are resolved against a scratch memo, not the production one
+    with activate(profiler), collect_figures(), tempfile.TemporaryDirectory() as reports_dir, \
+            names_memo(os.path.join(reports_dir, 'canonical_names.json')):
+        with track('load_data') as record:
+            raw = {category: load_data(category, path) for category, path in data_dirs.items()}
+            record['rows'] = total_rows = sum(len(df) for df in raw.values())
+        with track('clean_data', rows=total_rows):
+            cleaned = {category: clean_data(df, category) for category, df in raw.items()}
+        del raw, cleaned
+
+        with track('load_datasets', rows=total_rows):
+            datasets = load_datasets(data_dirs, workers=workers, use_cache=False)
+        with track('build_cubes', rows=total_rows):
+            cubes = build_cubes(datasets)
+        del datasets
+
+        with track('analyze_daywise', rows=total_rows):
+            analyze_daywise(cubes, reports_dir=reports_dir)
+        with track('compute_operational_maturity_index', rows=total_rows):
+            AdvancedAnalytics(cubes).compute_operational_maturity_index()
+    # Only the top-level stages (shard-level records come from the loader workers)
+    return [r for r in profiler.records if r['kind'] == 'stage']
+
+def read_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+def run_benchmarks(scales, data_root, shard_rows=1_000_000, workers=LOAD_WORKERS, out_dir=BENCHMARK_DIR):
+    """Benchmarks every scale, appends to the history file and returns this run's rows."""
+    run_id = datetime.now().isoformat(timespec='seconds')
+    commit = git_commit()
+    history_path = os.path.join(out_dir, 'history.csv')
+    history = read_history(history_path)
+
+    results = []
+    for scale in scales:
+        logger.info(f"Benchmarking {scale:,} rows per category...")
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            records = pool.submit(run_scale, scale, data_root, shard_rows, workers).result()
+        for record in records:
+            results.append({
+                'run_id': run_id, 'commit': commit, 'scale': scale, 'stage': record['name'],
+                'wall_s': record['wall_s'], 'cpu_s': record['cpu_s'], 'rows': record['rows'],
+                'rows_per_s': round(record['rows'] / record['wall_s']) if record['wall_s'] else None,
+                'peak_rss_mb': record['peak_rss_mb'], 'added_rss_mb': record['added_rss_mb'],
+            })
+
+    # Compare with the latest earlier run of the same scale and stage
+    previous = {(row['scale'], row['stage']): float(row['wall_s']) for row in history}
+    for row in results:
+        before = previous.get((str(row['scale']), row['stage']))
+        change = f"{(row['wall_s'] - before) / before:+.0%}" if before else 'new'
+        logger.info(f"{row['scale']:>12,} {row['stage']:<36} {row['wall_s']:8.2f}s "
+                    f"{row['rows_per_s'] or 0:>12,} rows/s {row['peak_rss_mb']} MB peak, "
+                    f"+{row['added_rss_mb']} MB ({change})")
+
+    os.makedirs(out_dir, exist_ok=True)
+    append_csv(history_path, HISTORY_FIELDS, results)
+    logger.info(f"Benchmark results appended to {history_path}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic data")
+    parser.add_argument('--scales', type=int, nargs='+', default=[100_000, 1_000_000],
+                        help="Rows per category for each benchmarked scale")
+    parser.add_argument('--data-dir', default=None,
+                        help="Where synthetic data is generated and reused (default: a temporary directory)")
+    parser.add_argument('--shard-rows', type=int, default=1_000_000, help="Rows per CSV shard")
+    parser.add_argument('--workers', type=int, default=LOAD_WORKERS,
+                        help="Processes used by load_datasets")
+    args = parser.parse_args()
+    if args.data_dir:
+        run_benchmarks(args.scales, args.data_dir, args.shard_rows, args.workers)
+    else:
+        with tempfile.TemporaryDirectory() as data_root:
+            run_benchmarks(args.scales, data_root, args.shard_rows, args.workers)
@@ -0,0 +1,220 @@
+"""
+Persistent columnar cache of cleaned datasets.
+Each source CSV is fingerprinted (path, size, mtime, content hash); unchanged
+files are read back as typed columns and skip CSV parsing and cleaning entirely.
+"""
+import hashlib
+import json
+import os
+import pandas as pd
+from src.canonical import CANONICAL_VERSION, shard_digest
+from src.config import CACHE_DIR
+from src.utils import setup_logger
+
+# Parquet needs pyarrow; fall back to pickle (still typed, still no parsing)
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+logger = setup_logger()
+
+# Bump whenever clean_data output changes (columns, dtypes) so stale entries are re-parsed
+CACHE_VERSION = 5
+
+def written_by_current_code(entry):
+    """True if a manifest entry was written by this cleaning code and these name-resolution rules."""
+    return entry.get('version') == CACHE_VERSION and entry.get('canonical_version') == CANONICAL_VERSION
+
+def names_unchanged(entry, filename):
+    """True if the pincode decisions the rows of `filename` depend on are still those of `entry`."""
+    return entry.get('names') == shard_digest(filename)
+
+def unchanged(entry, filename):
+    """
+    True if `filename` still matches the fingerprint in `entry`. A size + mtime
+    match is trusted; otherwise the content hash decides, so a touched-but-identical
+    file still matches (and the entry takes the new mtime).
+    """
+    fingerprint = file_fingerprint(filename, with_hash=False)
+    if fingerprint['size'] != entry['size']:
+        return False
+    if fingerprint['mtime'] != entry['mtime']:
+        if content_hash(filename) != entry.get('sha1'):
+            return False
+        entry['mtime'] = fingerprint['mtime']
+    return True
+
+def content_hash(filename, block_size=1 << 20):
+    """SHA-1 of the file contents, read in blocks."""
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def file_fingerprint(filename, with_hash=True):
+    """
+    Returns the identity of a source file: path, size, mtime and (optionally)
+    content hash plus the digest of the pincode decisions its rows depend on.
+    """
+    stat = os.stat(filename)
+    fingerprint = {
+        'path': os.path.abspath(filename),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+    }
+    if with_hash:
+        fingerprint['sha1'] = content_hash(filename)
+        fingerprint['names'] = shard_digest(filename)
+    return fingerprint
+
+FRAME_EXT = 'parquet' if PARQUET_AVAILABLE else 'pkl'
+
+def read_cache_file(cache_path):
+    """Reads a cached frame; the format follows the file extension."""
+    if cache_path.endswith('.parquet'):
+        return pd.read_parquet(cache_path)
+    return pd.read_pickle(cache_path)
+
+def write_frame(target, df):
+    """Writes a frame as Parquet or pickle, following the file extension."""
+    if target.endswith('.parquet'):
+        df.to_parquet(target, index=False)
+    else:
+        df.reset_index(drop=True).to_pickle(target)
+
+def write_cache_file(cache_dir, category, df, fingerprint):
+    """
+    Writes a cleaned frame under its content hash and returns the file name.
+    Safe to call from worker processes: it never touches the manifest.
+    """
+    cache_file = f"{category}_{fingerprint['sha1'][:20]}.{FRAME_EXT}"
+    write_frame(os.path.join(cache_dir, cache_file), df)
+    return cache_file
+
+class DatasetCache:
+    """
+    Per-file cache of cleaned frames under outputs/cache.
+    The manifest maps each source path to its last fingerprint and cached file.
+    """
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.manifest_path = os.path.join(cache_dir, 'manifest.json')
+        self.ext = FRAME_EXT
+        os.makedirs(cache_dir, exist_ok=True)
+        self.manifest = {}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r') as f:
+                    self.manifest = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable cache manifest: {e}")
+
+    def lookup(self, category, filename):
+        """
+        Returns the manifest entry if the cached copy of `filename` is still valid.
+        Size + mtime match is trusted; otherwise the content hash decides, so a
+        touched-but-identical file is still a hit.
+        """
+        entry = self.manifest.get(os.path.abspath(filename))
+        if entry is None or entry.get('category') != category or entry.get('format') != self.ext:
+            return None
+        if not written_by_current_code(entry) or not names_unchanged(entry, filename):
+            return None
+        if not os.path.exists(self.path_for(entry)):
+            return None
+        return entry if unchanged(entry, filename) else None
+
+    def get(self, category, filename):
+        """Returns the cached cleaned frame for `filename`, or None on a miss."""
+        entry = self.lookup(category, filename)
+        if entry is None:
+            return None
+        try:
+            return read_cache_file(self.path_for(entry))
+        except Exception as e:
+            logger.warning(f"Cache read failed for {filename}: {e}")
+            return None
+
+    def path_for(self, entry):
+        return os.path.join(self.cache_dir, entry['cache_file'])
+
+    def put(self, category, filename, df, fingerprint=None):
+        """Stores the cleaned frame for `filename` under its content hash."""
+        fingerprint = fingerprint or file_fingerprint(filename)
+        try:
+            cache_file = write_cache_file(self.cache_dir, category, df, fingerprint)
+        except Exception as e:
+            logger.warning(f"Cache write failed for {filename}: {e}")
+            return
+        self.record(category, fingerprint, cache_file)
+
+    def record(self, category, fingerprint, cache_file):
+        """Points the manifest entry of a source file at a freshly written cache file."""
+        previous = self.manifest.get(fingerprint['path'])
+        still_used = any(e['cache_file'] == (previous or {}).get('cache_file')
+                         for path, e in self.manifest.items() if path != fingerprint['path'])
+        if previous and previous['cache_file'] != cache_file and not still_used:
+            stale = os.path.join(self.cache_dir, previous['cache_file'])
+            if os.path.exists(stale):
+                os.remove(stale)
+
+        self.manifest[fingerprint['path']] = dict(fingerprint, category=category,
+                                                  cache_file=cache_file, format=self.ext,
+                                                  version=CACHE_VERSION, canonical_version=CANONICAL_VERSION)
+
+    def save(self):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+class ShardStats:
+    """
+    Date range and canonical states of every source shard under outputs/cache,
+    checked against the shard's fingerprint like DatasetCache entries. Filtered
+    loads use it to skip shards outside their date window or state set without
+    reading them.
+    """
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.path = os.path.join(cache_dir, 'shard_stats.json')
+        self.stats = {}
+        self._dirty = False
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.stats = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable shard stats: {e}")
+
+    def lookup(self, filename):
+        """Returns {'min_date', 'max_date', 'states'} of an unchanged shard, else None."""
+        entry = self.stats.get(os.path.abspath(filename))
+        if entry is None or not written_by_current_code(entry) or not names_unchanged(entry, filename):
+            return None
+        return entry if unchanged(entry, filename) else None
+
+    def record(self, filename, dates, states, fingerprint=None):
+        """Stores the date range (None if no valid rows) and the states of a shard."""
+        fingerprint = fingerprint or file_fingerprint(filename)
+        dates = pd.Series(dates).dropna()
+        self.stats[fingerprint['path']] = {
+            'size': fingerprint['size'], 'mtime': fingerprint['mtime'], 'sha1': fingerprint['sha1'],
+            'names': fingerprint['names'], 'version': CACHE_VERSION, 'canonical_version': CANONICAL_VERSION,
+            'min_date': str(dates.min().date()) if len(dates) else None,
+            'max_date': str(dates.max().date()) if len(dates) else None,
+            'states': sorted(str(s) for s in pd.unique(pd.Series(states).dropna())),
+        }
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.stats, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
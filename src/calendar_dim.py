@@ -0,0 +1,104 @@
+"""
+Shared calendar dimension.
+The shards hold a few hundred distinct dates across millions of rows, so date
+strings are parsed once per distinct value and every row carries a compact
+integer date key (days since 1970-01-01). Calendar features (weekday, month,
+ISO year and week, YearMonth, weekend and national-holiday flags) are computed once per
+distinct date in a small dimension table and mapped back to rows by integer
+code, never derived row by row.
+"""
+import numpy as np
+import pandas as pd
+from src.holiday_calendar import HolidayCalendar
+from src.utils import setup_logger
+
+logger = setup_logger()
+
+DATE_FORMAT = '%d-%m-%Y'
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+def _national_holidays(dates):
+    if len(dates) == 0:
+        return np.zeros(0, dtype=bool)
+    return HolidayCalendar.load(dates.year.unique()).is_national(dates)
+
+def _iso_weeks(dates):
+    """ISO week labels ('2026-W01'): late-December days can belong to week 1 of the next year."""
+    iso = dates.isocalendar()
+    return (iso['year'].astype(str) + '-W' + iso['week'].astype(str).str.zfill(2)).to_numpy()
+
+# Feature name -> vectorized function of the distinct dates (a DatetimeIndex)
+CALENDAR_KEYS = {
+    'day_name': lambda dates: dates.day_name(),
+    'dayofweek': lambda dates: dates.dayofweek,
+    'month': lambda dates: dates.month,
+    'month_name': lambda dates: dates.month_name(),
+    'year': lambda dates: dates.year,
+    'iso_year': lambda dates: np.asarray(dates.isocalendar()['year'], dtype=np.int64),
+    'iso_week': _iso_weeks,
+    'YearMonth': lambda dates: dates.to_period('M'),
+    'is_weekend': lambda dates: dates.dayofweek >= 5,
+    'is_national_holiday': _national_holidays,
+}
+
+def parse_dates(values):
+    """
+    Parses a column of date strings ('%d-%m-%Y'; invalid entries become NaT),
+    converting each distinct string once.
+    """
+    codes, uniques = pd.factorize(values)
+    try:
+        parsed = pd.to_datetime(uniques, format=DATE_FORMAT, errors='coerce')
+    except Exception as e:
+        logger.warning(f"Date conversion error: {e}")
+        # Fallback for mixed formats if any (still once per distinct value)
+        parsed = pd.to_datetime(uniques, errors='coerce')
+    # Missing values carry code -1, which selects the trailing NaT
+    parsed = np.append(np.asarray(parsed, dtype='datetime64[ns]'), np.datetime64('NaT', 'ns'))
+    return parsed[codes]
+
+def date_keys(dates):
+    """Integer date key (days since 1970-01-01) of each date."""
+    return (np.asarray(dates, dtype='datetime64[D]') - EPOCH).astype(np.int32)
+
+def key_dates(keys):
+    """Dates of integer date keys."""
+    return pd.DatetimeIndex((EPOCH + np.asarray(keys, dtype='timedelta64[D]')).astype('datetime64[ns]'))
+
+def calendar_table(dates, keys=tuple(CALENDAR_KEYS)):
+    """
+    The calendar dimension: one row per distinct date, indexed by date key.
+    Keys not listed in `keys` are added on first lookup (see calendar_column).
+    """
+    dates = pd.DatetimeIndex(pd.unique(np.asarray(dates, dtype='datetime64[ns]'))).dropna().sort_values()
+    table = pd.DataFrame({'date': dates}, index=pd.Index(date_keys(dates), name='date_key'))
+    for key in keys:
+        table[key] = CALENDAR_KEYS[key](dates)
+    return table
+
+def calendar_column(table, key):
+    """One calendar key of a calendar table, computed for its dates on first use."""
+    if key not in CALENDAR_KEYS:
+        raise KeyError(f"Unknown calendar key: {key}")
+    if key not in table.columns:
+        table[key] = CALENDAR_KEYS[key](pd.DatetimeIndex(table['date']))
+    return table[key]
+
+def lookup(table, keys, key):
+    """A calendar key for every integer date key, gathered from the calendar table by position."""
+    column = calendar_column(table, key)
+    return pd.Index(column.array.take(np.searchsorted(table.index.to_numpy(), keys)))
+
+def calendar_key(dates, key, table=None):
+    """
+    A calendar key (see CALENDAR_KEYS) for every entry of a date (or date key)
+    column, looked up in `table` (default: a calendar table of the distinct
+    dates, built for this call).
+    """
+    keys = np.asarray(dates)
+    if not np.issubdtype(keys.dtype, np.integer):
+        keys = date_keys(keys)
+    if table is None:
+        table = calendar_table(key_dates(np.unique(keys)), keys=())
+    return lookup(table, keys, key)
@@ -0,0 +1,350 @@
+"""
+State/district name canonicalization.
+Raw state names come misspelled, differently cased, under legacy names or as
+cities. Each distinct raw name is resolved once: normalized (case, spacing,
+'&'), then looked up in the canonical state list and an alias table. Names that
+stay unresolved (cities, merged UTs) fall back to the state their pincode, or
+its 3-digit prefix, belongs to in rows that did resolve. For the shards of a
+category these decisions come from the pincode reference, built over all of
+the category's shards, so a row gets the same state whatever it is loaded with
+(a whole shard, a chunk, a slice) and in whatever order. Districts are merged
+per canonical state on the same normalized key. Resolutions are memoized on
+disk, so cleaning costs O(distinct names) and no rows are dropped: a name
+nothing resolves keeps its tidied raw spelling, a missing one becomes
+UNKNOWN_STATE.
+The memo (and the reference next to it) lives at CANONICAL_NAMES_PATH unless
+$AADHAAR_CANONICAL_NAMES names another file (worker processes inherit it), so
+throwaway data such as test fixtures or synthetic benchmarks never feeds
+production resolutions.
+"""
+import hashlib
+import json
+import os
+import re
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from src.config import CANONICAL_NAMES_PATH, STATE_CODE_MAP
+from src.utils import setup_logger
+
+logger = setup_logger()
+
+# Bump when the alias table or the key rules change: stale memos are discarded,
+# and cached frames, shard stats and stored columns are rebuilt (src/cache.py)
+CANONICAL_VERSION = 3
+
+UNKNOWN_STATE = 'Unknown'
+
+# Normalized raw name -> canonical state (None: ambiguous, resolve by pincode)
+STATE_ALIASES = {
+    'orissa': 'Odisha',
+    'pondicherry': 'Puducherry',
+    'westbangal': 'West Bengal',
+    'uttaranchal': 'Uttarakhand',
+    'chhatisgarh': 'Chhattisgarh',
+    'telengana': 'Telangana',
+    'nctofdelhi': 'Delhi',
+    'newdelhi': 'Delhi',
+    'andamanandnicobar': 'Andaman and Nicobar Islands',
+    # Merged in 2020; the pincode tells Dadra and Nagar Haveli from Daman and Diu
+    'dadraandnagarhavelianddamananddiu': None,
+}
+
+MEMO_ENV = 'AADHAAR_CANONICAL_NAMES'
+
+def memo_path():
+    """The memo file in effect: $AADHAAR_CANONICAL_NAMES, else CANONICAL_NAMES_PATH."""
+    return os.environ.get(MEMO_ENV) or CANONICAL_NAMES_PATH
+
+@contextmanager
+def names_memo(path):
+    """Resolves names against the memo at `path` within the block (worker processes started in it too)."""
+    previous = os.environ.get(MEMO_ENV)
+    os.environ[MEMO_ENV] = path
+    try:
+        yield path
+    finally:
+        if previous is None:
+            os.environ.pop(MEMO_ENV, None)
+        else:
+            os.environ[MEMO_ENV] = previous
+
+def name_key(name):
+    """Matching key of a name: lower case letters and digits only, '&' read as 'and'."""
+    return re.sub(r'[^a-z0-9]', '', str(name).lower().replace('&', 'and'))
+
+def display_name(name):
+    """Tidy display form: footnote stars and repeated spaces removed, all-caps/lower-case titled."""
+    name = re.sub(r'\s+', ' ', str(name).replace('*', '')).strip()
+    return name.title() if name.isupper() or name.islower() else name
+
+_CANONICAL_STATES = {name_key(state): state for state in STATE_CODE_MAP}
+
+def resolve_state(raw):
+    """Canonical state of a raw name, or None if only its pincode can tell."""
+    key = name_key(raw)
+    if key in _CANONICAL_STATES:
+        return _CANONICAL_STATES[key]
+    return STATE_ALIASES.get(key)
+
+def _modal(keys, states, rows=1):
+    """{key: state with the most rows} over paired arrays (ties: first state name), whatever their order."""
+    counts = pd.DataFrame({'key': keys, 'state': states, 'rows': rows})
+    counts = counts.groupby(['key', 'state'], as_index=False)['rows'].sum()
+    counts = counts.sort_values(['key', 'rows', 'state'], ascending=[True, False, True])
+    return counts.drop_duplicates('key').set_index('key')['state'].to_dict()
+
+def _pincodes(df):
+    if 'pincode' not in df.columns:
+        return np.full(len(df), -1, dtype=np.int64)
+    return pd.to_numeric(df['pincode'], errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+
+def _pair_key(raw, pincode):
+    return f'{raw}|{pincode}'
+
+def _categorical(values):
+    return values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype('category')
+
+def pincode_inputs(df):
+    """
+    What a raw shard contributes to the pincode reference: rows per (pincode,
+    state) among the rows whose name resolves on its own, and the distinct
+    (raw name, pincode) pairs of the rows that do not.
+    """
+    raw = _categorical(df['state'])
+    codes = raw.cat.codes.to_numpy()
+    names = raw.cat.categories.astype(str)
+    named = np.array([resolve_state(name) for name in names] + [None], dtype=object)[codes]
+    pincodes = _pincodes(df)
+    resolved = pd.notna(named)
+    counts = pd.DataFrame({'pincode': pincodes[resolved], 'state': named[resolved]}).value_counts()
+    # Missing names (code -1) go under UNKNOWN_STATE, not through the reference
+    unmatched = ~resolved & (codes >= 0)
+    pairs = set(zip(names[codes[unmatched]], pincodes[unmatched].tolist()))
+    return {'counts': [[int(pincode), state, int(rows)] for (pincode, state), rows in counts.items()],
+            'pairs': sorted([name, pincode] for name, pincode in pairs)}
+
+def reference_path():
+    """The pincode reference kept next to the memo in effect."""
+    return os.path.join(os.path.dirname(memo_path()), 'pincode_reference.json')
+
+def _file_version(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+class PincodeReference:
+    """
+    States of the (raw name, pincode) pairs no name rule resolves, decided once
+    per category over the pincode_inputs of all its shards: the state most rows
+    with the same pincode resolve to, else with the same 3-digit prefix (ties:
+    first state name). Cached rows carry the digest of the decisions they
+    depend on (see shard_digest), so a shard is only cleaned again when one of
+    its own decisions changes.
+    """
+    def __init__(self, path=None):
+        self.path = path or reference_path()
+        self.version = _file_version(self.path)
+        data = {}
+        if self.version is not None:
+            try:
+                with open(self.path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+        if data.get('version') != CANONICAL_VERSION:
+            data = {'categories': {}, 'shards': {}}
+        self.categories, self.shards = data['categories'], data['shards']
+
+    def decisions(self, category):
+        """{'raw name|pincode': state, or None if nothing places it} of a category."""
+        return self.categories.get(category, {})
+
+    def build(self, category, inputs):
+        """Decides the pairs of a category from the pincode_inputs of its shards ({path: inputs}) and saves."""
+        counts = pd.DataFrame([row for entry in inputs.values() for row in entry['counts']],
+                              columns=['pincode', 'state', 'rows'])
+        pincodes = counts['pincode'].to_numpy(dtype=np.int64)
+        states, rows = counts['state'].to_numpy(dtype=object), counts['rows'].to_numpy()
+        exact = _modal(pincodes, states, rows)
+        prefix = _modal(pincodes // 1000, states, rows)
+
+        decided = {}
+        self.shards = {path: entry for path, entry in self.shards.items() if entry['category'] != category}
+        for path, entry in inputs.items():
+            keys = [_pair_key(name, pincode) for name, pincode in entry['pairs']]
+            for key, (_, pincode) in zip(keys, entry['pairs']):
+                decided[key] = exact.get(pincode) or prefix.get(pincode // 1000)
+            self.shards[path] = {'category': category, 'pairs': keys}
+        self.categories[category] = decided
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        staging = f'{self.path}.{os.getpid()}.tmp'
+        with open(staging, 'w') as f:
+            json.dump({'version': CANONICAL_VERSION, 'categories': self.categories, 'shards': self.shards},
+                      f, sort_keys=True)
+        os.replace(staging, self.path)
+        self.version = _file_version(self.path)
+        logger.info(f"Pincode reference: placed {sum(map(bool, decided.values()))}/{len(decided)} "
+                    f"unmatched {category} (state name, pincode) pairs")
+
+    def shard_digest(self, filename):
+        """Digest of the decisions the rows of a shard depend on (None if the shard is not in the reference)."""
+        entry = self.shards.get(os.path.abspath(filename))
+        if entry is None:
+            return None
+        decided = self.decisions(entry['category'])
+        used = {key: decided.get(key) for key in entry['pairs']}
+        return hashlib.sha1(json.dumps(used, sort_keys=True).encode()).hexdigest()[:16]
+
+_reference = None
+
+def pincode_reference():
+    """The reference in effect; re-read once the file is replaced (e.g. by the parent of a worker)."""
+    global _reference
+    path = reference_path()
+    if _reference is None or _reference.path != path or _reference.version != _file_version(path):
+        _reference = PincodeReference(path)
+    return _reference
+
+def shard_digest(filename):
+    """Digest of the pincode decisions a shard's rows depend on (see PincodeReference)."""
+    return pincode_reference().shard_digest(filename)
+
+class NameIndex:
+    """Memoized raw -> canonical mappings, shared across runs through a JSON file."""
+    def __init__(self, path=None):
+        self.path = path or memo_path()
+        self.memo = self._read()
+        self._dirty = False
+
+    def _read(self):
+        empty = {'version': CANONICAL_VERSION, 'states': {}, 'districts': {}}
+        if not os.path.exists(self.path):
+            return empty
+        try:
+            with open(self.path) as f:
+                memo = json.load(f)
+        except (OSError, ValueError):
+            return empty
+        return memo if memo.get('version') == CANONICAL_VERSION else empty
+
+    def _remember(self, table, key, value):
+        if key not in self.memo[table] or self.memo[table][key] != value:
+            self.memo[table][key] = value
+            self._dirty = True
+
+    def states(self, raw_names):
+        """Canonical state (or None) of each distinct raw name."""
+        resolved = []
+        for raw in raw_names:
+            if raw not in self.memo['states']:
+                self._remember('states', raw, resolve_state(raw))
+            resolved.append(self.memo['states'][raw])
+        return resolved
+
+    def canonicalize(self, df, category=None):
+        """
+        Replaces the state/district columns of a frame by canonical names (as
+        categoricals). Unresolved names of a `category` are placed by its
+        pincode reference.
+        """
+        if 'state' not in df.columns:
+            return df
+        raw = _categorical(df['state'])
+        raw_codes = raw.cat.codes.to_numpy()
+        named = self.states(raw.cat.categories.astype(str))
+        # Missing names carry code -1, which selects the trailing Unknown entry
+        states = np.array(named + [UNKNOWN_STATE], dtype=object)[raw_codes]
+
+        unresolved = pd.isna(states)
+        if unresolved.any():
+            decisions = pincode_reference().decisions(category) if category else {}
+            states[unresolved] = self._by_pincode(df, raw, raw_codes, states, unresolved, decisions)
+        state_codes, canonical = pd.factorize(states, sort=True)
+        df['state'] = pd.Categorical.from_codes(state_codes, categories=canonical)
+        if 'district' in df.columns:
+            df['district'] = self._districts(df['district'], state_codes, canonical)
+        self.save()
+        return df
+
+    def _by_pincode(self, df, raw, raw_codes, states, unresolved, decisions):
+        """
+        States of rows whose name did not resolve: the reference `decisions`,
+        else (pairs it does not hold, e.g. a frame not read from a category's
+        shards) the exact pincode, then 3-digit prefix, of this frame's resolved
+        rows; a pair nothing places keeps its raw name.
+        """
+        pincodes = _pincodes(df)
+        # One decision per distinct (raw name, pincode) pair
+        pairs, inverse = np.unique(np.stack([raw_codes[unresolved], pincodes[unresolved]]), axis=1,
+                                   return_inverse=True)
+        keys = [_pair_key(raw.cat.categories[raw_code], pincode) for raw_code, pincode in pairs.T]
+        decided = [decisions.get(key) for key in keys]
+
+        undecided = [i for i, key in enumerate(keys) if key not in decisions]
+        if undecided:
+            known = ~unresolved
+            exact = _modal(pincodes[known], states[known])
+            prefix = _modal(pincodes[known] // 1000, states[known])
+            for i in undecided:
+                decided[i] = exact.get(pairs[1][i]) or prefix.get(pairs[1][i] // 1000)
+        logger.info(f"Canonicalized {sum(map(bool, decided))}/{len(decided)} "
+                    f"unmatched (state name, pincode) pairs by pincode")
+        decided = [state or display_name(raw.cat.categories[raw_code])
+                   for state, raw_code in zip(decided, pairs[0])]
+        return np.array(decided, dtype=object)[inverse.ravel()]
+
+    def _districts(self, districts, state_codes, canonical):
+        """Merges district spellings per canonical state; one decision per distinct (state, district)."""
+        raw = _categorical(districts)
+        width = len(raw.cat.categories) + 1
+        # Missing districts (code -1) stay missing
+        pairs, inverse = np.unique(state_codes.astype(np.int64) * width + raw.cat.codes.to_numpy() + 1,
+                                   return_inverse=True)
+        names = []
+        for pair in pairs:
+            state_code, code = divmod(int(pair), width)
+            if code == 0:
+                names.append(None)
+                continue
+            name = str(raw.cat.categories[code - 1])
+            memo_key = f'{canonical[state_code]}|{name_key(name)}'
+            if memo_key not in self.memo['districts']:
+                self._remember('districts', memo_key, display_name(name))
+            names.append(self.memo['districts'][memo_key])
+        return pd.Categorical(np.array(names, dtype=object)[inverse.ravel()])
+
+    def save(self):
+        """
+        Writes new resolutions, merged with any written meanwhile by another
+        process; a spelling already on disk wins, so the first one written sticks.
+        """
+        if not self._dirty:
+            return
+        on_disk = self._read()
+        for table in ['states', 'districts']:
+            for key, value in self.memo[table].items():
+                on_disk[table].setdefault(key, value)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        staging = f'{self.path}.{os.getpid()}.tmp'
+        with open(staging, 'w') as f:
+            json.dump(on_disk, f, sort_keys=True)
+        os.replace(staging, self.path)
+        self.memo, self._dirty = on_disk, False
+
+_index = None
+
+def canonicalize_names(df, category=None):
+    """Canonicalizes state/district names with the process-wide index of the memo in effect."""
+    global _index
+    if _index is None or _index.path != memo_path():
+        _index = NameIndex()
+    return _index.canonicalize(df, category)
+
+def canonical_states(df, category=None):
+    """Canonical state of every row of a raw frame (the frame itself is left unchanged)."""
+    keys = df[[col for col in ['state', 'pincode'] if col in df.columns]].copy()
+    return canonicalize_names(keys, category)['state']
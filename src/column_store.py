@@ -0,0 +1,299 @@
+"""
+Memory-mapped columnar store of the cleaned history.
+Each category is a set of immutable segments, one per source shard: one .npy
+file per column (categorical columns as integer codes plus their categories)
+with rows in date order and a per-date row offset table. A manifest lists the
+segments of the current version and is replaced atomically, so a sync only
+loads and writes the shards that changed, and readers never see a category
+half-written. Columns are opened lazily with mmap, so a reader pages in only
+the columns and date ranges it touches, worker processes share the same pages
+zero-copy, and no category has to stay resident as a DataFrame.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from src.config import STORE_DIR, CHUNK_SIZE, LOAD_WORKERS
+from src.cache import CACHE_VERSION, file_fingerprint, names_unchanged, unchanged, written_by_current_code
+from src.calendar_dim import calendar_key
+from src.canonical import CANONICAL_VERSION
+from src.data_loader import concat_frames, list_files, load_shards, refresh_pincode_reference
+from src.utils import file_lock, setup_logger, numeric_columns
+
+logger = setup_logger()
+
+MANIFEST_FILE = 'manifest.json'
+META_FILE = 'meta.json'
+LOCK_FILE = '.lock'
+
+def write_segment(path, df):
+    """
+    Persists a cleaned frame column by column as the segment directory `path`
+    (staged next to it and moved into place); returns the segment metadata.
+    """
+    if not df['date'].is_monotonic_increasing:
+        df = df.sort_values('date', kind='stable', ignore_index=True)
+    staging = f'{path}.{os.getpid()}.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    columns = [c for c in df.columns if c != 'YearMonth']
+    categories = {}
+    for name in columns:
+        values = df[name]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            categories[name] = values.cat.categories.tolist()
+            values = values.cat.codes
+        np.save(os.path.join(staging, f'{name}.npy'), values.to_numpy())
+
+    dates, starts = np.unique(df['date'].to_numpy(), return_index=True)
+    np.save(os.path.join(staging, '_dates.npy'), dates)
+    np.save(os.path.join(staging, '_date_offsets.npy'), np.append(starts, len(df)).astype(np.int64))
+
+    meta = {'rows': len(df), 'columns': columns,
+            'numeric_cols': numeric_columns(df), 'categories': categories}
+    with open(os.path.join(staging, META_FILE), 'w') as f:
+        json.dump(meta, f)
+    # Segment names are unique to their contents, so an existing one is already complete
+    if os.path.exists(path):
+        shutil.rmtree(staging)
+    else:
+        os.replace(staging, path)
+    return meta
+
+class Segment:
+    """Lazily opened, memory-mapped columns of one segment."""
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        self._arrays = {}
+        self._dates = None
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def __getstate__(self):
+        # Workers re-open the column files: only the path and metadata are pickled
+        state = dict(self.__dict__)
+        state['_arrays'], state['_dates'] = {}, None
+        return state
+
+    def _array(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r')
+        return self._arrays[name]
+
+    @property
+    def dates(self):
+        """Distinct dates (sorted) and the row offset at which each one starts."""
+        if self._dates is None:
+            self._dates = (pd.DatetimeIndex(self._array('_dates')), self._array('_date_offsets'))
+        return self._dates
+
+    def row_range(self, start=None, end=None):
+        """Row slice holding the dates in [start, end]."""
+        dates, offsets = self.dates
+        first = 0 if start is None else dates.searchsorted(pd.Timestamp(start))
+        last = len(dates) if end is None else dates.searchsorted(pd.Timestamp(end), side='right')
+        return slice(int(offsets[first]), int(offsets[last]))
+
+    def column(self, name, rows=slice(None)):
+        """One column over a row slice; memory-mapped arrays are only copied where needed."""
+        if name not in self.meta['columns']:
+            # Shards of one category may differ in optional columns, as in a concat
+            return np.full(len(range(*rows.indices(len(self)))), np.nan)
+        values = self._array(name)[rows]
+        categories = self.meta['categories'].get(name)
+        if categories is not None:
+            return pd.Categorical.from_codes(values, categories=categories)
+        return values
+
+    def frame(self, names, start=None, end=None):
+        rows = self.row_range(start, end)
+        return pd.DataFrame({name: self.column(name, rows) for name in names})
+
+class StoredDataset:
+    """The segments of one category, read as a single table in date order."""
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            self.meta = json.load(f)
+        self.category = self.meta['category']
+        self.columns = list(self.meta['columns'])
+        self.numeric_cols = list(self.meta['numeric_cols'])
+        self.segments = [Segment(os.path.join(path, entry['name']))
+                         for entry in self.meta['segments'] if entry['name']]
+        self._dates = None
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_dates'] = None
+        return state
+
+    @property
+    def dates(self):
+        """Distinct dates (sorted) over all segments and the row offset at which each one starts."""
+        if self._dates is None:
+            counts = pd.concat([pd.Series(np.diff(offsets), index=dates)
+                                for dates, offsets in (s.dates for s in self.segments)])
+            counts = counts.groupby(level=0).sum()
+            self._dates = (pd.DatetimeIndex(counts.index), np.append(0, np.cumsum(counts.to_numpy())))
+        return self._dates
+
+    def column(self, name, start=None, end=None):
+        """One column for the dates in [start, end], in date order."""
+        return self.frame([name], start, end)[name]
+
+    def frame(self, columns=None, start=None, end=None):
+        """Materializes `columns` (default: all, plus YearMonth) for the dates in [start, end]."""
+        names = [name for name in (self.columns if columns is None else columns) if name != 'YearMonth']
+        read = names if 'date' in names else names + ['date']
+        df = concat_frames([segment.frame(read, start, end) for segment in self.segments])
+        if len(self.segments) > 1:
+            # Segments follow file order, so a stable sort keeps the order of a concatenated load
+            df = df.sort_values('date', kind='stable', ignore_index=True)
+        df = df[names]
+        if columns is None or 'YearMonth' in columns:
+            df['YearMonth'] = calendar_key(df['date'], 'YearMonth')
+        return df
+
+    def iter_frames(self, columns=None, chunk_rows=CHUNK_SIZE):
+        """Yields frames of about `chunk_rows` rows, split on date boundaries."""
+        dates, offsets = self.dates
+        first = 0
+        while first < len(dates):
+            last = max(first + 1, int(np.searchsorted(offsets, offsets[first] + chunk_rows, side='right')) - 1)
+            last = min(last, len(dates))
+            yield self.frame(columns, dates[first], dates[last - 1])
+            first = last
+
+class ColumnStore:
+    """
+    One directory per category: a manifest plus one segment directory per
+    shard. Writers hold the category's lock file; segments are never changed
+    in place, and ones no longer listed are removed after the manifest swap.
+    """
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+
+    def path_for(self, category):
+        return os.path.join(self.root, category)
+
+    def _manifest(self, category):
+        """The current manifest of a category, or None if missing or written by older code."""
+        try:
+            with open(os.path.join(self.path_for(category), MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return manifest if written_by_current_code(manifest) else None
+
+    def _commit(self, category, segments):
+        """Atomically replaces the manifest, then drops segments (and older layouts) it no longer lists."""
+        target = self.path_for(category)
+        written = [entry for entry in segments if entry['name']]
+        columns, numeric_cols = [], []
+        for entry in written:
+            columns += [c for c in entry['columns'] if c not in columns]
+            numeric_cols += [c for c in entry['numeric_cols'] if c not in numeric_cols]
+        manifest = {'category': category, 'version': CACHE_VERSION, 'canonical_version': CANONICAL_VERSION,
+                    'rows': sum(entry['rows'] for entry in written), 'columns': columns,
+                    'numeric_cols': numeric_cols, 'segments': segments}
+        staging = os.path.join(target, f'{MANIFEST_FILE}.{os.getpid()}.tmp')
+        with open(staging, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(staging, os.path.join(target, MANIFEST_FILE))
+
+        keep = {entry['name'] for entry in written} | {MANIFEST_FILE, LOCK_FILE}
+        for name in os.listdir(target):
+            if name not in keep:
+                path = os.path.join(target, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+        return manifest
+
+    def write(self, category, df):
+        """Replaces a category with one segment holding a cleaned frame; returns the opened dataset."""
+        target = self.path_for(category)
+        with file_lock(os.path.join(target, LOCK_FILE)):
+            name = f'frame_{os.getpid()}_{time.time_ns()}'
+            meta = write_segment(os.path.join(target, name), df)
+            self._commit(category, [{'source': None, 'name': name, 'rows': meta['rows'],
+                                     'columns': meta['columns'], 'numeric_cols': meta['numeric_cols']}])
+        return StoredDataset(target)
+
+    def _sync_category(self, category, files, workers, use_cache):
+        """
+        Rewrites the segments of new or changed shards, loading them (through
+        the per-shard cache) `workers` at a time, and reuses the rest.
+        """
+        target = self.path_for(category)
+        manifest = self._manifest(category)
+        previous = {entry['source']: entry for entry in manifest['segments']} if manifest else {}
+        segments, changed, touched = {}, [], False
+        for filename in files:
+            entry = previous.get(os.path.abspath(filename))
+            mtime = entry['mtime'] if entry else None
+            if entry is not None and names_unchanged(entry, filename) and unchanged(entry, filename):
+                segments[entry['source']] = entry
+                # A touched but identical shard keeps its segment under its new mtime
+                touched |= entry['mtime'] != mtime
+            else:
+                changed.append(filename)
+        if manifest and not changed and not touched and len(segments) == len(previous):
+            return manifest
+
+        logger.info(f"Column store: writing {len(changed)} of {len(files)} {category} segments")
+        batch = max(1, workers)
+        for i in range(0, len(changed), batch):
+            filenames = changed[i:i + batch]
+            loaded = dict(load_shards({category: filenames}, workers, use_cache).get(category, []))
+            for filename in filenames:
+                fingerprint = file_fingerprint(filename)
+                df = loaded.pop(filename, None)
+                # Shards failing validation are recorded without a segment, so they are not retried
+                entry = {'source': fingerprint['path'], 'size': fingerprint['size'], 'mtime': fingerprint['mtime'],
+                         'sha1': fingerprint['sha1'], 'names': fingerprint['names'], 'name': None, 'rows': 0}
+                if df is not None:
+                    # Unique to what the rows depend on: shard contents, pincode decisions, code versions
+                    key = [fingerprint['sha1'], fingerprint['names'], CACHE_VERSION, CANONICAL_VERSION]
+                    entry['name'] = hashlib.sha1(json.dumps(key).encode()).hexdigest()[:20]
+                    meta = write_segment(os.path.join(target, entry['name']), df)
+                    entry.update(rows=meta['rows'], columns=meta['columns'], numeric_cols=meta['numeric_cols'])
+                segments[entry['source']] = entry
+        ordered = [segments[os.path.abspath(f)] for f in files]
+        return self._commit(category, ordered)
+
+    def sync(self, data_dirs, workers=LOAD_WORKERS, use_cache=True):
+        """
+        Brings the store up to date with the shard files and returns
+        {category: StoredDataset}. Unchanged shards keep their segments; only
+        new or changed shards are loaded and written, a few at a time.
+        """
+        refresh_pincode_reference(data_dirs, workers)
+        stored = {}
+        for category, path in data_dirs.items():
+            files = list_files(path)
+            if not files:
+                logger.warning(f"No files found for {category}")
+                continue
+            with file_lock(os.path.join(self.path_for(category), LOCK_FILE)):
+                manifest = self._sync_category(category, files, workers, use_cache)
+            if not manifest['rows']:
+                continue
+            stored[category] = StoredDataset(self.path_for(category))
+            logger.info(f"Column store: {len(stored[category])} {category} rows mapped")
+        return stored
+
+def open_store(data_dirs, workers=LOAD_WORKERS, use_cache=True):
+    """Syncs the default store and returns the lazily opened datasets."""
+    return ColumnStore().sync(data_dirs, workers, use_cache)
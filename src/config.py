@@ -11,14 +11,106 @@ DATA_DIRS = {
     'enrolment': os.path.join(BASE_DIR, 'data', 'api_data_aadhar_enrolment')
 }
 
+# Worker processes used to parse shard files and categories concurrently
+LOAD_WORKERS = os.cpu_count() or 1
+
+# Worker processes used to run independent pipeline stages concurrently
+PIPELINE_WORKERS = os.cpu_count() or 1
+
+# Agg worker processes rasterizing figures off the analysis path
+FIGURE_WORKERS = os.cpu_count() or 1
+
+# Rows per chunk when streaming CSVs (bounds peak memory of the streaming loader)
+CHUNK_SIZE = 500_000
+
+# How full runs build their cubes and location indexes:
+# 'memory' maps the cleaned history from the column store;
+# 'partitioned' streams shard files out of core and sums per-shard partial aggregates;
+# 'stream' reads them in CHUNK_SIZE chunks in one process, into running aggregators
+EXECUTION_BACKEND = 'memory'
+
+# Local query service (src/query_service.py): bind address, result LRU size
+# and how often the shard folders are checked for new drops
+QUERY_HOST = '127.0.0.1'
+QUERY_PORT = 8765
+QUERY_CACHE_SIZE = 256
+QUERY_REFRESH_SECONDS = 30
+
+# Compact in-memory schema per category, applied at read time.
+# 'category' columns are dictionary-encoded (groupbys run on integer codes);
+# 'count' columns are downcast to the narrowest unsigned integer holding their values.
+_DIMENSION_DTYPES = {'state': 'category', 'district': 'category', 'pincode': 'uint32'}
+DTYPE_SCHEMA = {
+    'biometric': {**_DIMENSION_DTYPES, 'bio_age_5_17': 'count', 'bio_age_17_': 'count'},
+    'demographic': {**_DIMENSION_DTYPES, 'demo_age_5_17': 'count', 'demo_age_17_': 'count'},
+    'enrolment': {**_DIMENSION_DTYPES, 'age_0_5': 'count', 'age_5_17': 'count', 'age_18_greater': 'count'},
+}
+
+# Mapping of State Names to Holidays State Codes
+STATE_CODE_MAP = {
+    'Andaman and Nicobar Islands': 'AN',
+    'Andhra Pradesh': 'AP',
+    'Arunachal Pradesh': 'AR',
+    'Assam': 'AS',
+    'Bihar': 'BR',
+    'Chandigarh': 'CH',
+    'Chhattisgarh': 'CG',
+    'Dadra and Nagar Haveli': 'DN',
+    'Daman and Diu': 'DD',
+    'Delhi': 'DL',
+    'Goa': 'GA',
+    'Gujarat': 'GJ',
+    'Haryana': 'HR',
+    'Himachal Pradesh': 'HP',
+    'Jammu and Kashmir': 'JK',
+    'Jharkhand': 'JH',
+    'Karnataka': 'KA',
+    'Kerala': 'KL',
+    'Ladakh': 'LA',
+    'Lakshadweep': 'LD',
+    'Madhya Pradesh': 'MP',
+    'Maharashtra': 'MH',
+    'Manipur': 'MN',
+    'Meghalaya': 'ML',
+    'Mizoram': 'MZ',
+    'Nagaland': 'NL',
+    'Odisha': 'OR',
+    'Puducherry': 'PY',
+    'Punjab': 'PB',
+    'Rajasthan': 'RJ',
+    'Sikkim': 'SK',
+    'Tamil Nadu': 'TN',
+    'Telangana': 'TS',
+    'Tripura': 'TR',
+    'Uttar Pradesh': 'UP',
+    'Uttarakhand': 'UK',
+    'West Bengal': 'WB'
+}
+
 # Output directories
 OUTPUTS_DIR = os.path.join(BASE_DIR, 'outputs')
 FIGURES_DIR = os.path.join(OUTPUTS_DIR, 'figures')
 REPORTS_DIR = os.path.join(OUTPUTS_DIR, 'reports')
 TABLES_DIR = os.path.join(OUTPUTS_DIR, 'tables')
+CACHE_DIR = os.path.join(OUTPUTS_DIR, 'cache')
+STATE_DIR = os.path.join(OUTPUTS_DIR, 'state')
+# Memo of raw -> canonical state/district names (src/canonical.py); the
+# AADHAAR_CANONICAL_NAMES environment variable points it elsewhere (tests, benchmarks)
+CANONICAL_NAMES_PATH = os.path.join(CACHE_DIR, 'canonical_names.json')
+# Memory-mapped column files of the cleaned history; created on demand
+STORE_DIR = os.path.join(OUTPUTS_DIR, 'store')
+# Per-stage cProfile dumps (main.py --cprofile); created on demand
+PROFILE_DIR = os.path.join(OUTPUTS_DIR, 'profiles')
+# Benchmark history (src/benchmark.py); created on demand
+BENCHMARK_DIR = os.path.join(OUTPUTS_DIR, 'benchmarks')
+
+# Created when a run starts (ensure_output_dirs), not as a side effect of importing config
+OUTPUT_DIRS = [FIGURES_DIR, REPORTS_DIR, TABLES_DIR, CACHE_DIR, STATE_DIR]
 
-for d in [FIGURES_DIR, REPORTS_DIR, TABLES_DIR]:
-    os.makedirs(d, exist_ok=True)
+def ensure_output_dirs():
+    """Creates the output directories a run writes to."""
+    for d in OUTPUT_DIRS:
+        os.makedirs(d, exist_ok=True)
 
 # Deprecated but kept for compatibility with existing code until fully refactored
 PLOT_DIR = FIGURES_DIR
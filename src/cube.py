@@ -0,0 +1,139 @@
+"""
+Shared aggregation cube.
+Each dataset is scanned once into (state x district x date) sums of its count
+columns; every analysis then reads its group-bys from the cube instead of
+re-grouping millions of raw rows.
+"""
+import pandas as pd
+from src.calendar_dim import CALENDAR_KEYS, calendar_key, calendar_table  # noqa: F401 (re-exported)
+from src.utils import make_executor, numeric_columns
+
+DIMENSIONS = ['state', 'district', 'date']
+
+# Number of raw rows folded into each cell (lets per-row means be recovered)
+ROW_COUNT = 'Row_Count'
+
+class AggregateCube:
+    def __init__(self, data, numeric_cols):
+        self.data = data
+        self.numeric_cols = list(numeric_cols)
+        self.dims = list(data.index.names)
+        self._calendar = None
+
+    @classmethod
+    def from_frame(cls, df, numeric_cols=None):
+        """Builds the cube from a cleaned row-level frame in a single group-by pass."""
+        numeric_cols = numeric_cols or numeric_columns(df)
+        dims = [d for d in DIMENSIONS if d in df.columns]
+        grouped = df.groupby(dims, observed=True, dropna=False)
+        data = grouped[numeric_cols].sum()
+        data[ROW_COUNT] = grouped.size()
+        return cls(data, numeric_cols)
+
+    @classmethod
+    def from_chunks(cls, chunks, numeric_cols=None):
+        """
+        Builds the cube from row chunks split on date boundaries (e.g. a
+        StoredDataset): chunk cubes cover disjoint dates, so they concatenate.
+        """
+        parts = [cls.from_frame(chunk, numeric_cols) for chunk in chunks]
+        data = pd.concat([part.data for part in parts]).sort_index()
+        return cls(data, parts[0].numeric_cols)
+
+    @classmethod
+    def combine(cls, parts):
+        """
+        Sums partial cubes cell by cell. Partials may overlap (e.g. cubes of
+        separate shards) and carry different categories; the result has the
+        sorted categories of the values present, like a cube of all rows.
+        """
+        dims = parts[0].dims
+        frames = []
+        for part in parts:
+            df = part.data.reset_index()
+            for col in ['state', 'district']:
+                if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+                    df[col] = df[col].astype(object)
+            frames.append(df)
+        df = pd.concat(frames, ignore_index=True)
+        for col in ['state', 'district']:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
+        data = df.groupby(dims, observed=True, dropna=False).sum()
+        return cls(data, parts[0].numeric_cols)
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def rows(self):
+        """Number of raw rows the cube was built from."""
+        return int(self.data[ROW_COUNT].sum())
+
+    @property
+    def dates(self):
+        """Distinct dates covered by the cube (sorted)."""
+        return self.data.index.get_level_values('date').unique().sort_values()
+
+    @property
+    def calendar(self):
+        """Calendar dimension of the cube's dates, shared by all its calendar lookups."""
+        if self._calendar is None:
+            self._calendar = calendar_table(self.dates, keys=())
+        return self._calendar
+
+    def _key(self, key):
+        if key in self.dims:
+            return self.data.index.get_level_values(key)
+        if key in CALENDAR_KEYS:
+            return calendar_key(self.data.index.get_level_values('date'), key, self.calendar)
+        raise KeyError(f"Unknown cube key: {key}")
+
+    def query(self, by, cols=None, rows=False):
+        """
+        Sums `cols` (default: every count column) grouped by `by`.
+        `by` may mix cube dimensions and calendar keys (e.g. ['state', 'day_name']).
+        With rows=True the raw row count of each group is included as Row_Count.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        cols = list(cols or self.numeric_cols)
+        if rows:
+            cols.append(ROW_COUNT)
+
+        if all(key in self.dims for key in by):
+            result = self.data[cols].groupby(level=by, observed=True).sum()
+        else:
+            keys = [self._key(key).rename(key) for key in by]
+            result = self.data[cols].groupby(keys, observed=True).sum()
+        return result.reset_index()
+
+    def total(self, by, name='Total', rows=False):
+        """Like query(), plus the sum of all count columns in `name`."""
+        result = self.query(by, rows=rows)
+        result[name] = result[self.numeric_cols].sum(axis=1)
+        return result
+
+def as_cube(df):
+    """
+    Returns `df` itself if it already is a cube, else builds one from the rows
+    (a frame, or a stored dataset read chunk by chunk).
+    """
+    if df is None or isinstance(df, AggregateCube):
+        return df
+    if hasattr(df, 'iter_frames'):
+        columns = [d for d in DIMENSIONS if d in df.columns] + df.numeric_cols
+        return AggregateCube.from_chunks(df.iter_frames(columns), df.numeric_cols)
+    return AggregateCube.from_frame(df)
+
+def build_cubes(datasets, workers=1):
+    """
+    Builds one cube per dataset; analyses take the result in place of raw frames.
+    Stored (memory-mapped) datasets can be aggregated in `workers` processes,
+    which map the same column files instead of receiving pickled frames.
+    """
+    datasets = {category: df for category, df in datasets.items() if df is not None}
+    if not all(hasattr(df, 'iter_frames') for df in datasets.values()):
+        workers = 1  # frames would have to be pickled to the workers
+    with make_executor(min(workers, len(datasets))) as pool:
+        futures = {category: pool.submit(as_cube, df) for category, df in datasets.items()}
+        return {category: future.result() for category, future in futures.items()}
@@ -1,58 +1,506 @@
 import pandas as pd
+import numpy as np
 import glob
+import json
 import os
-from src.utils import setup_logger
+from pandas.api.types import union_categoricals
+from concurrent.futures import ProcessPoolExecutor
+from src.config import CACHE_DIR, CHUNK_SIZE, DTYPE_SCHEMA, LOAD_WORKERS
+from src.calendar_dim import calendar_key, date_keys, parse_dates
+from src.canonical import (CANONICAL_VERSION, canonical_states, canonicalize_names, pincode_inputs,
+                           pincode_reference)
+from src.cache import (DatasetCache, ShardStats, content_hash, file_fingerprint, read_cache_file, unchanged,
+                       write_cache_file)
+from src.profiling import Profiler, dump_dir, record_all
+from src.utils import file_lock, setup_logger, numeric_columns
 
 logger = setup_logger()
 
-def load_data(category, path):
+def list_files(path):
+    """Returns the CSV shard files under a category folder."""
+    return sorted(glob.glob(os.path.join(path, "*.csv")))
+
+# Always parsed, even under a column subset: filters and name canonicalization need them
+KEY_COLUMNS = ['date', 'state', 'pincode']
+
+class Pushdown:
+    """
+    Date window [start, end], canonical state set and column subset of a load.
+    Columns are pushed into read_csv (others are never parsed), shards whose
+    recorded date range or states (ShardStats) miss the filter are skipped
+    unread, and the remaining rows are filtered on parsed dates/canonical states.
+    """
+    def __init__(self, start=None, end=None, states=None, columns=None):
+        self.start = None if start is None else pd.Timestamp(start)
+        self.end = None if end is None else pd.Timestamp(end)
+        self.states = None if states is None else set(states)
+        self.columns = None if columns is None else list(dict.fromkeys(KEY_COLUMNS + list(columns)))
+
+    @property
+    def filters_rows(self):
+        return self.start is not None or self.end is not None or self.states is not None
+
+    def skips(self, stats):
+        """True if a shard with these ShardStats holds no row passing the filter."""
+        if stats is None or not self.filters_rows:
+            return False
+        if stats['min_date'] is None:
+            return True
+        if self.start is not None and pd.Timestamp(stats['max_date']) < self.start:
+            return True
+        if self.end is not None and pd.Timestamp(stats['min_date']) > self.end:
+            return True
+        return self.states is not None and self.states.isdisjoint(stats['states'])
+
+    def apply(self, df, filename=None, stats=None, category=None):
+        """Rows of a raw shard passing the filter; records the shard's stats in `stats`."""
+        if not self.filters_rows:
+            return df
+        dates = pd.Series(parse_dates(df['date']), index=df.index)
+        states = canonical_states(df, category)
+        if stats is not None and filename is not None:
+            stats.record(filename, dates, states)
+        return self._keep(df, dates, states)
+
+    def filter(self, df):
+        """Rows of a cleaned frame (parsed dates, canonical states) passing the filter."""
+        if not self.filters_rows:
+            return df
+        df = self._keep(df, df['date'], df['state'])
+        # Dimensions keep only the values left, as if the shard held just these rows
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].cat.remove_unused_categories()
+        return df
+
+    def _keep(self, df, dates, states):
+        keep = dates.notna().to_numpy()
+        if self.start is not None:
+            keep &= (dates >= self.start).to_numpy()
+        if self.end is not None:
+            keep &= (dates <= self.end).to_numpy()
+        if self.states is not None:
+            keep &= np.asarray(states.isin(self.states))
+        return df if keep.all() else df[keep].reset_index(drop=True)
+
+def load_data(category, path, start=None, end=None, states=None, columns=None, cache_dir=CACHE_DIR,
+              chunksize=None):
+    """
+    Reads the raw shards of a category (clean with clean_data), optionally
+    restricted to dates in [start, end], canonical `states` and `columns`
+    (see Pushdown; the key columns date, state and pincode are always read).
+    Shard stats for skipping are kept under `cache_dir`.
+    With `chunksize`, streams the category instead (see iter_data): cleaned
+    chunks of at most that many rows, to be fed to running aggregators such
+    as StreamAggregator.
+    """
+    if chunksize:
+        return iter_data(category, path, chunksize, start, end, states, columns, cache_dir)
     logger.info(f"Loading {category} data from {path}...")
-    all_files = glob.glob(os.path.join(path, "*.csv"))
+    all_files = list_files(path)
     
     if not all_files:
         logger.warning(f"No files found for {category}")
         return None
-        
+
+    refresh_pincode_reference({category: path}, workers=1)
+    pushdown = Pushdown(start, end, states, columns)
+    stats = ShardStats(cache_dir) if pushdown.filters_rows else None
     df_list = []
+    skipped = 0
     for filename in all_files:
-        try:
-            df = pd.read_csv(filename)
-            # Basic schema validation
-            if 'state' not in df.columns:
-                logger.warning(f"Skipping {filename}: Missing 'state' column")
-                continue
-            df_list.append(df)
-        except Exception as e:
-            logger.error(f"Error loading {filename}: {e}")
+        if stats is not None and pushdown.skips(stats.lookup(filename)):
+            skipped += 1
+            continue
+        df = read_file(filename, category, pushdown.columns)
+        if df is not None:
+            df_list.append(pushdown.apply(df, filename, stats, category))
+    if stats is not None:
+        stats.save()
+        logger.info(f"Skipped {skipped}/{len(all_files)} {category} shards outside the filter")
             
     if df_list:
-        combined_df = pd.concat(df_list, ignore_index=True)
+        combined_df = concat_frames(df_list)
         logger.info(f"Loaded {len(combined_df)} rows for {category}")
         return combined_df
     else:
         return None
 
-def clean_data(df, category):
-    logger.info(f"Cleaning {category} data...")
-    # Convert date
+def _pincode_inputs(category, filename):
+    df = read_file(filename, category, columns=['state', 'pincode'])
+    return {'counts': [], 'pairs': []} if df is None else pincode_inputs(df)
+
+def refresh_pincode_reference(data_dirs, workers=LOAD_WORKERS):
+    """
+    Brings the pincode reference (see canonical.PincodeReference) of every
+    category up to date with its shards, before any of them is cleaned. Only
+    the state and pincode columns of new or changed shards are read; the
+    inputs of the others are kept in a manifest next to the reference.
+    """
+    reference = pincode_reference()
+    manifest_path = os.path.join(os.path.dirname(reference.path), 'pincode_inputs.json')
+    with file_lock(manifest_path + '.lock'):
+        # Another process may have refreshed the reference meanwhile
+        reference = pincode_reference()
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        dirty = False
+        for category, path in data_dirs.items():
+            inputs, todo = {}, []
+            for filename in list_files(path):
+                entry = manifest.get(os.path.abspath(filename))
+                mtime = entry['mtime'] if entry else None
+                if (entry is not None and entry['category'] == category
+                        and entry['version'] == CANONICAL_VERSION and unchanged(entry, filename)):
+                    inputs[os.path.abspath(filename)] = entry
+                    dirty |= entry['mtime'] != mtime
+                else:
+                    todo.append(filename)
+            if workers > 1 and len(todo) > 1:
+                with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+                    results = list(pool.map(_pincode_inputs, [category] * len(todo), todo))
+            else:
+                results = [_pincode_inputs(category, filename) for filename in todo]
+            for filename, result in zip(todo, results):
+                stat = os.stat(filename)
+                inputs[os.path.abspath(filename)] = dict(result, category=category, version=CANONICAL_VERSION,
+                                                         size=stat.st_size, mtime=stat.st_mtime_ns,
+                                                         sha1=content_hash(filename))
+            removed = [p for p, e in manifest.items() if e['category'] == category and p not in inputs]
+            for source in removed:
+                del manifest[source]
+            manifest.update(inputs)
+            built = {p for p, e in reference.shards.items() if e['category'] == category}
+            if todo or removed or built != set(inputs):
+                reference.build(category, inputs)
+                dirty = True
+        if dirty:
+            staging = f'{manifest_path}.{os.getpid()}.tmp'
+            with open(staging, 'w') as f:
+                json.dump(manifest, f)
+            os.replace(staging, manifest_path)
+
+def read_dtypes(category):
+    """Returns the read_csv dtypes of a category (dictionary-encoded dimensions)."""
+    schema = DTYPE_SCHEMA.get(category, {})
+    return {col: dtype for col, dtype in schema.items() if dtype == 'category'}
+
+def apply_schema(df, category):
+    """
+    Narrows a cleaned frame to the declared schema of its category:
+    sorted categoricals, uint32 pincode, narrowest unsigned int for counts.
+    """
+    for col, dtype in DTYPE_SCHEMA.get(category, {}).items():
+        if col not in df.columns:
+            continue
+        if dtype == 'category':
+            values = df[col] if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col].astype('category')
+            if not values.cat.categories.is_monotonic_increasing:
+                values = values.cat.reorder_categories(values.cat.categories.sort_values())
+            df[col] = values
+        elif not pd.api.types.is_numeric_dtype(df[col]):
+            continue
+        elif dtype == 'count':
+            values = df[col]
+            # Only integral, non-negative counts can be narrowed safely
+            if len(values) and (values.min() < 0 or not np.array_equal(values, np.floor(values))):
+                continue
+            df[col] = pd.to_numeric(values.astype('int64'), downcast='unsigned')
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+def concat_frames(df_list):
+    """Concatenates shards, unioning their categories so dimensions stay categorical."""
+    if len(df_list) > 1:
+        for col in df_list[0].columns:
+            if isinstance(df_list[0][col].dtype, pd.CategoricalDtype) and all(col in d for d in df_list):
+                categories = union_categoricals([d[col] for d in df_list], sort_categories=True).categories
+                for d in df_list:
+                    d[col] = d[col].cat.set_categories(categories)
+    return pd.concat(df_list, ignore_index=True)
+
+def read_file(filename, category=None, columns=None):
+    """
+    Reads one CSV shard (only `columns`, if given), returning None if it is
+    unreadable or fails schema validation.
+    """
+    usecols = None if columns is None else set(columns).__contains__
+    try:
+        df = pd.read_csv(filename, dtype=read_dtypes(category), usecols=usecols)
+        # Basic schema validation
+        if 'state' not in df.columns:
+            logger.warning(f"Skipping {filename}: Missing 'state' column")
+            return None
+        return df
+    except Exception as e:
+        logger.error(f"Error loading {filename}: {e}")
+        return None
+
+def _load_shard(category, filename, cached_path=None, cache_dir=None, profile_dir=None):
+    """
+    Loads one cleaned shard: from its cache file if given, else via read_csv + clean.
+    Runs inside worker processes, so cache writes return (fingerprint, cache_file)
+    for the parent to record in the manifest, along with the read/clean timings.
+    """
+    profiler = Profiler(profile_dir)
+    name = f'{category}/{os.path.basename(filename)}'
+    if cached_path:
+        try:
+            with profiler.stage(name, kind='cache') as record:
+                df = read_cache_file(cached_path)
+                record['rows'] = len(df)
+            return df, None, None, profiler.records
+        except Exception as e:
+            logger.warning(f"Cache read failed for {filename}: {e}")
+
+    with profiler.stage(name, kind='read') as record:
+        df = read_file(filename, category)
+        record['rows'] = 0 if df is None else len(df)
+    if df is None:
+        return None, None, None, profiler.records
+    with profiler.stage(name, kind='clean', rows=len(df)):
+        df = _clean(df, category)
+    if cache_dir is None:
+        return df, None, None, profiler.records
+
+    fingerprint = file_fingerprint(filename)
     try:
-        df['date'] = pd.to_datetime(df['date'], format='%d-%m-%Y', errors='coerce')
+        cache_file = write_cache_file(cache_dir, category, df, fingerprint)
     except Exception as e:
-        logger.warning(f"Date conversion error in {category}: {e}")
-        # Fallback for mixed formats if any
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
+        logger.warning(f"Cache write failed for {filename}: {e}")
+        return df, None, None, profiler.records
+    return df, fingerprint, cache_file, profiler.records
 
-    # Drop rows with invalid dates
-    df = df.dropna(subset=['date']).copy()
+def load_shards(shards, workers=LOAD_WORKERS, use_cache=True, pushdown=None):
+    """
+    Loads and cleans the given shard files ({category: [filename, ...]}),
+    parsing shards of all categories concurrently in a pool of `workers` processes.
+    Shards whose fingerprint matches the columnar cache are read back typed;
+    only new or changed shards go through read_csv + clean_data.
+    Returns {category: [(filename, frame), ...]} in file order; shards failing
+    validation are skipped. With a Pushdown, shards whose recorded stats miss
+    its filter are not loaded and the rows of the others are filtered after
+    cleaning (the cache always holds whole shards).
+    """
+    cache = DatasetCache() if use_cache else None
+    # Date ranges/states of the loaded shards, for skipping them in filtered loads
+    stats = ShardStats() if cache else None
+    tasks = []
+    for category, filenames in shards.items():
+        for filename in filenames:
+            if pushdown is not None and stats is not None and pushdown.skips(stats.lookup(filename)):
+                continue
+            entry = cache.lookup(category, filename) if cache else None
+            tasks.append((category, filename,
+                          cache.path_for(entry) if entry else None,
+                          cache.cache_dir if cache else None,
+                          dump_dir()))
 
-    # Fill NaNs in numeric columns
-    numeric_cols = df.select_dtypes(include=['number']).columns
-    df[numeric_cols] = df[numeric_cols].fillna(0)
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            results = list(pool.map(_load_shard, *zip(*tasks)))
+    else:
+        results = [_load_shard(*task) for task in tasks]
+
+    loaded = {}
+    hits = {}
+    for (category, filename, cached_path, _, _), (df, fingerprint, cache_file, records) in zip(tasks, results):
+        record_all(records)
+        if df is None:
+            continue
+        if cache_file:
+            cache.record(category, fingerprint, cache_file)
+        if stats is not None and stats.lookup(filename) is None:
+            stats.record(filename, df['date'], df['state'], fingerprint)
+        if pushdown is not None:
+            df = pushdown.filter(df)
+            if df.empty:
+                continue
+        hits[category] = hits.get(category, 0) + (cached_path is not None)
+        loaded.setdefault(category, []).append((filename, df))
+
+    if cache:
+        cache.save()
+        stats.save()
+        for category, frames in loaded.items():
+            logger.info(f"Cache: {hits[category]}/{len(frames)} {category} shards reused")
+    return loaded
+
+def load_datasets(data_dirs, workers=LOAD_WORKERS, use_cache=True, start=None, end=None, states=None):
+    """
+    Loads and cleans every category (see load_shards), optionally restricted
+    to dates in [start, end] and canonical `states` (see Pushdown).
+    Returns {category: cleaned frame} for every category with data.
+    """
+    pushdown = Pushdown(start, end, states)
+    refresh_pincode_reference(data_dirs, workers)
+    shards = {}
+    for category, path in data_dirs.items():
+        logger.info(f"Loading {category} data from {path}...")
+        all_files = list_files(path)
+        if not all_files:
+            logger.warning(f"No files found for {category}")
+            continue
+        shards[category] = all_files
+
+    datasets = {}
+    for category, frames in load_shards(shards, workers, use_cache,
+                                        pushdown if pushdown.filters_rows else None).items():
+        df_list = [df for _, df in frames]
+        combined_df = concat_frames(df_list)
+        # Shards are sorted individually; restore the global date order of clean_data
+        if len(df_list) > 1:
+            combined_df = combined_df.sort_values(by='date', kind='stable', ignore_index=True)
+        logger.info(f"Loaded {len(combined_df)} rows for {category}")
+        datasets[category] = combined_df
+    return datasets
+
+def load_clean_data(category, path, use_cache=True):
+    """Loads and cleans a single category (serial shard loading)."""
+    return load_datasets({category: path}, workers=1, use_cache=use_cache).get(category)
+
+def iter_file(category, filename, chunksize=CHUNK_SIZE, columns=None):
+    """
+    Streams cleaned row chunks from one CSV shard (nothing if it fails validation).
+    The partitioned backend reduces each chunk to partial aggregates as it arrives.
+    """
+    usecols = None if columns is None else set(columns).__contains__
+    try:
+        reader = pd.read_csv(filename, chunksize=chunksize, dtype=read_dtypes(category), usecols=usecols)
+        for i, chunk in enumerate(reader):
+            # Basic schema validation (header is shared by every chunk)
+            if i == 0 and 'state' not in chunk.columns:
+                logger.warning(f"Skipping {filename}: Missing 'state' column")
+                break
+            yield _clean(chunk, category)
+    except Exception as e:
+        logger.error(f"Error loading {filename}: {e}")
+
+def iter_data(category, path, chunksize=CHUNK_SIZE, start=None, end=None, states=None, columns=None,
+              cache_dir=CACHE_DIR):
+    """
+    Streams cleaned row chunks from every CSV of a category, optionally
+    restricted like load_data. Only one chunk is resident at a time, so peak
+    memory follows `chunksize` rather than the size of the dataset, and names
+    are placed by the category's pincode reference, so chunks hold the same
+    states as a full load.
+    """
+    logger.info(f"Streaming {category} data from {path} in chunks of {chunksize}...")
+    all_files = list_files(path)
+    if not all_files:
+        logger.warning(f"No files found for {category}")
+        return
+
+    refresh_pincode_reference({category: path}, workers=1)
+    pushdown = Pushdown(start, end, states, columns)
+    stats = ShardStats(cache_dir) if pushdown.filters_rows else None
+    total_rows = 0
+    for filename in all_files:
+        if stats is not None and pushdown.skips(stats.lookup(filename)):
+            continue
+        for chunk in iter_file(category, filename, chunksize, pushdown.columns):
+            chunk = pushdown.filter(chunk)
+            if chunk.empty:
+                continue
+            total_rows += len(chunk)
+            yield chunk
+    logger.info(f"Streamed {total_rows} rows for {category}")
+
+class StreamAggregator:
+    """
+    Running group-by sum fed one cleaned chunk at a time.
+    Partial sums are folded together every `compact_every` chunks so memory
+    stays bounded by the number of distinct groups. Keys are grouped by value
+    and sums widened to int64/float64, so the result does not depend on where
+    the chunks were cut (each chunk has its own categories and narrowed dtypes).
+    With `count`, the number of rows of each group is kept in that column.
+    """
+    def __init__(self, by, numeric_cols=None, count=None, compact_every=16):
+        self.by = [by] if isinstance(by, str) else list(by)
+        self.numeric_cols = numeric_cols
+        self.count = count
+        self.compact_every = compact_every
+        self.rows = 0
+        self._parts = []
+        self._categorical = set()
+
+    def update(self, chunk):
+        if self.numeric_cols is None:
+            self.numeric_cols = numeric_columns(chunk)
+        grouped = chunk.groupby(self.by, observed=True, dropna=False)
+        part = grouped[self.numeric_cols].sum()
+        part = part.astype({col: 'float64' if pd.api.types.is_float_dtype(part[col]) else 'int64'
+                            for col in self.numeric_cols})
+        if self.count:
+            part[self.count] = grouped.size().astype('int64')
+        part = part.reset_index()
+        for col in self.by:
+            if isinstance(part[col].dtype, pd.CategoricalDtype):
+                self._categorical.add(col)
+                part[col] = part[col].astype(object)
+        self._parts.append(part)
+        self.rows += len(chunk)
+        if len(self._parts) >= self.compact_every:
+            self._compact()
+        return self
+
+    def _compact(self, sort=False):
+        if len(self._parts) > 1 or sort:
+            combined = pd.concat(self._parts, ignore_index=True)
+            self._parts = [combined.groupby(self.by, sort=sort, dropna=False).sum().reset_index()]
+
+    def result(self):
+        """Returns the combined aggregate with the group keys as columns (sorted by them)."""
+        if not self._parts:
+            return None
+        self._compact(sort=True)
+        result = self._parts[0]
+        for col in self._categorical:
+            result[col] = result[col].astype('category')
+        return result
+
+def stream_aggregate(category, path, by, numeric_cols=None, chunksize=CHUNK_SIZE, **filters):
+    """Aggregates a category by `by` without materialising the full dataset (filters as in load_data)."""
+    agg = StreamAggregator(by, numeric_cols)
+    for chunk in load_data(category, path, chunksize=chunksize, **filters):
+        agg.update(chunk)
+    return agg.result()
+
+def clean_data(df, category):
+    logger.info(f"Cleaning {category} data...")
+    return _clean(df, category)
+
+def _clean(df, category):
+    # Convert date (each distinct date string is parsed once)
+    df['date'] = parse_dates(df['date'])
+
+    # Drop rows with invalid dates (the frame is only copied if there are any)
+    invalid = df['date'].isna()
+    if invalid.any():
+        df = df[~invalid].copy()
+
+    # Fill NaNs in numeric columns (only the columns that have any)
+    numeric_cols = [c for c in df.select_dtypes(include=['number']).columns if df[c].hasnans]
+    if numeric_cols:
+        df[numeric_cols] = df[numeric_cols].fillna(0)
     
-    # Sort by date
-    df = df.sort_values(by='date')
+    # Sort by date (already sorted shards are not copied again)
+    if not df['date'].is_monotonic_increasing:
+        df = df.sort_values(by='date')
     
-    # Add some basic derived features
-    df['YearMonth'] = df['date'].dt.to_period('M')
+    # Canonical state/district names (resolved once per distinct name, memoized)
+    df = canonicalize_names(df, category)
+
+    # Narrow to the declared compact schema
+    df = apply_schema(df, category)
+
+    # Integer date key into the calendar dimension, and derived features
+    # looked up per distinct date
+    df['date_key'] = date_keys(df['date'])
+    df['YearMonth'] = calendar_key(df['date_key'], 'YearMonth')
     
     return df
@@ -0,0 +1,243 @@
+"""
+Incremental "delta" processing for daily T+1 drops.
+Every shard file contributes a partial (state x district x date) cube that is
+persisted under outputs/state. A run only loads shards that are new or changed
+since the last run and folds their partial sums into the persisted merged cube
+(subtracting the old contribution of changed or removed shards), so the work
+scales with the size of the delta rather than the archive.
+Categories folded into the merged cubes stay pending until a delta run has
+regenerated their outputs, so a failed run is replayed by the next one; each
+keeps the first date its cells changed on, so date-ordered analyses (the
+anomaly scores) only redo the days from there.
+Several processes (delta runs, the query service) may share a state dir:
+each update holds an exclusive lock on it and starts from the manifest on
+disk, so a shard is folded in exactly once whoever sees it first.
+"""
+import json
+import os
+import pandas as pd
+from src.config import STATE_DIR, LOAD_WORKERS
+from src.cache import DatasetCache, FRAME_EXT, file_fingerprint, read_cache_file, write_frame
+from src.cube import AggregateCube, ROW_COUNT
+from src.data_loader import list_files, load_shards, refresh_pincode_reference
+from src.utils import file_lock, setup_logger
+
+logger = setup_logger()
+
+def _to_frame(cube_data):
+    """Flattens cube cells for storage (plain string dimensions, int64 sums)."""
+    df = cube_data.astype('int64').reset_index()
+    for col in ['state', 'district']:
+        if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    return df
+
+def _to_cells(df):
+    dims = [c for c in ['state', 'district', 'date'] if c in df.columns]
+    return df.set_index(dims)
+
+def _first_date(frames):
+    """Earliest date of the cells in `frames` (None if they hold none)."""
+    dates = [df['date'].min() for df in frames if len(df)]
+    return pd.Timestamp(min(dates)) if dates else None
+
+class AggregateStore:
+    """
+    Persisted per-shard partial cubes plus one merged cube per category.
+    The partials reuse the fingerprint manifest of DatasetCache, so a shard is
+    only re-aggregated when its size/mtime/content hash changes.
+    """
+    def __init__(self, state_dir=STATE_DIR):
+        self.state_dir = state_dir
+        self.partials = DatasetCache(os.path.join(state_dir, 'partials'))
+        # Merged cube file versions as of the last update (see _merged_version)
+        self._seen = {}
+
+    def _locked(self):
+        """Exclusive hold on the state dir."""
+        return file_lock(os.path.join(self.state_dir, '.lock'))
+
+    def _merged_version(self, category):
+        try:
+            stat = os.stat(self.merged_path(category))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def merged_path(self, category):
+        return os.path.join(self.state_dir, f'{category}_merged.{FRAME_EXT}')
+
+    @property
+    def pending_path(self):
+        return os.path.join(self.state_dir, 'pending.json')
+
+    def pending(self):
+        """Categories folded into the merged cubes whose outputs were not regenerated yet."""
+        return set(self.pending_since())
+
+    def pending_since(self):
+        """
+        {category: first date whose cells changed} of the pending categories
+        (None: unknown, e.g. pending from an older state dir).
+        """
+        if not os.path.exists(self.pending_path):
+            return {}
+        try:
+            with open(self.pending_path) as f:
+                pending = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable pending categories: {e}")
+            return {}
+        if isinstance(pending, list):
+            return {category: None for category in pending}
+        return {category: None if since is None else pd.Timestamp(since)
+                for category, since in pending.items()}
+
+    def _write_pending(self, pending):
+        os.makedirs(self.state_dir, exist_ok=True)
+        tmp_path = f'{self.pending_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({category: None if since is None else since.isoformat()
+                       for category, since in sorted(pending.items())}, f)
+        os.replace(tmp_path, self.pending_path)
+
+    def clear_pending(self, categories):
+        """Marks the outputs of `categories` as regenerated from the current merged cubes."""
+        with self._locked():
+            pending = self.pending_since()
+            if set(pending) & set(categories):
+                self._write_pending({c: since for c, since in pending.items() if c not in categories})
+
+    def _entries(self, category):
+        return {path: entry for path, entry in self.partials.manifest.items()
+                if entry['category'] == category}
+
+    def update(self, data_dirs, workers=LOAD_WORKERS, use_cache=True):
+        """
+        Folds new, changed and removed shards into the merged cubes.
+        Returns ({category: AggregateCube}, set of categories that changed),
+        including those another process folded shards into since the last call.
+        """
+        with self._locked():
+            # Start from the manifest on disk: it may have moved on since the last call
+            self.partials = DatasetCache(os.path.join(self.state_dir, 'partials'))
+            cubes, changed = self._update(data_dirs, workers, use_cache)
+            for category in data_dirs:
+                version = self._merged_version(category)
+                if category in self._seen and self._seen[category] != version:
+                    changed.add(category)
+                self._seen[category] = version
+        return cubes, changed
+
+    def _update(self, data_dirs, workers, use_cache):
+        # Shards whose pincode decisions change count as changed (see DatasetCache.lookup)
+        refresh_pincode_reference(data_dirs, workers)
+        pending = {}
+        stale = {}
+        for category, path in data_dirs.items():
+            all_files = list_files(path)
+            entries = self._entries(category)
+            if not os.path.exists(self.merged_path(category)):
+                # No merged cube yet (first run or wiped): rebuild from scratch
+                for source in entries:
+                    self.partials.manifest.pop(source)
+                entries = {}
+
+            current = {os.path.abspath(f) for f in all_files}
+            new_files = [f for f in all_files if self.partials.lookup(category, f) is None]
+            removed = [source for source in entries if source not in current]
+            if new_files or removed:
+                pending[category] = new_files
+                stale[category] = [entries[os.path.abspath(f)] for f in new_files
+                                   if os.path.abspath(f) in entries]
+                stale[category] += [entries[source] for source in removed]
+                for source in removed:
+                    self.partials.manifest.pop(source)
+                logger.info(f"Delta: {len(new_files)} new/changed and {len(removed)} removed "
+                            f"{category} shards")
+
+        # Old contributions must be read before their partial files are replaced
+        retired = {category: [read_cache_file(self.partials.path_for(e)) for e in entries]
+                   for category, entries in stale.items()}
+
+        loaded = load_shards({c: files for c, files in pending.items() if files}, workers, use_cache)
+
+        changed = {}
+        for category in pending:
+            added = []
+            for filename, df in loaded.get(category, []):
+                partial = _to_frame(AggregateCube.from_frame(df).data)
+                self.partials.put(category, filename, partial, file_fingerprint(filename))
+                added.append(partial)
+            if added or retired[category]:
+                self._merge(category, added, retired[category])
+                changed[category] = _first_date(added + retired[category])
+        if changed:
+            since = self.pending_since()
+            for category, first in changed.items():
+                # Still pending from an earlier run: its outputs are stale from the earlier date on
+                if category in since:
+                    first = None if since[category] is None or first is None else min(first, since[category])
+                since[category] = first
+            self._write_pending(since)
+
+        for category, entries in stale.items():
+            live = {e['cache_file'] for e in self.partials.manifest.values()}
+            for entry in entries:
+                if entry['cache_file'] not in live and os.path.exists(self.partials.path_for(entry)):
+                    os.remove(self.partials.path_for(entry))
+        self.partials.save()
+
+        cubes = {}
+        for category in data_dirs:
+            cube = self.load(category)
+            if cube is not None:
+                cubes[category] = cube
+        return cubes, set(changed)
+
+    def _merge(self, category, added, retired):
+        """merged := merged + sum(added) - sum(retired), cell by cell."""
+        merged_path = self.merged_path(category)
+        merged = _to_cells(read_cache_file(merged_path)) if os.path.exists(merged_path) else None
+        for frames, sign in [(added, 1), (retired, -1)]:
+            for df in frames:
+                cells = _to_cells(df)
+                if merged is None:
+                    merged = cells * sign
+                else:
+                    merged = merged.add(cells * sign, fill_value=0)
+
+        if merged is not None:
+            merged = merged[merged[ROW_COUNT] > 0].round().astype('int64').sort_index()
+        if merged is None or merged.empty:
+            merged = pd.DataFrame(columns=[ROW_COUNT])
+        else:
+            merged = merged.reset_index()
+        # Replaced, not rewritten: every version is a new file (see _merged_version)
+        staging = f'{merged_path}.{os.getpid()}.tmp{os.path.splitext(merged_path)[1]}'
+        write_frame(staging, merged)
+        os.replace(staging, merged_path)
+
+    def load(self, category):
+        """Returns the persisted merged cube of a category, or None if it holds no data."""
+        merged_path = self.merged_path(category)
+        if not os.path.exists(merged_path):
+            return None
+        df = read_cache_file(merged_path)
+        if df.empty:
+            return None
+        cells = _to_cells(df)
+        numeric_cols = [c for c in cells.columns if c != ROW_COUNT]
+        return AggregateCube(cells, numeric_cols)
+
+def update_aggregates(data_dirs, workers=LOAD_WORKERS, store=None):
+    """
+    Ingests only new/changed shard files. Returns (cubes, categories to regenerate):
+    the categories changed now plus any still pending from an earlier run.
+    """
+    store = store or AggregateStore()
+    cubes, changed = store.update(data_dirs, workers)
+    stale = (store.pending() - changed) & set(cubes)
+    if stale:
+        logger.warning(f"Regenerating outputs left stale by an earlier run: {', '.join(sorted(stale))}")
+    return cubes, changed | stale
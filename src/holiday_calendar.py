@@ -0,0 +1,107 @@
+"""
+Precomputed holiday calendar.
+Holidays of every state are expanded once into a dense boolean (state x date)
+array and stored on disk, so flagging holidays is a single integer gather per
+row instead of building holidays objects and merging on (date, state).
+The holidays package is only imported when a calendar has to be built.
+"""
+import os
+from importlib.metadata import version
+import numpy as np
+import pandas as pd
+from src.config import CACHE_DIR, STATE_CODE_MAP
+
+# Row 0 holds national holidays; it is also the row of states without a code
+NATIONAL = 'IN'
+
+def prepare_holiday_data(years):
+    """Pre-fetches holiday objects for all states and years."""
+    import holidays
+    holiday_dict = {}
+
+    # National Holidays
+    holiday_dict['IN'] = holidays.India(years=years)
+
+    # State Holidays
+    for state_name, code in STATE_CODE_MAP.items():
+        try:
+            holiday_dict[code] = holidays.India(years=years, subdiv=code)
+        except Exception:
+            pass # Graceful degradation if code not supported
+
+    return holiday_dict
+
+class HolidayCalendar:
+    def __init__(self, codes, start, mask):
+        self.codes = list(codes)
+        self.start = pd.Timestamp(start)
+        self.mask = mask
+        self._row_of_code = {code: i for i, code in enumerate(self.codes)}
+
+    @classmethod
+    def build(cls, years):
+        """Expands the holiday objects of all states into the dense mask."""
+        years = sorted(int(y) for y in years)
+        start = pd.Timestamp(year=years[0], month=1, day=1)
+        n_days = (pd.Timestamp(year=years[-1], month=12, day=31) - start).days + 1
+        holiday_dict = prepare_holiday_data(years)
+
+        codes = [NATIONAL] + [code for code in STATE_CODE_MAP.values() if code != NATIONAL]
+        mask = np.zeros((len(codes), n_days), dtype=bool)
+        for row, code in enumerate(codes):
+            days = [(pd.Timestamp(d) - start).days for d in holiday_dict.get(code, {})]
+            mask[row, [d for d in days if 0 <= d < n_days]] = True
+        # A national holiday is a holiday in every state
+        mask[1:] |= mask[0]
+        return cls(codes, start, mask)
+
+    @classmethod
+    def load(cls, years, cache_dir=CACHE_DIR):
+        """Returns the calendar for `years`, building and storing it on first use."""
+        years = sorted({int(y) for y in years})
+        key = f"{years[0]}_{years[-1]}_{version('holidays')}"
+        path = os.path.join(cache_dir, f'holiday_calendar_{key}.npz')
+        if os.path.exists(path):
+            stored = np.load(path, allow_pickle=False)
+            return cls(stored['codes'].tolist(), str(stored['start']), stored['mask'])
+
+        calendar = cls.build(range(years[0], years[-1] + 1))
+        os.makedirs(cache_dir, exist_ok=True)
+        # Stages load the calendar in parallel processes: never expose a half-written file
+        staging = f'{path}.{os.getpid()}.tmp'
+        with open(staging, 'wb') as f:
+            np.savez_compressed(f, codes=np.array(calendar.codes), start=str(calendar.start.date()),
+                                mask=calendar.mask)
+        os.replace(staging, path)
+        return calendar
+
+    def state_rows(self, states):
+        """
+        Integer-coded lookup of calendar rows for a column of state names.
+        Names are resolved once per distinct value; unknown states fall back to
+        the national row.
+        """
+        if isinstance(getattr(states, 'dtype', None), pd.CategoricalDtype):
+            states = pd.Categorical(states)
+            codes, uniques = states.codes, states.categories
+        else:
+            codes, uniques = pd.factorize(np.asarray(states))
+        lookup = np.array([self._row_of_code.get(STATE_CODE_MAP.get(s), 0) for s in uniques] + [0])
+        # Missing values carry code -1, which selects the trailing national entry
+        return lookup[codes]
+
+    def day_offsets(self, dates):
+        """Days since the calendar start (-1 where the date falls outside it)."""
+        days = (pd.DatetimeIndex(dates) - self.start).days
+        offsets = np.asarray(days.fillna(-1), dtype=np.int64)
+        return np.where((offsets >= 0) & (offsets < self.mask.shape[1]), offsets, -1)
+
+    def is_holiday(self, states, dates):
+        """Holiday flag per row: one gather from the (state x date) mask."""
+        offsets = self.day_offsets(dates)
+        flags = self.mask[self.state_rows(states), np.maximum(offsets, 0)]
+        return flags & (offsets >= 0)
+
+    def is_national(self, dates):
+        offsets = self.day_offsets(dates)
+        return self.mask[0, np.maximum(offsets, 0)] & (offsets >= 0)
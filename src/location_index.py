@@ -0,0 +1,180 @@
+"""
+Sparse pincode/district activity index.
+Rows are summed per (location, date), where a location is a distinct
+(pincode, state, district) triple, and stored in CSR form: locations are
+sorted by pincode and the active dates of location i occupy
+entries[offsets[i]:offsets[i + 1]]. Only non-zero cells exist, so ~19K
+pincodes x dates never become a dense pivot; top-k, pincode-range and group
+queries are integer gathers plus np.bincount over the stored entries.
+"""
+import numpy as np
+import pandas as pd
+from src.config import CHUNK_SIZE
+from src.utils import numeric_columns
+
+LOCATION_KEYS = ['pincode', 'state', 'district']
+
+# Query groupings: name -> location columns identifying a group
+GROUPINGS = {
+    'location': LOCATION_KEYS,
+    'pincode': ['pincode'],
+    # District names repeat across states, so a district is a (state, district) pair
+    'district': ['state', 'district'],
+    'state': ['state'],
+}
+
+def location_cells(df, numeric_cols=None):
+    """Sums of the count columns per (pincode, state, district, date), sorted; all-zero cells are dropped."""
+    numeric_cols = numeric_cols or numeric_columns(df)
+    cells = df.groupby(LOCATION_KEYS + ['date'], observed=True, sort=True)[numeric_cols].sum()
+    return cells[cells.to_numpy().sum(axis=1) > 0]
+
+def combine_cells(parts):
+    """Sums partial location_cells() results (e.g. of separate shards) into one sorted table."""
+    frames = []
+    for part in parts:
+        df = part.reset_index()
+        df['state'] = df['state'].astype(str)
+        df['district'] = df['district'].astype(str)
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True).groupby(LOCATION_KEYS + ['date'], sort=True).sum()
+
+def stored_location_cells(dataset, chunk_rows=CHUNK_SIZE):
+    """location_cells() of a stored dataset, one date-aligned chunk of rows resident at a time."""
+    columns = LOCATION_KEYS + ['date'] + dataset.numeric_cols
+    # Chunks cover disjoint dates, so their cells never overlap: sorting the
+    # concatenated cells is all it takes to combine them
+    parts = [location_cells(chunk, dataset.numeric_cols) for chunk in dataset.iter_frames(columns, chunk_rows)]
+    return pd.concat(parts).sort_index()
+
+class LocationIndex:
+    def __init__(self, locations, dates, offsets, date_codes, values, numeric_cols):
+        self.locations = locations
+        self.dates = dates
+        self.offsets = offsets
+        self.date_codes = date_codes
+        self.values = values
+        self.numeric_cols = list(numeric_cols)
+        # Location of every entry (expanded once from the offsets)
+        self.entry_location = np.repeat(np.arange(len(locations), dtype=np.int32), np.diff(offsets))
+        self._groups = {}
+
+    @classmethod
+    def from_frame(cls, df, numeric_cols=None):
+        """Builds the index from cleaned rows in one sorted group-by pass."""
+        return cls.from_cells(location_cells(df, numeric_cols))
+
+    @classmethod
+    def from_cells(cls, cells):
+        """Builds the index from sorted (location, date) sums (see location_cells)."""
+        numeric_cols = list(cells.columns)
+
+        # Sorted group-by: each location's dates are one contiguous, sorted run
+        loc_codes, locations = cells.index.droplevel('date').factorize()
+        dates = pd.DatetimeIndex(cells.index.get_level_values('date').unique().sort_values())
+        date_codes = dates.get_indexer(cells.index.get_level_values('date')).astype(np.int32)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(loc_codes, minlength=len(locations)))])
+
+        locations = locations.to_frame(index=False)
+        locations.columns = LOCATION_KEYS
+        locations['state'] = locations['state'].astype(str)
+        locations['district'] = locations['district'].astype(str)
+        return cls(locations, dates, offsets, date_codes, cells.to_numpy(dtype=np.int64), numeric_cols)
+
+    def __len__(self):
+        """Number of stored (location, date) cells."""
+        return len(self.date_codes)
+
+    def _group(self, by):
+        """(group code per location, group key frame) for a grouping name."""
+        if by not in GROUPINGS:
+            raise KeyError(f"Unknown grouping: {by}")
+        if by not in self._groups:
+            keys = pd.MultiIndex.from_frame(self.locations[GROUPINGS[by]])
+            codes, uniques = keys.factorize(sort=True)
+            # factorize drops the level names
+            uniques = uniques.to_frame(index=False)
+            uniques.columns = GROUPINGS[by]
+            self._groups[by] = (codes, uniques)
+        return self._groups[by]
+
+    def _window(self, start, end, entries=slice(None)):
+        """Mask over `entries` of the cells dated within [start, end]."""
+        codes = self.date_codes[entries]
+        lo = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start))
+        hi = len(self.dates) if end is None else self.dates.searchsorted(pd.Timestamp(end), side='right')
+        return (codes >= lo) & (codes < hi)
+
+    def _weights(self, cols, entries=slice(None)):
+        cols = cols or self.numeric_cols
+        idx = [self.numeric_cols.index(c) for c in cols]
+        return self.values[entries][:, idx].sum(axis=1)
+
+    def totals(self, by='pincode', start=None, end=None, cols=None, name='Total'):
+        """Sums `cols` (default: all counts) per group within [start, end]; active groups only."""
+        codes, uniques = self._group(by)
+        mask = self._window(start, end)
+        sums = np.bincount(codes[self.entry_location[mask]], weights=self._weights(cols)[mask],
+                           minlength=len(uniques))
+        active = np.flatnonzero(sums)
+        result = uniques.iloc[active].reset_index(drop=True)
+        result[name] = sums[active].astype(np.int64)
+        return result
+
+    def top_k(self, k, by='pincode', start=None, end=None, cols=None, name='Total'):
+        """The k groups with the largest totals within [start, end], largest first."""
+        result = self.totals(by, start, end, cols, name)
+        if len(result) > k:
+            top = np.argpartition(-result[name].to_numpy(), k - 1)[:k]
+            result = result.iloc[top]
+        return result.sort_values(name, ascending=False, kind='stable').reset_index(drop=True)
+
+    def pincode_range(self, low, high, start=None, end=None, cols=None, name='Total'):
+        """Totals per location for pincodes in [low, high] (a contiguous slice of the index)."""
+        pincodes = self.locations['pincode'].to_numpy()
+        first, last = np.searchsorted(pincodes, low), np.searchsorted(pincodes, high, side='right')
+        entries = slice(self.offsets[first], self.offsets[last])
+        mask = self._window(start, end, entries)
+        sums = np.bincount(self.entry_location[entries][mask] - first,
+                           weights=self._weights(cols, entries)[mask], minlength=last - first)
+        result = self.locations.iloc[first:last].reset_index(drop=True)
+        result[name] = sums.astype(np.int64)
+        return result[result[name] > 0].reset_index(drop=True)
+
+    def series(self, pincode, start=None, end=None, cols=None):
+        """Daily totals of one pincode (all its locations) within [start, end], indexed by date."""
+        pincodes = self.locations['pincode'].to_numpy()
+        first, last = np.searchsorted(pincodes, pincode), np.searchsorted(pincodes, pincode, side='right')
+        entries = slice(self.offsets[first], self.offsets[last])
+        mask = self._window(start, end, entries)
+        daily = np.bincount(self.date_codes[entries][mask], weights=self._weights(cols, entries)[mask],
+                            minlength=len(self.dates))
+        active = np.flatnonzero(daily)
+        return pd.Series(daily[active].astype(np.int64), index=self.dates[active], name='Total')
+
+    def daily(self, by='district', start=None, end=None, cols=None, name='Total'):
+        """Sparse long table of per-group daily totals (only days with activity)."""
+        codes, uniques = self._group(by)
+        mask = self._window(start, end)
+        keys = codes[self.entry_location[mask]].astype(np.int64) * len(self.dates) + self.date_codes[mask]
+        cells, inverse = np.unique(keys, return_inverse=True)
+        sums = np.bincount(inverse, weights=self._weights(cols)[mask], minlength=len(cells))
+        result = uniques.iloc[cells // len(self.dates)].reset_index(drop=True)
+        result['date'] = self.dates[cells % len(self.dates)]
+        result[name] = sums.astype(np.int64)
+        return result
+
+def build_location_indexes(datasets, chunk_rows=CHUNK_SIZE):
+    """
+    One index per row-level dataset: a frame, or a stored dataset whose mapped
+    columns are read in chunks of `chunk_rows` rows (cubes carry no pincode).
+    """
+    indexes = {}
+    for category, df in datasets.items():
+        if df is None or 'pincode' not in df.columns:
+            continue
+        if hasattr(df, 'iter_frames'):
+            indexes[category] = LocationIndex.from_cells(stored_location_cells(df, chunk_rows))
+        else:
+            indexes[category] = LocationIndex.from_frame(df)
+    return indexes
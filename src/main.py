@@ -1,46 +1,374 @@
 import sys
 import os
+import argparse
 from pathlib import Path
 
 # Add project root to path
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
-from src.config import DATA_DIRS
-from src.data_loader import load_data, clean_data
-from src.analytics import analyze_dataset, perform_advanced_analysis
-from src.analysis_date_holiday import analyze_date_intelligence
-from src.analysis_daywise_week import analyze_daywise
-from src.advanced_analytics import AdvancedAnalytics
-from src.reporting_extended import generate_enhanced_report
+from src.config import (DATA_DIRS, LOAD_WORKERS, PIPELINE_WORKERS, FIGURE_WORKERS, FIGURES_DIR, REPORTS_DIR,
+                        TABLES_DIR, PROFILE_DIR, EXECUTION_BACKEND, QUERY_HOST, QUERY_PORT, QUERY_CACHE_SIZE,
+                        QUERY_REFRESH_SECONDS, ensure_output_dirs)
+from src.profiling import Profiler, activate, track
 
-def main():
-    print("--- 🚀 Starting Aadhaar Hackathon Competition Submission Run ---")
-    datasets = {}
-    
-    # 1. Load & Clean
-    for category, path in DATA_DIRS.items():
-        df = load_data(category, path)
-        if df is not None:
-            datasets[category] = clean_data(df, category)
+# Loaders and analyses are imported when a run needs them: stage functions are
+# 'module:function' references resolved by the process running the stage, so
+# --help, `stages` and single-stage runs skip pandas/sklearn/matplotlib/fpdf.
+
+# Stage name -> what it does (eda runs once per category: eda_<category>)
+STAGES = {
+    'eda': "Trend and top-states charts per category",
+    'advanced_ml': "Isolation Forest anomalies and the national enrolment forecast chart",
+    'date_intelligence': "Weekday/holiday effects and holiday impact tables",
+    'daywise': "Day-of-week load heatmaps and the server load report",
+    'locations': "District load and top pincode tables (full runs only)",
+    'anomalies': "Per-state/district robust z-score anomalies",
+    'forecast': "Batched national/state/district forecasts",
+    'clustering': "State/district clusters (warm-started KMeans)",
+    'omi': "Operational Maturity Index bubble chart",
+    'temporal_heatmap': "Month x weekday enrolment heatmap",
+    'pdf': "Submission PDF from the figures and reports",
+}
+
+# Stage name -> categories it cannot run without. Stages not listed write
+# per-category outputs (or report sections) and run on whatever is loaded.
+ALL_CATEGORIES = tuple(DATA_DIRS)
+STAGE_INPUTS = {
+    'advanced_ml': ('enrolment', 'biometric'),
+    'date_intelligence': ('enrolment',),
+    'clustering': ALL_CATEGORIES,
+    'omi': ALL_CATEGORIES,
+    'temporal_heatmap': ('enrolment',),
+}
+
+def fig(name):
+    return os.path.join(FIGURES_DIR, name)
+
+def compute_omi(datasets):
+    from src.advanced_analytics import AdvancedAnalytics
+    return AdvancedAnalytics(datasets).compute_operational_maturity_index()
+
+def generate_temporal_heatmap(datasets):
+    from src.advanced_analytics import AdvancedAnalytics
+    return AdvancedAnalytics(datasets).generate_temporal_heatmap()
+
+def select_stages(stages, names):
+    """The stages named in `names` (a STAGES key; 'eda' selects every eda_<category>)."""
+    unknown = set(names) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(sorted(unknown))} (choose from {', '.join(STAGES)})")
+    return [stage for stage in stages if stage.name in names or
+            ('eda' in names and stage.name.startswith('eda_'))]
+
+def stage_categories(stages=None, categories=None):
+    """
+    Categories a run loads: `categories` if given; else, if every selected stage
+    declares its inputs, their union; else all of them.
+    Raises ValueError if `categories` leaves out an input of a selected stage.
+    """
+    if not categories:
+        if stages and all(name in STAGE_INPUTS for name in stages):
+            return sorted({c for name in stages for c in STAGE_INPUTS[name]})
+        return list(DATA_DIRS)
+    for name in stages or ():
+        missing = [c for c in STAGE_INPUTS.get(name, ()) if c not in categories]
+        if missing:
+            raise ValueError(f"Stage {name} needs {', '.join(missing)}: add them to --categories, "
+                             f"or drop --categories to load what the stages need")
+    return list(categories)
+
+# Stages carrying state from run to run under outputs/state (the scored anomaly
+# series, the clustering warm start), which only full-history runs may update
+STATEFUL_STAGES = ('anomalies', 'clustering')
+
+def check_slice(delta=False, stages=None):
+    """Raises ValueError if a run sliced by --start/--end/--states would update full-history state."""
+    if delta:
+        raise ValueError("--start/--end/--states cannot be combined with --delta: "
+                         "the persisted aggregates always cover the whole history")
+    stateful = [name for name in stages or () if name in STATEFUL_STAGES]
+    if stateful:
+        raise ValueError(f"Stages keeping state across full-history runs cannot run on a slice: "
+                         f"{', '.join(stateful)}")
+
+def drop_stages_without_inputs(stages, loaded):
+    """
+    The stages whose input categories all have data in `loaded`; the others
+    are reported and left out rather than overwriting their outputs with
+    partial inputs.
+    """
+    skipped = [stage.name for stage in stages if not set(STAGE_INPUTS.get(stage.name, ())) <= set(loaded)]
+    if skipped:
+        print(f"Skipping stages without data for their input categories: {', '.join(skipped)}")
+    return [stage for stage in stages if stage.name not in skipped]
+
+def build_stages(datasets, changed, indexes=None, since=None):
+    """
+    Declares the pipeline: what each stage writes and which files it needs.
+    Stages whose input categories did not change (delta mode) are left out;
+    district/pincode tables need the location indexes (full runs only).
+    `since` ({category: first changed date}, delta mode) limits the days re-scored.
+    """
+    from src.pipeline import Stage
+
+    def needs(*categories):
+        """True if any input category of a stage changed in this run."""
+        return any(c in changed for c in categories)
+
+    stages = []
+    all_rows = sum(cube.rows for cube in datasets.values())
 
     # 2. Standard Analytics (Base Requirements)
     # This generates the standard figures used in Section 4
-    analyze_dataset(datasets)
-    perform_advanced_analysis(datasets)
-    analyze_date_intelligence(datasets)
-    analyze_daywise(datasets)
+    for category in sorted(changed & set(datasets)):
+        stages.append(Stage(f'eda_{category}', 'src.analytics:analyze_dataset',
+                            ({category: datasets[category]},),
+                            produces=[fig(f'{category}_trend.png'), fig(f'{category}_top_states.png')],
+                            rows=datasets[category].rows))
+    if needs(*STAGE_INPUTS['advanced_ml']):
+        stages.append(Stage('advanced_ml', 'src.analytics:perform_advanced_analysis', (datasets,),
+                            produces=[fig('enrolment_anomalies.png'),
+                                      fig('biometric_anomalies.png'), fig('enrolment_forecast.png')],
+                            rows=all_rows))
+    if needs(*STAGE_INPUTS['date_intelligence']):
+        stages.append(Stage('date_intelligence', 'src.analysis_date_holiday:analyze_date_intelligence',
+                            (datasets,),
+                            produces=[fig('weekday_pattern.png'), fig('holiday_impact.png'),
+                                      os.path.join(TABLES_DIR, 'holiday_impact_by_state.csv'),
+                                      os.path.join(TABLES_DIR, 'holiday_impact_by_district.csv')],
+                            rows=datasets['enrolment'].rows))
+    # One report across all categories
+    stages.append(Stage('daywise', 'src.analysis_daywise_week:analyze_daywise', (datasets,),
+                        produces=[os.path.join(REPORTS_DIR, 'daywise_insights.md')] +
+                                 [fig(f'daywise/{c}_state_heatmap_FULL.png') for c in datasets] +
+                                 [fig(f'daywise/{c}_global_day_trend.png') for c in datasets],
+                        rows=all_rows))
+
+    # District/pincode load for enrolment-centre capacity planning
+    if indexes:
+        stages.append(Stage('locations', 'src.analysis_location:analyze_locations', (indexes,),
+                            produces=[os.path.join(TABLES_DIR, f'{c}_{table}.csv') for c in indexes
+                                      for table in ['district_load', 'top_pincodes']],
+                            rows=sum(len(index) for index in indexes.values())))
+
+    # Per-state/district anomalies (in delta mode only days from the first changed one
+    # are re-scored) and forecasts of the changed categories
+    scored = {c: datasets[c] for c in sorted(changed & set(datasets))}
+    if scored:
+        stages.append(Stage('anomalies', 'src.analysis_anomalies:analyze_anomalies',
+                            (scored, {c: d for c, d in (since or {}).items() if c in scored}),
+                            produces=[os.path.join(TABLES_DIR, f'{c}_anomalies.csv') for c in scored],
+                            rows=sum(cube.rows for cube in scored.values())))
+        # Batched national/state/district forecasts
+        stages.append(Stage('forecast', 'src.analysis_forecast:analyze_forecasts', (scored,),
+                            produces=[os.path.join(TABLES_DIR, f'{c}_{table}.csv') for c in scored
+                                      for table in ['forecast', 'forecast_fit']],
+                            rows=sum(cube.rows for cube in scored.values())))
+        # State/district clusters on features of every category (warm-started from the last run)
+        stages.append(Stage('clustering', 'src.analysis_clustering:analyze_clustering', (datasets,),
+                            produces=[fig('clustering_states.png'),
+                                      os.path.join(TABLES_DIR, 'state_clusters.csv'),
+                                      os.path.join(TABLES_DIR, 'district_clusters.csv')],
+                            rows=all_rows))
 
     # 3. Advanced Analytics (Competitive Edge)
     # This generates the OMI bubble chart and Heatmap for Section 5
-    adv = AdvancedAnalytics(datasets)
-    adv.compute_operational_maturity_index()
-    adv.generate_temporal_heatmap()
+    stages.append(Stage('omi', compute_omi, (datasets,),
+                        produces=[fig('operational_maturity_bubble.png')], rows=all_rows))
+    if needs(*STAGE_INPUTS['temporal_heatmap']):
+        stages.append(Stage('temporal_heatmap', generate_temporal_heatmap, (datasets,),
+                            produces=[fig('temporal_heatmap.png')], rows=datasets['enrolment'].rows))
 
     # 4. Generate Final PDF
-    # Combines everything into the submisson document
-    generate_enhanced_report()
-    
-    print("--- ✅ Submission Run Completed Successfully ---")
+    # Combines everything into the submisson document; waits on the figures it embeds
+    stages.append(Stage('pdf', 'src.reporting_extended:generate_enhanced_report',
+                        requires=[fig('enrolment_trend.png'), fig('clustering_states.png'),
+                                  fig('enrolment_anomalies.png'), fig('operational_maturity_bubble.png'),
+                                  fig('temporal_heatmap.png'), os.path.join(REPORTS_DIR, 'daywise_insights.md'),
+                                  fig('daywise/enrolment_state_heatmap_FULL.png')],
+                        produces=[os.path.join(REPORTS_DIR, 'Aadhaar_Solution_Submission.pdf')]))
+    return stages
+
+def run(delta=False, workers=PIPELINE_WORKERS, figure_workers=FIGURE_WORKERS, profile_dir=None,
+        backend=EXECUTION_BACKEND, stages=None, categories=None, start=None, end=None, states=None):
+    """
+    Loads the data and runs the pipeline; `stages` (STAGES names) and `categories`
+    restrict a run to those stages and to the shards of those categories (by
+    default, the categories the stages need: see stage_categories), and
+    [start, end] and `states` (canonical names) to a slice of the rows, pushed
+    down into the load (see data_loader.Pushdown).
+    """
+    sliced = start is not None or end is not None or states is not None
+    if sliced:
+        check_slice(delta, stages)
+    categories = stage_categories(stages, categories)
+    ensure_output_dirs()
+    data_dirs = {c: path for c, path in DATA_DIRS.items() if c in categories}
+    since = None
+    if delta:
+        # 1. Delta: only new/changed shards are loaded and folded into the
+        # persisted (state x district x date) aggregates
+        from src.delta import AggregateStore, update_aggregates
+        store = AggregateStore()
+        with track('delta', kind='load'):
+            datasets, changed = update_aggregates(data_dirs, workers=LOAD_WORKERS, store=store)
+        if not changed:
+            print("--- ✅ No new shards since the last run; outputs are up to date ---")
+            return False
+        print(f"Changed categories: {', '.join(sorted(changed))}")
+        indexes = None
+        since = store.pending_since()
+    elif backend == 'partitioned':
+        # 1. Out of core: every shard is streamed in chunks by a worker and
+        # reduced to partial cubes/location cells, which are summed here
+        from src.partitioned import load_partitioned
+        with track('load_partitioned', kind='load') as record:
+            datasets, indexes = load_partitioned(data_dirs, workers=LOAD_WORKERS, start=start, end=end,
+                                                 states=states)
+            record['rows'] = sum(cube.rows for cube in datasets.values())
+        changed = set(datasets)
+    elif backend == 'stream':
+        # 1. Streaming: one process reads every category in chunks
+        # (load_data(chunksize=...)) and folds them into running aggregators
+        from src.partitioned import load_streamed
+        with track('load_streamed', kind='load') as record:
+            datasets, indexes = load_streamed(data_dirs, start=start, end=end, states=states)
+            record['rows'] = sum(cube.rows for cube in datasets.values())
+        changed = set(datasets)
+    else:
+        # 1. Load & Clean: the cleaned history is kept as memory-mapped columns,
+        # one segment per shard; only new/changed shards are re-parsed (in
+        # parallel) and written, the other segments are reused as they are
+        from src.cube import build_cubes
+        if sliced:
+            # The column store always holds the whole history: a slice is read
+            # from the per-shard cache instead, skipping shards outside it
+            from src.data_loader import load_datasets
+            with track('load_datasets', kind='load') as record:
+                stored = load_datasets(data_dirs, workers=LOAD_WORKERS, start=start, end=end, states=states)
+                record['rows'] = sum(len(df) for df in stored.values())
+        else:
+            from src.column_store import open_store
+            with track('open_store', kind='load') as record:
+                stored = open_store(data_dirs, workers=LOAD_WORKERS)
+                record['rows'] = sum(len(dataset) for dataset in stored.values())
+
+        # Sparse (pincode x date) index for district/pincode queries
+        # (only built when the locations stage runs)
+        indexes = None
+        if not stages or 'locations' in stages:
+            from src.location_index import build_location_indexes
+            with track('build_location_indexes', kind='load', rows=record['rows']):
+                indexes = build_location_indexes(stored)
+
+        # Scan the stored rows once into (state x district x date) cubes
+        # (in parallel, straight from the mapped columns);
+        # every analysis below reads its group-bys from these
+        with track('build_cubes', kind='load', rows=record['rows']):
+            datasets = build_cubes(stored, workers=LOAD_WORKERS)
+        changed = set(datasets)
+
+    # 2-4. Independent stages run concurrently; the PDF waits on their outputs.
+    # Charts are rasterized by a separate pool of Agg workers.
+    from src.pipeline import run_pipeline
+    from src.plotting import FigureRenderer
+    selected = build_stages(datasets, changed, indexes, since)
+    if stages:
+        selected = select_stages(selected, stages)
+    # Checked against what was loaded: a category can be selected and still have no shards
+    selected = drop_stages_without_inputs(selected, datasets)
+    if sliced:
+        print(f"Sliced run: skipping {', '.join(STATEFUL_STAGES)}, whose state covers the full history")
+        selected = [stage for stage in selected if stage.name not in STATEFUL_STAGES]
+    with FigureRenderer(workers=figure_workers, profile_dir=profile_dir) as renderer:
+        run_pipeline(selected, workers=workers, renderer=renderer, profile_dir=profile_dir)
+    if delta and not stages:
+        # Only now are the outputs of the folded-in shards current; if a stage
+        # failed above, the categories stay pending and the next run redoes them
+        store.clear_pending(changed)
+    return True
+
+def main(delta=False, workers=PIPELINE_WORKERS, figure_workers=FIGURE_WORKERS, cprofile=False,
+         backend=EXECUTION_BACKEND, stages=None, categories=None, start=None, end=None, states=None):
+    print("--- 🚀 Starting Aadhaar Hackathon Competition Submission Run ---")
+
+    # Every step is timed; the run profile lands in outputs/run_profile.{json,csv}
+    profiler = Profiler(PROFILE_DIR if cprofile else None)
+    try:
+        with activate(profiler), track('total', kind='run'):
+            completed = run(delta, workers, figure_workers, profiler.dump_dir, backend, stages, categories,
+                            start, end, states)
+    finally:
+        profile_path = profiler.write()
+        profiler.summary()
+        print(f"Run profile written to {profile_path}")
+
+    if completed:
+        print("--- ✅ Submission Run Completed Successfully ---")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='aadhaar', description="Aadhaar analytics pipeline")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Load the data and run the pipeline (default)")
+    run_parser.add_argument('--stages', nargs='+', choices=list(STAGES), metavar='STAGE',
+                            help="Run only these stages (see `stages`); default: all")
+    run_parser.add_argument('--categories', nargs='+', choices=list(DATA_DIRS), metavar='CATEGORY',
+                            help=f"Load only these categories ({', '.join(DATA_DIRS)}); "
+                                 f"default: what the stages need (see `stages`)")
+    run_parser.add_argument('--start', metavar='DATE', help="Only rows dated on or after DATE (YYYY-MM-DD)")
+    run_parser.add_argument('--end', metavar='DATE', help="Only rows dated on or before DATE (YYYY-MM-DD)")
+    run_parser.add_argument('--states', nargs='+', metavar='STATE',
+                            help="Only rows of these (canonical) states, e.g. --states Bihar 'West Bengal'")
+    run_parser.add_argument('--delta', action='store_true',
+                            help="Ingest only new/changed shard files and regenerate the outputs they affect")
+    run_parser.add_argument('--workers', type=int, default=PIPELINE_WORKERS,
+                            help="Processes used to run independent stages (1 = sequential)")
+    run_parser.add_argument('--figure-workers', type=int, default=FIGURE_WORKERS,
+                            help="Processes used to render figures (1 = inline)")
+    run_parser.add_argument('--cprofile', action='store_true',
+                            help=f"Dump a cProfile file per stage and figure to {PROFILE_DIR}")
+    run_parser.add_argument('--backend', choices=['memory', 'partitioned', 'stream'], default=EXECUTION_BACKEND,
+                            help="Build cubes from the mapped column store, out of core shard by shard, "
+                                 "or streamed in chunks in one process")
+
+    commands.add_parser('stages', help="List the pipeline stages")
+
+    serve_parser = commands.add_parser('serve', help="Serve aggregate queries over local HTTP (JSON)")
+    serve_parser.add_argument('--host', default=QUERY_HOST, help="Interface to listen on")
+    serve_parser.add_argument('--port', type=int, default=QUERY_PORT, help="Port to listen on (0 = any free port)")
+    serve_parser.add_argument('--refresh', type=float, default=QUERY_REFRESH_SECONDS,
+                              help="Seconds between checks for new/changed shards (0 = never)")
+    serve_parser.add_argument('--cache-size', type=int, default=QUERY_CACHE_SIZE,
+                              help="Query results kept in the LRU cache")
+    return parser
+
+def cli(argv=None):
+    """Entry point: `aadhaar run [options]`, `aadhaar stages` or `aadhaar serve` (bare options imply `run`)."""
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0].startswith('-') and argv[0] not in ('-h', '--help'):
+        argv = ['run'] + argv
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'stages':
+        for name, description in STAGES.items():
+            inputs = f" (needs {', '.join(STAGE_INPUTS[name])})" if name in STAGE_INPUTS else ''
+            print(f"{name:<18} {description}{inputs}")
+        return
+    if args.command == 'serve':
+        from src.query_service import serve
+        ensure_output_dirs()
+        serve(args.host, args.port, args.refresh, args.cache_size)
+        return
+    try:
+        stage_categories(args.stages, args.categories)
+        if args.start is not None or args.end is not None or args.states is not None:
+            check_slice(args.delta, args.stages)
+    except ValueError as e:
+        parser.error(str(e))
+    main(delta=args.delta, workers=args.workers, figure_workers=args.figure_workers,
+         cprofile=args.cprofile, backend=args.backend, stages=args.stages, categories=args.categories,
+         start=args.start, end=args.end, states=args.states)
 
 if __name__ == "__main__":
-    main()
+    cli()
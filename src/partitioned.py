@@ -0,0 +1,126 @@
+"""
+Out-of-core execution backend.
+Shard files are the partitions: each one is streamed in row chunks by a worker
+process and reduced to a partial (state x district x date) cube and partial
+(location, date) cells. The parent only ever holds partial aggregates and sums
+them, so no category is materialized as rows, and the analyses run on the
+combined cubes exactly as they do on the in-memory ones.
+The streaming backend does the same in a single process from the chunked mode
+of load_data, folding every chunk into running StreamAggregators.
+"""
+from concurrent.futures import as_completed
+from src.cache import ShardStats
+from src.config import CHUNK_SIZE, LOAD_WORKERS
+from src.cube import AggregateCube, DIMENSIONS, ROW_COUNT
+from src.data_loader import (Pushdown, StreamAggregator, iter_file, list_files, load_data,
+                             refresh_pincode_reference)
+from src.location_index import LOCATION_KEYS, LocationIndex, combine_cells, location_cells
+from src.utils import setup_logger, make_executor
+
+logger = setup_logger()
+
+# Partial aggregates held before they are folded into one
+FOLD_EVERY = 16
+
+def _aggregate_shard(category, filename, chunksize, pushdown=None):
+    """(partial cube, partial location cells, rows) of one shard, one chunk resident at a time."""
+    cubes, cells, rows = [], [], 0
+    for chunk in iter_file(category, filename, chunksize):
+        if pushdown is not None:
+            chunk = pushdown.filter(chunk)
+        if chunk.empty:
+            continue
+        rows += len(chunk)
+        cubes.append(AggregateCube.from_frame(chunk))
+        if 'pincode' in chunk.columns:
+            cells.append(location_cells(chunk))
+        if len(cubes) >= FOLD_EVERY:
+            cubes = [AggregateCube.combine(cubes)]
+            cells = [combine_cells(cells)] if cells else []
+    if not cubes:
+        return None, None, 0
+    return AggregateCube.combine(cubes), combine_cells(cells) if cells else None, rows
+
+class PartialAggregates:
+    """Running sum of the partial cubes and location cells of one category."""
+    def __init__(self):
+        self.cubes, self.cells, self.rows = [], [], 0
+
+    def add(self, cube, cells, rows):
+        self.rows += rows
+        if cube is not None:
+            self.cubes.append(cube)
+        if cells is not None:
+            self.cells.append(cells)
+        if len(self.cubes) >= FOLD_EVERY:
+            self.cubes = [AggregateCube.combine(self.cubes)]
+        if len(self.cells) >= FOLD_EVERY:
+            self.cells = [combine_cells(self.cells)]
+
+    def cube(self):
+        return AggregateCube.combine(self.cubes) if self.cubes else None
+
+    def index(self):
+        return LocationIndex.from_cells(combine_cells(self.cells)) if self.cells else None
+
+def load_partitioned(data_dirs, workers=LOAD_WORKERS, chunksize=CHUNK_SIZE, start=None, end=None, states=None):
+    """
+    Aggregates every shard of every category out of core, `workers` shards at a time,
+    optionally restricted to dates in [start, end] and canonical `states` (see Pushdown).
+    Returns ({category: AggregateCube}, {category: LocationIndex}).
+    """
+    pushdown = Pushdown(start, end, states)
+    if not pushdown.filters_rows:
+        pushdown = None
+    # Chunks place unmatched names by the reference of all shards, not by their own rows
+    refresh_pincode_reference(data_dirs, workers)
+    # Shards whose recorded date range/states miss the filter are not streamed at all
+    stats = ShardStats() if pushdown else None
+    partials = {category: PartialAggregates() for category in data_dirs}
+    with make_executor(workers) as pool:
+        futures = {}
+        for category, path in data_dirs.items():
+            all_files = list_files(path)
+            if not all_files:
+                logger.warning(f"No files found for {category}")
+            for filename in all_files:
+                if pushdown and pushdown.skips(stats.lookup(filename)):
+                    continue
+                futures[pool.submit(_aggregate_shard, category, filename, chunksize, pushdown)] = category
+        for future in as_completed(futures):
+            partials[futures[future]].add(*future.result())
+
+    cubes, indexes = {}, {}
+    for category, partial in partials.items():
+        cube = partial.cube()
+        if cube is None:
+            continue
+        cubes[category] = cube
+        index = partial.index()
+        if index is not None:
+            indexes[category] = index
+        logger.info(f"Partitioned: {partial.rows} {category} rows in {len(cube)} cube cells")
+    return cubes, indexes
+
+def load_streamed(data_dirs, chunksize=CHUNK_SIZE, start=None, end=None, states=None):
+    """
+    Aggregates every category in this process from the chunked mode of
+    load_data: one cleaned chunk is resident at a time and folded into running
+    aggregators of the cube and of the location cells. Filters as in
+    load_partitioned. Returns ({category: AggregateCube}, {category: LocationIndex}).
+    """
+    cubes, indexes = {}, {}
+    for category, path in data_dirs.items():
+        cube_sums = StreamAggregator(DIMENSIONS, count=ROW_COUNT)
+        cell_sums = StreamAggregator(LOCATION_KEYS + ['date'])
+        for chunk in load_data(category, path, start=start, end=end, states=states, chunksize=chunksize):
+            cube_sums.update(chunk)
+            cell_sums.update(chunk)
+        if not cube_sums.rows:
+            continue
+        numeric_cols = cube_sums.numeric_cols
+        cubes[category] = AggregateCube(cube_sums.result().set_index(DIMENSIONS), numeric_cols)
+        cells = cell_sums.result().set_index(LOCATION_KEYS + ['date'])
+        indexes[category] = LocationIndex.from_cells(cells[cells.to_numpy().sum(axis=1) > 0])
+        logger.info(f"Streamed: {cube_sums.rows} {category} rows in {len(cubes[category])} cube cells")
+    return cubes, indexes
@@ -0,0 +1,122 @@
+"""
+Stage scheduler for the analysis pipeline.
+Each stage declares the files it reads and writes; a stage becomes runnable
+once every stage producing one of its inputs has finished. Independent stages
+run side by side in a process pool, so wall-clock time approaches that of the
+longest dependency chain instead of the sum of all stages.
+Figures emitted by a stage are handed to a FigureRenderer; the stage counts as
+finished (for its dependents) once its figures are written.
+A stage function may be given as a 'module:function' reference, imported by
+the process running the stage, so a run only imports the analyses it runs.
+"""
+import importlib
+from concurrent.futures import FIRST_COMPLETED, wait
+from src.config import PIPELINE_WORKERS
+from src.plotting import FigureRenderer, collect_figures
+from src.profiling import Profiler, dump_dir, record_all
+from src.utils import make_executor, setup_logger
+
+logger = setup_logger()
+
+class Stage:
+    """
+    A pipeline step: `func(*args)`, reading `requires` and writing `produces` (file paths).
+    `func` is a callable or a 'module:function' reference (see resolve_function).
+    `rows` (input rows) is reported in the run profile.
+    """
+    def __init__(self, name, func, args=(), requires=(), produces=(), rows=None):
+        self.name = name
+        self.func = func
+        self.args = tuple(args)
+        self.requires = list(requires)
+        self.produces = list(produces)
+        self.rows = rows
+
+    def __repr__(self):
+        return f"Stage({self.name!r})"
+
+def resolve_function(func):
+    """The callable of a stage function, importing a 'module:function' reference."""
+    if not isinstance(func, str):
+        return func
+    module, _, name = func.partition(':')
+    return getattr(importlib.import_module(module), name)
+
+def _run_stage(stage, profile_dir=None):
+    """Runs a stage, returning its result, the figure specs it emitted and its timing record."""
+    profiler = Profiler(profile_dir)
+    with collect_figures() as specs, profiler.stage(stage.name, rows=stage.rows):
+        # Imported inside the timed stage, so the import cost is attributed to it
+        result = resolve_function(stage.func)(*stage.args)
+    return result, list(specs), profiler.records
+
+def resolve_dependencies(stages):
+    """Maps each stage name to the names of the stages producing its inputs."""
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate stage names: {names}")
+    producers = {}
+    for stage in stages:
+        for path in stage.produces:
+            producers[path] = stage.name
+    # Inputs nobody produces in this run are expected to exist already (e.g. docs)
+    return {stage.name: {producers[path] for path in stage.requires
+                         if path in producers and producers[path] != stage.name}
+            for stage in stages}
+
+def run_pipeline(stages, workers=PIPELINE_WORKERS, renderer=None, profile_dir=None):
+    """
+    Runs `stages` in dependency order, independent ones concurrently in a pool of
+    `workers` processes (serially in-process when workers <= 1).
+    Figures are rendered by `renderer` (inline when not given). Stage timings go
+    to the active profiler; `profile_dir` (default: that of the active profiler)
+    enables per-stage cProfile dumps.
+    Returns {stage name: return value}.
+    """
+    deps = resolve_dependencies(stages)
+    profile_dir = profile_dir or dump_dir()
+    pending = list(stages)
+    done = set()
+    results = {}
+    outstanding = {}  # stage name -> figures not yet written
+
+    def take_ready():
+        ready = [stage for stage in pending if deps[stage.name] <= done]
+        for stage in ready:
+            pending.remove(stage)
+        return ready
+
+    own_renderer = renderer is None
+    renderer = renderer or FigureRenderer(workers=1, profile_dir=profile_dir)
+    try:
+        with make_executor(workers) as pool:
+            running = {}  # future -> (stage, True if it renders one of the stage's figures)
+            while pending or running:
+                for stage in take_ready():
+                    logger.info(f"Stage started: {stage.name}")
+                    running[pool.submit(_run_stage, stage, profile_dir)] = (stage, False)
+                if not running:
+                    raise RuntimeError(f"Unresolvable stage dependencies: {pending}")
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage, is_figure = running.pop(future)
+                    try:
+                        value = future.result()
+                    except Exception:
+                        logger.error(f"{'Figure' if is_figure else 'Stage'} failed: {stage.name}")
+                        raise
+                    if is_figure:
+                        outstanding[stage.name] -= 1
+                    else:
+                        results[stage.name], specs, records = value
+                        record_all(records)
+                        outstanding[stage.name] = len(specs)
+                        for spec in specs:
+                            running[renderer.submit(spec)] = (stage, True)
+                    if outstanding[stage.name] == 0:
+                        done.add(stage.name)
+                        logger.info(f"Stage finished: {stage.name}")
+    finally:
+        if own_renderer:
+            renderer.close()
+    return results
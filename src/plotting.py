@@ -0,0 +1,287 @@
+"""
+Figure rendering service.
+Analyses describe each chart as a PlotSpec (chart kind + aggregated data +
+styling) instead of drawing it. Specs are rendered by a pool of Agg worker
+processes, so analysis code never blocks on rasterization and charts for
+every category render in parallel. matplotlib and seaborn are only imported
+once a spec is actually drawn.
+Each figure is keyed by a hash of its spec; a manifest next to the figures
+records the key each PNG was drawn from, so unchanged charts are not redrawn.
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import lru_cache
+from importlib.metadata import version
+import numpy as np
+import pandas as pd
+from src.config import FIGURE_WORKERS
+from src.profiling import Profiler, record_all
+from src.utils import make_executor, setup_logger
+
+logger = setup_logger()
+
+# pyplot and seaborn, bound by _backend() on first render
+plt = sns = None
+
+def _backend():
+    """Imports matplotlib (Agg) and seaborn on first use and sets the visual style."""
+    global plt, sns
+    if plt is None:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as pyplot
+        import seaborn
+        seaborn.set_theme(style="whitegrid")
+        plt, sns = pyplot, seaborn
+
+class PlotSpec:
+    """A chart to render: its kind, the output path and the data/options of the renderer."""
+    def __init__(self, kind, path, **params):
+        if kind not in RENDERERS:
+            raise ValueError(f"Unknown chart kind: {kind}")
+        self.kind = kind
+        self.path = path
+        self.params = params
+
+    def __repr__(self):
+        return f"PlotSpec({self.kind!r}, {os.path.basename(self.path)!r})"
+
+def _lines(series=(), scatter=()):
+    for line in series:
+        line = dict(line)
+        plt.plot(line.pop('x'), line.pop('y'), **line)
+    for points in scatter:
+        points = dict(points)
+        plt.scatter(points.pop('x'), points.pop('y'), **points)
+
+def _barplot(data, x, y, **kwargs):
+    sns.barplot(data=data, x=x, y=y, **kwargs)
+
+def _boxplot(data, x, y, **kwargs):
+    sns.boxplot(data=data, x=x, y=y, **kwargs)
+
+def _scatterplot(data, x, y, **kwargs):
+    sns.scatterplot(data=data, x=x, y=y, **kwargs)
+
+def _scatter(x, y, colorbar=None, **kwargs):
+    sc = plt.scatter(x, y, **kwargs)
+    if colorbar:
+        plt.colorbar(sc, label=colorbar)
+
+def _heatmap(data, **kwargs):
+    sns.heatmap(data, **kwargs)
+
+RENDERERS = {
+    'lines': _lines,
+    'barplot': _barplot,
+    'boxplot': _boxplot,
+    'scatterplot': _scatterplot,
+    'scatter': _scatter,
+    'heatmap': _heatmap,
+}
+
+# Options shared by every chart kind (applied after the chart is drawn)
+DECORATIONS = ['figsize', 'title', 'title_kwargs', 'xlabel', 'ylabel', 'x_formatter',
+               'y_formatter', 'legend', 'texts', 'axvline']
+
+def render_spec(spec):
+    """Draws one spec with the Agg backend and saves it to spec.path."""
+    params = dict(spec.params)
+    style = {key: params.pop(key) for key in DECORATIONS if key in params}
+
+    _backend()
+    from src.utils import indian_formatter
+
+    os.makedirs(os.path.dirname(spec.path), exist_ok=True)
+    plt.figure(figsize=style.get('figsize'))
+    RENDERERS[spec.kind](**params)
+
+    for x, y, text, fontsize in style.get('texts', []):
+        plt.text(x, y, text, fontsize=fontsize)
+    if 'title' in style:
+        plt.title(style['title'], **style.get('title_kwargs', {}))
+    if 'xlabel' in style:
+        plt.xlabel(style['xlabel'])
+    if 'ylabel' in style:
+        plt.ylabel(style['ylabel'])
+    if style.get('x_formatter'):
+        plt.gca().xaxis.set_major_formatter(indian_formatter)
+    if style.get('y_formatter'):
+        plt.gca().yaxis.set_major_formatter(indian_formatter)
+    if 'axvline' in style:
+        plt.axvline(**style['axvline'])
+    if style.get('legend'):
+        plt.legend()
+    plt.tight_layout()
+    plt.savefig(spec.path)
+    plt.close()
+    return spec.path
+
+def _render_profiled(spec, profile_dir=None):
+    """Renders a spec in a worker; returns its path and timing record."""
+    profiler = Profiler(profile_dir)
+    with profiler.stage(os.path.basename(spec.path), kind='figure'):
+        render_spec(spec)
+    return spec.path, profiler.records
+
+# Bump whenever a renderer draws the same spec differently, so cached figures are redrawn
+FIGURE_CACHE_VERSION = 1
+
+# Manifest stored in each figure directory: figure file name -> spec key
+MANIFEST_NAME = 'figure_manifest.json'
+
+def _feed(digest, value):
+    """Feeds a canonical byte form of a spec parameter into the hash."""
+    if isinstance(value, pd.Series):
+        value = value.to_frame()
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr((list(value.columns), [str(t) for t in value.dtypes],
+                            list(value.index.names))).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype.str, value.shape)).encode())
+        if value.dtype == object:
+            digest.update(pd.util.hash_array(value.ravel()).tobytes())
+        else:
+            digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        digest.update(b'{')
+        for key in sorted(value):
+            digest.update(repr(key).encode())
+            _feed(digest, value[key])
+        digest.update(b'}')
+    elif isinstance(value, (list, tuple)):
+        digest.update(b'[')
+        for item in value:
+            _feed(digest, item)
+        digest.update(b']')
+    else:
+        digest.update(repr(value).encode())
+
+@lru_cache(maxsize=None)
+def _library_versions():
+    # Read from the package metadata: cached figures are checked without importing the libraries
+    return version('matplotlib'), version('seaborn')
+
+def spec_key(spec):
+    """Content hash of a spec: chart kind, data and options, plus the plotting library versions."""
+    digest = hashlib.sha1()
+    _feed(digest, [FIGURE_CACHE_VERSION, *_library_versions(), spec.kind])
+    _feed(digest, spec.params)
+    return digest.hexdigest()
+
+class FigureCache:
+    """Figure manifests (file name -> spec key), one per figure directory."""
+    def __init__(self):
+        self.manifests = {}
+        self.dirty = set()
+
+    def _manifest(self, directory):
+        if directory not in self.manifests:
+            path = os.path.join(directory, MANIFEST_NAME)
+            manifest = {}
+            if os.path.exists(path):
+                try:
+                    with open(path) as f:
+                        manifest = json.load(f)
+                except (OSError, ValueError):
+                    manifest = {}
+            self.manifests[directory] = manifest
+        return self.manifests[directory]
+
+    def is_current(self, spec, key):
+        """True if spec.path exists and was rendered from a spec with the same key."""
+        directory, name = os.path.split(os.path.abspath(spec.path))
+        return self._manifest(directory).get(name) == key and os.path.exists(spec.path)
+
+    def record(self, spec, key):
+        directory, name = os.path.split(os.path.abspath(spec.path))
+        self._manifest(directory)[name] = key
+        self.dirty.add(directory)
+
+    def save(self):
+        for directory in self.dirty:
+            path = os.path.join(directory, MANIFEST_NAME)
+            staging = f'{path}.{os.getpid()}.tmp'
+            with open(staging, 'w') as f:
+                json.dump(self.manifests[directory], f, indent=1, sort_keys=True)
+            os.replace(staging, path)
+        self.dirty.clear()
+
+class FigureRenderer:
+    """
+    Renders submitted specs in a pool of `workers` Agg processes (inline when workers <= 1).
+    With use_cache, specs whose key matches the manifest are skipped. Per-figure
+    timings are collected in `records` and handed to the active profiler on close
+    (`profile_dir` adds a cProfile dump per figure).
+    """
+    def __init__(self, workers=FIGURE_WORKERS, use_cache=True, profile_dir=None):
+        self.executor = make_executor(workers)
+        self.cache = FigureCache() if use_cache else None
+        self.profile_dir = profile_dir
+        self.records = []
+        self.rendered = 0
+        self.skipped = 0
+
+    def submit(self, spec):
+        """Queues a spec; returns a future resolving to the figure path."""
+        future = Future()
+        key = spec_key(spec) if self.cache is not None else None
+        if key is not None and self.cache.is_current(spec, key):
+            self.skipped += 1
+            future.set_result(spec.path)
+            return future
+
+        self.rendered += 1
+
+        def rendered(done):
+            if done.exception() is not None:
+                future.set_exception(done.exception())
+                return
+            path, records = done.result()
+            self.records.extend(records)
+            if key is not None:
+                self.cache.record(spec, key)
+            future.set_result(path)
+        self.executor.submit(_render_profiled, spec, self.profile_dir).add_done_callback(rendered)
+        return future
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        if self.cache is not None:
+            self.cache.save()
+        record_all(self.records)
+        logger.info(f"Figures: {self.rendered} rendered, {self.skipped} unchanged")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Specs emitted while collect_figures() is active (e.g. inside a pipeline stage)
+_collected = None
+
+def submit_figure(spec):
+    """
+    Hands a chart to the rendering service.
+    Inside collect_figures() the spec is queued for the caller to render;
+    otherwise (standalone use) it is rendered right away.
+    """
+    if _collected is not None:
+        _collected.append(spec)
+    else:
+        render_spec(spec)
+
+@contextmanager
+def collect_figures():
+    """Collects the specs submitted by the enclosed code instead of rendering them."""
+    global _collected
+    previous, _collected = _collected, []
+    try:
+        yield _collected
+    finally:
+        _collected = previous
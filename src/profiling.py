@@ -0,0 +1,171 @@
+"""
+Run profiling.
+Every pipeline step (shard read, clean, analysis stage, figure, PDF) is measured
+for wall time, CPU time, memory and rows processed. Memory is per step: the
+kernel's peak RSS mark is reset when a step starts, so `peak_rss_mb` is the
+peak while the step ran and `added_rss_mb` how far that rose above the RSS at
+its start (both None where /proc does not allow it, e.g. off Linux).
+The run profile is written to outputs/run_profile.json (latest run) and
+appended to outputs/run_profile.csv (history across runs). Optionally each step
+also dumps a cProfile file.
+"""
+import cProfile
+import csv
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from src.config import OUTPUTS_DIR
+from src.utils import setup_logger
+
+logger = setup_logger()
+
+PROFILE_FIELDS = ['run_id', 'name', 'kind', 'wall_s', 'cpu_s', 'peak_rss_mb', 'rows', 'pid', 'added_rss_mb']
+
+def _status_mb(field):
+    """A memory line (VmRSS, VmHWM) of /proc/self/status in MB, or None."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(f'{field}:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except (OSError, ValueError):
+        pass
+    return None
+
+def rss_mb():
+    """Current resident set size of this process, in MB."""
+    return _status_mb('VmRSS')
+
+def peak_rss_mb():
+    """Peak resident set size since the last reset_peak_rss(), in MB."""
+    return _status_mb('VmHWM')
+
+def reset_peak_rss():
+    """Restarts the peak RSS mark at the current RSS; False if the kernel does not allow it."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def append_csv(path, fields, rows):
+    """Appends rows to a CSV history, first rewriting it if its header predates `fields`."""
+    if os.path.exists(path):
+        with open(path, newline='') as f:
+            reader = csv.DictReader(f)
+            if reader.fieldnames != fields:
+                rows = list(reader) + list(rows)
+                os.remove(path)
+    new_file = not os.path.exists(path)
+    with open(path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, restval='', extrasaction='ignore')
+        if new_file:
+            writer.writeheader()
+        writer.writerows(rows)
+
+# Only one cProfile can be enabled at a time: a nested step pauses the enclosing
+# step's profile, so each dump holds the time not covered by an inner dump
+_cprofile_stack = []
+
+# Peak RSS seen so far by each enclosing step: a nested step resets the mark,
+# so the enclosing step folds in what it had reached and the nested peak
+_memory_stack = []
+
+class Profiler:
+    """Collects one record per measured step; `dump_dir` enables per-step cProfile dumps."""
+    def __init__(self, dump_dir=None):
+        self.dump_dir = dump_dir
+        self.records = []
+
+    @contextmanager
+    def stage(self, name, kind='stage', rows=None):
+        """Measures the enclosed block; the yielded record can be updated (e.g. rows)."""
+        record = {'name': name, 'kind': kind, 'rows': rows, 'pid': os.getpid()}
+        profile = None
+        if self.dump_dir:
+            if _cprofile_stack:
+                _cprofile_stack[-1].disable()
+            profile = cProfile.Profile()
+            _cprofile_stack.append(profile)
+            profile.enable()
+        if _memory_stack:
+            _memory_stack[-1] = max(_memory_stack[-1], peak_rss_mb() or 0)
+        start_rss = rss_mb()
+        measured = start_rss is not None and reset_peak_rss()
+        _memory_stack.append(0)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = round(time.perf_counter() - wall, 4)
+            record['cpu_s'] = round(time.process_time() - cpu, 4)
+            peak = max(_memory_stack.pop(), peak_rss_mb() or 0)
+            record['peak_rss_mb'] = peak if measured else None
+            record['added_rss_mb'] = round(max(peak - start_rss, 0), 1) if measured else None
+            if _memory_stack:
+                _memory_stack[-1] = max(_memory_stack[-1], peak)
+            if profile is not None:
+                profile.disable()
+                _cprofile_stack.pop()
+                if _cprofile_stack:
+                    _cprofile_stack[-1].enable()
+                os.makedirs(self.dump_dir, exist_ok=True)
+                safe_name = re.sub(r'[^\w.-]+', '_', f'{kind}_{name}')
+                profile.dump_stats(os.path.join(self.dump_dir, f'{safe_name}.prof'))
+            self.records.append(record)
+
+    def extend(self, records):
+        self.records.extend(records)
+
+    def write(self, out_dir=OUTPUTS_DIR, name='run_profile'):
+        """Writes the run to <name>.json and appends it to <name>.csv; returns the JSON path."""
+        run_id = datetime.now().isoformat(timespec='seconds')
+        records = [{'run_id': run_id, **record} for record in self.records]
+        os.makedirs(out_dir, exist_ok=True)
+
+        json_path = os.path.join(out_dir, f'{name}.json')
+        with open(json_path, 'w') as f:
+            json.dump({'run_id': run_id, 'argv': sys.argv, 'records': records}, f, indent=1)
+
+        append_csv(os.path.join(out_dir, f'{name}.csv'), PROFILE_FIELDS, records)
+        return json_path
+
+    def summary(self, top=5):
+        """Logs the slowest steps."""
+        for record in sorted(self.records, key=lambda r: r['wall_s'], reverse=True)[:top]:
+            logger.info(f"Profile: {record['kind']:<7} {record['name']:<40} {record['wall_s']:8.2f}s wall "
+                        f"{record['cpu_s']:8.2f}s cpu  rows={record['rows']}")
+
+# Profiler receiving the measurements of this process (see activate())
+_active = None
+
+@contextmanager
+def activate(profiler):
+    """Makes `profiler` the target of track() and record_all() in this process."""
+    global _active
+    previous, _active = _active, profiler
+    try:
+        yield profiler
+    finally:
+        _active = previous
+
+@contextmanager
+def track(name, kind='stage', rows=None):
+    """Measures the enclosed block into the active profiler (discarded when none is active)."""
+    profiler = _active if _active is not None else Profiler()
+    with profiler.stage(name, kind, rows) as record:
+        yield record
+
+def record_all(records):
+    """Adds records measured in a worker process to the active profiler."""
+    if _active is not None:
+        _active.extend(records)
+
+def dump_dir():
+    """cProfile dump directory of the active profiler (None when dumps are off)."""
+    return _active.dump_dir if _active is not None else None
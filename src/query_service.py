@@ -0,0 +1,304 @@
+"""
+Local aggregate query service.
+A long-lived stdlib HTTP server that keeps the (state x district x date) cube of
+every category warm in memory and answers ad-hoc cuts as JSON, using the same
+computations as the batch run (aggregate_state_stats, operational_maturity,
+the day-of-week load matrix and PMR of generate_server_load_insights).
+Cubes come from the delta AggregateStore: a background thread folds new or
+changed shard files in every QUERY_REFRESH_SECONDS. Results are kept in a
+bounded LRU keyed by query and data generation; a refresh that changes the
+data starts a new generation and clears it.
+Endpoints (GET, parameters as query string; lists are comma separated):
+    /health                                   categories, rows, cache counters
+    /state_stats?category=                    per-state sums and Total
+    /totals?category=&by=state,iso_week       totals by dimensions/calendar keys,
+        [&state=&district=&start=&end=]       optionally sliced
+    /omi?level=state|district[&state=&district=]
+    /pmr?category=[&state=]                   per-state PMR, plus the PMR of the
+                                              listed states combined (a region)
+    /server_load?category=                    the server load insights (markdown)
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import pandas as pd
+from src.config import DATA_DIRS, QUERY_HOST, QUERY_PORT, QUERY_CACHE_SIZE, QUERY_REFRESH_SECONDS
+from src.advanced_analytics import operational_maturity
+from src.analysis_daywise_week import generate_server_load_insights, peak_to_mean, state_day_load, \
+    state_day_matrix
+from src.analytics import aggregate_state_stats
+from src.cube import CALENDAR_KEYS, AggregateCube
+from src.delta import AggregateStore
+from src.utils import setup_logger
+
+logger = setup_logger()
+
+class QueryError(ValueError):
+    """A query that cannot be answered; `status` is the HTTP status to reply with."""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+class LRUCache:
+    """Bounded least-recently-used map, safe to share between request threads."""
+    def __init__(self, maxsize=QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+def _records(df):
+    """JSON rows of a frame (dates as YYYY-MM-DD, periods and categories as strings)."""
+    df = df.copy()
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime('%Y-%m-%d')
+        elif isinstance(df[col].dtype, (pd.PeriodDtype, pd.CategoricalDtype)):
+            df[col] = df[col].astype(str)
+    return json.loads(df.to_json(orient='records'))
+
+def _list(params, name):
+    """A comma-separated list parameter (empty list if absent)."""
+    return [value for item in params.get(name, []) for value in item.split(',') if value]
+
+def _one(params, name, default=None):
+    values = _list(params, name)
+    if len(values) > 1:
+        raise QueryError(f"'{name}' takes a single value")
+    return values[0] if values else default
+
+def _date(params, name):
+    value = _one(params, name)
+    if value is None:
+        return None
+    try:
+        return pd.Timestamp(value)
+    except ValueError:
+        raise QueryError(f"'{name}' is not a date: {value}") from None
+
+def slice_cube(cube, states=(), districts=(), start=None, end=None):
+    """The cells of a cube within the given states, districts and date window."""
+    index = cube.data.index
+    keep = np.ones(len(index), dtype=bool)
+    for key, values in [('state', states), ('district', districts)]:
+        if values:
+            if key not in cube.dims:
+                raise QueryError(f"No '{key}' dimension to filter on")
+            keep &= np.asarray(index.get_level_values(key).isin(values))
+    dates = index.get_level_values('date')
+    if start is not None:
+        keep &= np.asarray(dates >= start)
+    if end is not None:
+        keep &= np.asarray(dates <= end)
+    return cube if keep.all() else AggregateCube(cube.data[keep], cube.numeric_cols)
+
+class QueryService:
+    """Warm cubes of every category and the query handlers behind the HTTP endpoints."""
+    def __init__(self, data_dirs=DATA_DIRS, cache_size=QUERY_CACHE_SIZE, store=None):
+        self.data_dirs = data_dirs
+        self.store = store or AggregateStore()
+        self.cache = LRUCache(cache_size)
+        self.cubes = {}
+        self.generation = 0
+        self.refreshed_at = None
+        self._refresh_lock = threading.Lock()
+        self.handlers = {
+            'health': self.health,
+            'state_stats': self.state_stats,
+            'totals': self.totals,
+            'omi': self.omi,
+            'pmr': self.pmr,
+            'server_load': self.server_load,
+        }
+        self.refresh()
+
+    def refresh(self):
+        """Folds new/changed shards into the cubes; returns the categories that changed."""
+        with self._refresh_lock:
+            cubes, changed = self.store.update(self.data_dirs)
+            if changed or set(cubes) != set(self.cubes):
+                # Swap in the new cubes before retiring the cached results of the old ones
+                self.cubes = cubes
+                self.generation += 1
+                self.cache.clear()
+                logger.info(f"Query service: data generation {self.generation} "
+                            f"({', '.join(sorted(changed)) or 'initial load'})")
+            self.refreshed_at = time.time()
+            return changed
+
+    def query(self, endpoint, params):
+        """
+        Answers one query as JSON bytes, from the LRU when the same query was
+        answered on the current data. Raises QueryError for bad queries.
+        """
+        if endpoint not in self.handlers:
+            raise QueryError(f"Unknown endpoint: /{endpoint}", status=404)
+        key = (self.generation, endpoint, tuple(sorted((k, tuple(v)) for k, v in params.items())))
+        if endpoint != 'health':
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        body = json.dumps(self.handlers[endpoint](params)).encode()
+        if endpoint != 'health':
+            self.cache.put(key, body)
+        return body
+
+    def _cube(self, params):
+        category = _one(params, 'category')
+        if category is None:
+            raise QueryError(f"'category' is required (one of {', '.join(sorted(self.cubes))})")
+        if category not in self.cubes:
+            raise QueryError(f"No data for category: {category}", status=404)
+        return category, self.cubes[category]
+
+    def health(self, params):
+        return {
+            'categories': {category: cube.rows for category, cube in self.cubes.items()},
+            'generation': self.generation,
+            'refreshed_at': self.refreshed_at,
+            'cache': {'entries': len(self.cache), 'maxsize': self.cache.maxsize,
+                      'hits': self.cache.hits, 'misses': self.cache.misses},
+        }
+
+    def state_stats(self, params):
+        category, cube = self._cube(params)
+        return {'category': category, 'rows': _records(aggregate_state_stats(cube, cube.numeric_cols))}
+
+    def totals(self, params):
+        category, cube = self._cube(params)
+        by = _list(params, 'by') or ['state']
+        unknown = [key for key in by if key not in cube.dims and key not in CALENDAR_KEYS]
+        if unknown:
+            raise QueryError(f"Unknown keys: {', '.join(unknown)} (dimensions: {', '.join(cube.dims)}; "
+                             f"calendar keys: {', '.join(CALENDAR_KEYS)})")
+        sliced = slice_cube(cube, _list(params, 'state'), _list(params, 'district'),
+                            _date(params, 'start'), _date(params, 'end'))
+        if sliced.data.empty:
+            return {'category': category, 'by': by, 'rows': []}
+        return {'category': category, 'by': by, 'rows': _records(sliced.total(by))}
+
+    def omi(self, params):
+        if 'enrolment' not in self.cubes:
+            raise QueryError("OMI needs enrolment data", status=404)
+        level = _one(params, 'level', 'state')
+        if level not in ('state', 'district'):
+            raise QueryError("'level' is 'state' or 'district'")
+        keys = ['state'] if level == 'state' else ['state', 'district']
+        result = operational_maturity(self.cubes, keys)
+        for key in keys:
+            values = _list(params, key)
+            if values:
+                result = result[result[key].astype(str).isin(values)]
+        return {'level': level, 'rows': _records(result)}
+
+    def _state_day_matrix(self, category, cube):
+        load = state_day_load(cube, category)
+        if load is None:
+            raise QueryError(f"No state data for category: {category}", status=404)
+        return state_day_matrix(load)
+
+    def pmr(self, params):
+        category, cube = self._cube(params)
+        matrix = self._state_day_matrix(category, cube)
+        states = _list(params, 'state')
+        if states:
+            missing = sorted(set(states) - set(matrix.index))
+            if missing:
+                raise QueryError(f"No {category} data for: {', '.join(missing)}", status=404)
+            matrix = matrix.loc[states]
+        region = matrix.sum(axis=0)
+        return {
+            'category': category,
+            'states': {str(state): round(float(value), 4) for state, value in peak_to_mean(matrix).items()},
+            # The listed states (or all) as one region
+            'region': round(float(region.max() / region.mean()), 4) if region.mean() > 0 else None,
+            'peak_day': str(region.idxmax()),
+        }
+
+    def server_load(self, params):
+        category, cube = self._cube(params)
+        return {'category': category,
+                'insights': generate_server_load_insights(self._state_day_matrix(category, cube), category)}
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """Maps GET /<endpoint>?<params> onto QueryService.query."""
+    service = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        started = time.perf_counter()
+        try:
+            body, status = self.service.query(url.path.strip('/') or 'health', parse_qs(url.query)), 200
+        except QueryError as e:
+            body, status = json.dumps({'error': str(e)}).encode(), e.status
+        except Exception as e:
+            logger.exception(f"Query failed: {self.path}")
+            body, status = json.dumps({'error': f"{type(e).__name__}: {e}"}).encode(), 500
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        logger.info(f"{status} {self.path} ({(time.perf_counter() - started) * 1000:.1f} ms)")
+
+    def log_message(self, format, *args):
+        # Requests are logged (with their latency) by do_GET
+        pass
+
+def make_server(service, host=QUERY_HOST, port=QUERY_PORT):
+    """An HTTP server answering queries from `service` (port 0 picks a free port)."""
+    handler = type('BoundQueryHandler', (QueryHandler,), {'service': service})
+    return ThreadingHTTPServer((host, port), handler)
+
+def _refresh_loop(service, interval, stopped):
+    while not stopped.wait(interval):
+        try:
+            service.refresh()
+        except Exception:
+            logger.exception("Query service: refresh failed; serving the previous data")
+
+def serve(host=QUERY_HOST, port=QUERY_PORT, refresh_seconds=QUERY_REFRESH_SECONDS,
+          cache_size=QUERY_CACHE_SIZE, data_dirs=DATA_DIRS):
+    """Loads the cubes, then serves queries until interrupted, checking for new shards periodically."""
+    service = QueryService(data_dirs, cache_size)
+    server = make_server(service, host, port)
+    stopped = threading.Event()
+    if refresh_seconds > 0:
+        threading.Thread(target=_refresh_loop, args=(service, refresh_seconds, stopped), daemon=True).start()
+    logger.info(f"Query service listening on http://{host}:{server.server_address[1]}/ "
+                f"(categories: {', '.join(sorted(service.cubes))})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stopped.set()
+        server.server_close()
@@ -221,4 +221,6 @@ def generate_report():
     print(f"Report saved as {output_path}")
 
 if __name__ == "__main__":
+    from src.config import ensure_output_dirs
+    ensure_output_dirs()
     generate_report()
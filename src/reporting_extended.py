@@ -146,4 +146,6 @@ def generate_enhanced_report():
     print(f"Submission Report saved as {output_path}")
 
 if __name__ == "__main__":
+    from src.config import ensure_output_dirs
+    ensure_output_dirs()
     generate_enhanced_report()
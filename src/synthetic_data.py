@@ -0,0 +1,140 @@
+"""
+Synthetic national-scale data generator.
+Writes CSV shards with the real `date,state,district,pincode,<age buckets>`
+schema of each category. Rows follow a population-like state skew, a weekday
+profile (quiet weekends) and dips on national holidays, so loaders and
+analyses can be exercised at 10M-100M rows.
+
+Usage: python -m src.synthetic_data --rows 10000000 --out data_synthetic
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Allow `python src/synthetic_data.py` as well as `python -m src.synthetic_data`
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.config import DTYPE_SCHEMA
+from src.utils import setup_logger
+
+logger = setup_logger()
+
+# Relative activity per state (roughly population in millions)
+STATE_WEIGHTS = {
+    'Uttar Pradesh': 240, 'Maharashtra': 125, 'Bihar': 125, 'West Bengal': 100, 'Madhya Pradesh': 85,
+    'Rajasthan': 80, 'Tamil Nadu': 77, 'Gujarat': 70, 'Karnataka': 67, 'Andhra Pradesh': 53,
+    'Odisha': 46, 'Jharkhand': 39, 'Telangana': 38, 'Kerala': 35, 'Assam': 35, 'Punjab': 30,
+    'Chhattisgarh': 29, 'Haryana': 29, 'Delhi': 20, 'Jammu and Kashmir': 13, 'Uttarakhand': 11,
+    'Himachal Pradesh': 7.5, 'Tripura': 4, 'Meghalaya': 3.3, 'Manipur': 3, 'Nagaland': 2.2,
+    'Goa': 1.6, 'Puducherry': 1.6, 'Arunachal Pradesh': 1.5, 'Mizoram': 1.2, 'Chandigarh': 1.2,
+    'Sikkim': 0.7, 'Dadra and Nagar Haveli': 0.6, 'Andaman and Nicobar Islands': 0.4,
+    'Daman and Diu': 0.3, 'Ladakh': 0.3, 'Lakshadweep': 0.07,
+}
+
+# First three pincode digits of a representative postal region per state
+PINCODE_PREFIX = {
+    'Uttar Pradesh': 226, 'Maharashtra': 411, 'Bihar': 800, 'West Bengal': 700, 'Madhya Pradesh': 462,
+    'Rajasthan': 302, 'Tamil Nadu': 600, 'Gujarat': 380, 'Karnataka': 560, 'Andhra Pradesh': 520,
+    'Odisha': 751, 'Jharkhand': 834, 'Telangana': 500, 'Kerala': 695, 'Assam': 781, 'Punjab': 141,
+    'Chhattisgarh': 492, 'Haryana': 122, 'Delhi': 110, 'Jammu and Kashmir': 190, 'Uttarakhand': 248,
+    'Himachal Pradesh': 171, 'Tripura': 799, 'Meghalaya': 793, 'Manipur': 795, 'Nagaland': 797,
+    'Goa': 403, 'Puducherry': 605, 'Arunachal Pradesh': 791, 'Mizoram': 796, 'Chandigarh': 160,
+    'Sikkim': 737, 'Dadra and Nagar Haveli': 396, 'Andaman and Nicobar Islands': 744,
+    'Daman and Diu': 396, 'Ladakh': 194, 'Lakshadweep': 682,
+}
+
+# Relative volume Monday..Sunday
+WEEKDAY_PROFILE = [1.15, 1.05, 1.0, 1.0, 0.95, 0.6, 0.25]
+
+# Volume multiplier on national holidays
+HOLIDAY_FACTOR = 0.3
+
+# Mean count per row of each age bucket
+BUCKET_MEANS = {
+    'age_0_5': 3.0, 'age_5_17': 1.5, 'age_18_greater': 0.3,
+    'demo_age_5_17': 2.0, 'demo_age_17_': 15.0,
+    'bio_age_5_17': 10.0, 'bio_age_17_': 12.0,
+}
+
+def count_columns(category):
+    return [col for col, dtype in DTYPE_SCHEMA[category].items() if dtype == 'count']
+
+class SyntheticGenerator:
+    """Samples rows of one or more categories over [start, end] with a fixed seed."""
+    def __init__(self, start='2025-01-01', end='2025-12-31', seed=42):
+        self.rng = np.random.default_rng(seed)
+        self.dates = pd.date_range(start, end, freq='D')
+        weights = np.array(WEEKDAY_PROFILE)[self.dates.dayofweek]
+        import holidays
+        national = holidays.India(years=sorted(set(self.dates.year)))
+        weights = np.where(self.dates.isin(pd.DatetimeIndex(list(national))), weights * HOLIDAY_FACTOR, weights)
+        self.date_p = weights / weights.sum()
+        self.date_str = np.asarray(self.dates.strftime('%d-%m-%Y'), dtype=object)
+
+        self.states = np.array(list(STATE_WEIGHTS), dtype=object)
+        state_weights = np.array(list(STATE_WEIGHTS.values()))
+        self.state_p = state_weights / state_weights.sum()
+        # Bigger states get more districts
+        self.n_districts = np.maximum(1, np.round(np.sqrt(state_weights) * 4)).astype(int)
+        self.district_offset = np.concatenate([[0], np.cumsum(self.n_districts)[:-1]])
+        self.districts = np.array([f'{state} District {i + 1:02d}'
+                                   for state, n in zip(self.states, self.n_districts) for i in range(n)],
+                                  dtype=object)
+        self.prefix = np.array([PINCODE_PREFIX[state] for state in self.states])
+
+    def sample(self, category, rows):
+        """Returns `rows` raw rows of `category` (unsorted, as the CSVs would hold them)."""
+        rng = self.rng
+        state = rng.choice(len(self.states), size=rows, p=self.state_p)
+        district = self.district_offset[state] + (rng.random(rows) * self.n_districts[state]).astype(int)
+        df = pd.DataFrame({
+            'date': self.date_str[rng.choice(len(self.dates), size=rows, p=self.date_p)],
+            'state': self.states[state],
+            'district': self.districts[district],
+            'pincode': self.prefix[state] * 1000 + rng.integers(0, 1000, size=rows),
+        })
+        for col in count_columns(category):
+            df[col] = rng.poisson(BUCKET_MEANS[col], size=rows)
+        return df
+
+    def write(self, category, rows, out_dir, shard_rows=1_000_000):
+        """Writes `rows` rows as shards of at most `shard_rows`; returns the file names."""
+        os.makedirs(out_dir, exist_ok=True)
+        files = []
+        for first in range(0, rows, shard_rows):
+            last = min(rows, first + shard_rows)
+            df = self.sample(category, last - first)
+            filename = os.path.join(out_dir, f'api_data_aadhar_{category}_{first}_{last}.csv')
+            df.to_csv(filename, index=False)
+            files.append(filename)
+        logger.info(f"Wrote {rows} synthetic {category} rows to {out_dir} ({len(files)} shards)")
+        return files
+
+def generate_datasets(rows, out_root, categories=tuple(DTYPE_SCHEMA), shard_rows=1_000_000,
+                      start='2025-01-01', end='2025-12-31', seed=42):
+    """
+    Writes `rows` rows per category under out_root/api_data_aadhar_<category>.
+    Returns a DATA_DIRS-style {category: directory} mapping.
+    """
+    generator = SyntheticGenerator(start, end, seed)
+    data_dirs = {}
+    for category in categories:
+        path = os.path.join(out_root, f'api_data_aadhar_{category}')
+        generator.write(category, rows, path, shard_rows)
+        data_dirs[category] = path
+    return data_dirs
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic Aadhaar shard files")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Rows per category")
+    parser.add_argument('--out', required=True, help="Output root directory")
+    parser.add_argument('--shard-rows', type=int, default=1_000_000, help="Rows per CSV shard")
+    parser.add_argument('--start', default='2025-01-01')
+    parser.add_argument('--end', default='2025-12-31')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    generate_datasets(args.rows, args.out, shard_rows=args.shard_rows, start=args.start,
+                      end=args.end, seed=args.seed)
@@ -1,7 +1,15 @@
-from matplotlib.ticker import FuncFormatter
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
 import logging
+import os
 import sys
 
+# POSIX only; elsewhere writers of a shared directory are not serialized
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 def setup_logger(name="AadhaarAnalytics"):
     logger = logging.getLogger(name)
     if not logger.handlers:
@@ -12,6 +20,15 @@ def setup_logger(name="AadhaarAnalytics"):
         logger.addHandler(handler)
     return logger
 
+@contextmanager
+def file_lock(path):
+    """Exclusive hold on the lock file `path` (released when it is closed)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
 def format_indian(x, pos):
     if x >= 10000000:
         return f'{x/10000000:.1f} Cr'
@@ -20,4 +37,40 @@ def format_indian(x, pos):
     else:
         return f'{x:.0f}'
 
-indian_formatter = FuncFormatter(format_indian)
+def __getattr__(name):
+    # indian_formatter is built on first use, so importing utils does not pull in matplotlib
+    if name == 'indian_formatter':
+        from matplotlib.ticker import FuncFormatter
+        globals()[name] = FuncFormatter(format_indian)
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def numeric_columns(df):
+    """Returns the count columns of a frame (excludes pincode, date_key and YearMonth)."""
+    return [c for c in df.select_dtypes(include=['number']).columns
+            if 'pincode' not in c and 'Year' not in c and c != 'date_key']
+
+class InlineExecutor:
+    """Executor-compatible stand-in that runs each call immediately in this process."""
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+def make_executor(workers):
+    """A process pool of `workers` processes, or an InlineExecutor when workers <= 1."""
+    if workers <= 1:
+        return InlineExecutor()
+    return ProcessPoolExecutor(max_workers=workers)
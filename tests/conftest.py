@@ -0,0 +1,13 @@
+import os
+import shutil
+import tempfile
+import pytest
+from src.canonical import names_memo
+
+@pytest.fixture(autouse=True, scope='session')
+def scratch_names_memo():
+    """Fixture names are resolved against a throwaway memo, never outputs/cache/canonical_names.json."""
+    tmp = tempfile.mkdtemp()
+    with names_memo(os.path.join(tmp, 'canonical_names.json')):
+        yield
+    shutil.rmtree(tmp, ignore_errors=True)
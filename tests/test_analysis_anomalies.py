@@ -0,0 +1,70 @@
+import unittest
+import tempfile
+from unittest import mock
+import numpy as np
+import pandas as pd
+from src.cube import AggregateCube
+from src.analysis_anomalies import AnomalyStore, WINDOW_WEEKS, daily_matrix, robust_scores
+
+def cube_of(days, spike_day=None):
+    """Two states over `days` days with a weekly pattern; state A spikes on spike_day."""
+    rows = []
+    for day in range(days):
+        date = pd.Timestamp('2025-01-06') + pd.Timedelta(days=day)
+        base = 100 if date.dayofweek < 5 else 20
+        rows.append({'state': 'A', 'district': 'A1', 'date': date,
+                     'age_0_5': base * (5 if day == spike_day else 1) + day % 3})
+        rows.append({'state': 'B', 'district': 'B1', 'date': date, 'age_0_5': base + day % 2})
+    return AggregateCube.from_frame(pd.DataFrame(rows))
+
+class TestAnomalies(unittest.TestCase):
+    def test_robust_scores_use_same_weekday_history(self):
+        values = np.array([[10, 10, 10, 10, 10, 50, 50] * 5], dtype=float)
+        values[0, 34] = 200
+        baseline, z = robust_scores(values, np.array([0, 29, 34]))
+        self.assertTrue(np.isnan(z[0, 0]))  # no history yet
+        self.assertEqual(baseline[0, 1], 10)
+        self.assertEqual(z[0, 1], 0)
+        self.assertEqual(baseline[0, 2], 50)
+        self.assertGreater(z[0, 2], 3.5)
+
+    def test_spike_is_localized_and_updates_incrementally(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = AnomalyStore(tmp)
+            result = store.update('enrolment', cube_of(42, spike_day=40))
+            spikes = result[result['Z'] > 0]
+            self.assertEqual(set(spikes['state']), {'A'})
+            self.assertEqual(set(spikes['level']), {'state', 'district'})
+            self.assertEqual(spikes['date'].iloc[0], pd.Timestamp('2025-01-06') + pd.Timedelta(days=40))
+            # Ranked by |z|
+            self.assertTrue((result['Z'].abs().diff().dropna() <= 0).all())
+
+            # A new day: earlier flags are kept, only the new day is scored against the kept window
+            new_day = pd.Timestamp('2025-01-06') + pd.Timedelta(days=42)
+            with mock.patch('src.analysis_anomalies.daily_matrix', wraps=daily_matrix) as matrix:
+                incremental = store.update('enrolment', cube_of(43, spike_day=40), since=new_day)
+            self.assertTrue(all(len(call.args[0]['date'].unique()) <= 7 * WINDOW_WEEKS + 1
+                                for call in matrix.call_args_list))
+            fresh = AnomalyStore(tmp + '/fresh').update('enrolment', cube_of(43, spike_day=40))
+            pd.testing.assert_frame_equal(incremental, fresh)
+            self.assertEqual(len(incremental), len(result))
+
+    def test_revised_history_matches_a_full_run(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = AnomalyStore(tmp)
+            store.update('enrolment', cube_of(120))
+            # The spike arrives late, for a day inside the kept window
+            spike_day = pd.Timestamp('2025-01-06') + pd.Timedelta(days=100)
+            incremental = store.update('enrolment', cube_of(121, spike_day=100), since=spike_day)
+            fresh = AnomalyStore(tmp + '/fresh').update('enrolment', cube_of(121, spike_day=100))
+            pd.testing.assert_frame_equal(incremental, fresh)
+            self.assertIn(spike_day, set(incremental['date']))
+
+            # Older than the window: re-scored in full
+            incremental = store.update('enrolment', cube_of(121, spike_day=10),
+                                       since=pd.Timestamp('2025-01-16'))
+            fresh = AnomalyStore(tmp + '/fresh').update('enrolment', cube_of(121, spike_day=10))
+            pd.testing.assert_frame_equal(incremental, fresh)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import tempfile
+import pandas as pd
+from src.cube import AggregateCube
+from src.analysis_clustering import ClusterModel, cluster_level, feature_matrix
+
+def cubes_of():
+    """Enrolment-heavy (A), update-heavy (B) and balanced (C) pairs of states, over two weeks."""
+    rows = {'enrolment': [], 'demographic': []}
+    for day in range(14):
+        date = pd.Timestamp('2025-03-03') + pd.Timedelta(days=day)
+        for state, enrol, demo in [('A1', 90, 10), ('A2', 80, 12), ('B1', 10, 90), ('B2', 12, 85),
+                                     ('C1', 50, 50), ('C2', 45, 50)]:
+            rows['enrolment'].append({'state': state, 'district': f'{state} D', 'date': date,
+                                      'age_0_5': enrol, 'age_5_17': 5})
+            rows['demographic'].append({'state': state, 'district': f'{state} D', 'date': date,
+                                        'demo_age_5_17': demo, 'demo_age_17_': 2 * demo})
+    return {cat: AggregateCube.from_frame(pd.DataFrame(r)) for cat, r in rows.items()}
+
+class TestClustering(unittest.TestCase):
+    def test_feature_matrix(self):
+        features, volume = feature_matrix(cubes_of(), ['state'])
+        self.assertEqual(list(features.index), ['A1', 'A2', 'B1', 'B2', 'C1', 'C2'])
+        self.assertAlmostEqual(features.loc['B1', 'OMI'], 270 / (270 + 10 + 5))
+        self.assertAlmostEqual(features.loc['A1', 'dow_Mon'], 2 / 14)
+        self.assertAlmostEqual(features.loc['A1', 'PMR'], 1.0)
+        self.assertEqual(volume.loc['A1', 'enrolment'], 14 * 95)
+        self.assertAlmostEqual(features.loc['A1', 'Growth'], 0.0)
+
+    def test_warm_start_keeps_cluster_ids(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            model = ClusterModel(tmp)
+            first = cluster_level(cubes_of(), 'state', model)
+            labels = dict(zip(first['state'], first['Cluster']))
+            self.assertEqual(labels['A1'], labels['A2'])
+            self.assertEqual(labels['B1'], labels['B2'])
+            self.assertEqual(labels['C1'], labels['C2'])
+            self.assertEqual(len(set(labels.values())), 3)
+
+            self.assertIsNotNone(model.load('state', first.columns[first.columns.get_loc('Cluster') + 1:], 3))
+            again = cluster_level(cubes_of(), 'state', model)
+            self.assertEqual(again['Cluster'].tolist(), first['Cluster'].tolist())
+
+if __name__ == '__main__':
+    unittest.main()
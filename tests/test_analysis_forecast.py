@@ -0,0 +1,47 @@
+import unittest
+import tempfile
+import os
+import numpy as np
+import pandas as pd
+from src.cube import AggregateCube
+from src.analysis_forecast import analyze_forecasts, forecast_level, forecast_holidays
+
+WEEKLY = [50, 40, 40, 40, 40, 10, 5]
+
+def cube_of(days=70):
+    """Two states whose series are an exact trend + weekday pattern (no holidays in March-May)."""
+    dates = pd.date_range('2025-03-03', periods=days, freq='D')
+    rows = []
+    for i, date in enumerate(dates):
+        rows.append({'state': 'Goa', 'district': 'North Goa', 'date': date,
+                     'age_0_5': WEEKLY[date.dayofweek] + i})
+        rows.append({'state': 'Kerala', 'district': 'Idukki', 'date': date,
+                     'age_0_5': 2 * WEEKLY[date.dayofweek]})
+    return AggregateCube.from_frame(pd.DataFrame(rows))
+
+class TestForecast(unittest.TestCase):
+    def test_batch_fit_recovers_trend_and_weekday_pattern(self):
+        cube = cube_of()
+        holidays = forecast_holidays(cube.dates, 7)
+        holidays.mask[:] = False
+        forecast, summary = forecast_level(cube, 'state', holidays, horizon=7)
+        self.assertEqual(summary['Series'], 2)
+        self.assertLess(summary['MAE'], 1e-6)
+
+        future = pd.date_range('2025-05-12', periods=7, freq='D')
+        goa = forecast[forecast['state'] == 'Goa'].set_index('date')['Forecast']
+        kerala = forecast[forecast['state'] == 'Kerala'].set_index('date')['Forecast']
+        np.testing.assert_allclose(goa[future], [WEEKLY[d.dayofweek] + 70 + i for i, d in enumerate(future)])
+        np.testing.assert_allclose(kerala[future], [2 * WEEKLY[d.dayofweek] for d in future])
+
+    def test_tables_cover_every_level(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            forecast = analyze_forecasts({'enrolment': cube_of(21)}, tmp)['enrolment']
+            self.assertEqual(forecast.groupby('level').size().to_dict(),
+                             {'national': 30, 'state': 60, 'district': 60})
+            fit = pd.read_csv(os.path.join(tmp, 'enrolment_forecast_fit.csv'))
+            self.assertEqual(fit['level'].tolist(), ['national', 'state', 'district'])
+            self.assertIn('Fit_Seconds', fit.columns)
+
+if __name__ == '__main__':
+    unittest.main()
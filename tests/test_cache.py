@@ -0,0 +1,67 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+import pandas as pd
+from src.cache import DatasetCache, ShardStats
+
+class TestDatasetCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp.name, 'part.csv')
+        self.cache_dir = os.path.join(self.tmp.name, 'cache')
+        with open(self.source, 'w') as f:
+            f.write("date,state,count\n01-01-2023,A,10\n")
+        self.df = pd.DataFrame({'date': pd.to_datetime(['2023-01-01']), 'state': ['A'], 'count': [10]})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_hit_after_put_and_reload(self):
+        cache = DatasetCache(self.cache_dir)
+        self.assertIsNone(cache.get('test', self.source))
+        cache.put('test', self.source, self.df)
+        cache.save()
+
+        cached = DatasetCache(self.cache_dir).get('test', self.source)
+        pd.testing.assert_frame_equal(cached, self.df)
+
+    def test_changed_file_is_a_miss(self):
+        cache = DatasetCache(self.cache_dir)
+        cache.put('test', self.source, self.df)
+        with open(self.source, 'a') as f:
+            f.write("02-01-2023,B,20\n")
+        self.assertIsNone(cache.get('test', self.source))
+
+    def test_touched_identical_file_is_a_hit(self):
+        cache = DatasetCache(self.cache_dir)
+        cache.put('test', self.source, self.df)
+        stat = os.stat(self.source)
+        os.utime(self.source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertIsNotNone(cache.get('test', self.source))
+
+    def test_shard_stats_follow_the_content(self):
+        stats = ShardStats(self.cache_dir)
+        stats.record(self.source, self.df['date'], self.df['state'])
+        stat = os.stat(self.source)
+        os.utime(self.source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertIsNotNone(stats.lookup(self.source))
+
+        # Same size, new content: the recorded date range no longer applies
+        with open(self.source, 'w') as f:
+            f.write("date,state,count\n01-01-2024,A,10\n")
+        self.assertIsNone(stats.lookup(self.source))
+
+    def test_name_rule_change_invalidates_entries(self):
+        cache, stats = DatasetCache(self.cache_dir), ShardStats(self.cache_dir)
+        cache.put('test', self.source, self.df)
+        stats.record(self.source, self.df['date'], self.df['state'])
+        self.assertEqual(stats.lookup(self.source)['states'], ['A'])
+
+        # Cached frames and shard state sets hold canonical names: new rules make them stale
+        with mock.patch('src.cache.CANONICAL_VERSION', -1):
+            self.assertIsNone(cache.get('test', self.source))
+            self.assertIsNone(stats.lookup(self.source))
+
+if __name__ == '__main__':
+    unittest.main()
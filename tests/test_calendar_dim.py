@@ -0,0 +1,41 @@
+import unittest
+import numpy as np
+import pandas as pd
+from src.calendar_dim import calendar_key, calendar_table, date_keys, key_dates, parse_dates
+
+class TestCalendarDimension(unittest.TestCase):
+    def test_parse_dates_once_per_distinct_value(self):
+        parsed = parse_dates(pd.Series(['02-01-2025', 'bad', '02-01-2025', None, '31-12-2024']))
+        expected = pd.to_datetime(['2025-01-02', None, '2025-01-02', None, '2024-12-31'])
+        np.testing.assert_array_equal(parsed, expected.values)
+
+    def test_date_keys_round_trip(self):
+        dates = pd.to_datetime(['1970-01-02', '2025-01-02'])
+        keys = date_keys(dates)
+        self.assertEqual(keys.dtype, np.int32)
+        self.assertEqual(keys[0], 1)
+        self.assertTrue(key_dates(keys).equals(pd.DatetimeIndex(dates)))
+
+    def test_calendar_table_and_lookups(self):
+        dates = pd.Series(pd.to_datetime(['2025-01-26', '2025-01-27', '2025-01-26']))
+        table = calendar_table(dates)
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table['day_name'].tolist(), ['Sunday', 'Monday'])
+        self.assertEqual(table['iso_week'].tolist(), ['2025-W04', '2025-W05'])
+        self.assertEqual(table['is_weekend'].tolist(), [True, False])
+        # Republic Day
+        self.assertEqual(table['is_national_holiday'].tolist(), [True, False])
+
+        by_date = calendar_key(dates, 'YearMonth')
+        by_key = calendar_key(date_keys(dates), 'YearMonth')
+        self.assertTrue(by_date.equals(by_key))
+        self.assertEqual(str(by_date[0]), '2025-01')
+        # 2025-12-29 falls in ISO week 1 of 2026, not week 1 of 2025
+        weeks = calendar_key(pd.to_datetime(['2025-01-01', '2025-12-29']), 'iso_week')
+        self.assertEqual(weeks.tolist(), ['2025-W01', '2026-W01'])
+        self.assertEqual(calendar_key(pd.to_datetime(['2025-12-29']), 'iso_year').tolist(), [2026])
+        with self.assertRaises(KeyError):
+            calendar_key(dates, 'fortnight')
+
+if __name__ == '__main__':
+    unittest.main()
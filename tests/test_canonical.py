@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import unittest
+import pandas as pd
+from src.canonical import (NameIndex, UNKNOWN_STATE, canonicalize_names, display_name, names_memo, resolve_state,
+                           shard_digest)
+from src.data_loader import iter_file, load_datasets, refresh_pincode_reference
+
+def _frame():
+    return pd.DataFrame({
+        'state': ['Odisha', 'Orissa', 'ODISHA', 'West Bengal', 'WESTBENGAL', 'West  Bengal',
+                  'Jammu & Kashmir', 'Maharashtra', 'Nagpur', 'Nagpur', '100000'],
+        'district': ['Puri', 'Puri', 'puri', 'Howrah', 'Howrah', 'Howrah',
+                     'Jammu', 'Nagpur', 'Nagpur', 'Nagpur', 'Nowhere'],
+        'pincode': [752001, 752001, 752001, 711101, 711101, 711101,
+                    180001, 440024, 440024, 440099, 999999],
+        'count': range(11),
+    })
+
+class TestCanonicalNames(unittest.TestCase):
+    def test_resolve_state_variants(self):
+        self.assertEqual(resolve_state('Orissa'), 'Odisha')
+        self.assertEqual(resolve_state('WESTBENGAL'), 'West Bengal')
+        self.assertEqual(resolve_state('Jammu & Kashmir'), 'Jammu and Kashmir')
+        self.assertIsNone(resolve_state('Nagpur'))
+        self.assertEqual(display_name('Gadag *'), 'Gadag')
+        self.assertEqual(display_name('KARIM  NAGAR'), 'Karim Nagar')
+
+    def test_canonicalize_keeps_every_row(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            df = NameIndex(os.path.join(tmp, 'names.json')).canonicalize(_frame())
+        self.assertEqual(len(df), 11)
+        self.assertEqual(df['state'].tolist()[:7], ['Odisha'] * 3 + ['West Bengal'] * 3 + ['Jammu and Kashmir'])
+        # Cities resolve by exact pincode, then by the 3-digit prefix
+        self.assertEqual(df['state'].tolist()[8:10], ['Maharashtra', 'Maharashtra'])
+        # Nothing places '100000': it keeps its own name rather than being dropped
+        self.assertEqual(df['state'].iloc[10], '100000')
+        # District spellings merge within a state
+        self.assertEqual(df.loc[df['state'] == 'Odisha', 'district'].nunique(), 1)
+        self.assertEqual(df.groupby('state', observed=True)['count'].sum().sum(), sum(range(11)))
+
+    def test_missing_names_go_under_unknown(self):
+        df = pd.DataFrame({'state': ['Orissa', None, 'SOUTH  ZONE'], 'pincode': [752001, 752001, 999999]})
+        with tempfile.TemporaryDirectory() as tmp:
+            states = NameIndex(os.path.join(tmp, 'names.json')).canonicalize(df)['state']
+        self.assertEqual(states.tolist(), ['Odisha', UNKNOWN_STATE, 'South Zone'])
+
+    def test_memo_persists_across_runs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'names.json')
+            first = NameIndex(path).canonicalize(_frame())
+            with open(path) as f:
+                memo = json.load(f)
+            self.assertEqual(memo['states']['Orissa'], 'Odisha')
+            self.assertEqual(memo['districts']['Odisha|puri'], 'Puri')
+            again = NameIndex(path).canonicalize(_frame())
+        pd.testing.assert_frame_equal(first, again)
+
+    def test_reference_places_names_whatever_is_loaded_with_them(self):
+        def shard(path, states, pincodes):
+            pd.DataFrame({'date': '01-01-2023', 'state': states, 'district': 'Nagpur',
+                          'pincode': pincodes, 'age_0_5': 1}).to_csv(path, index=False)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            data_dir = os.path.join(tmp, 'enrolment')
+            os.makedirs(data_dir)
+            # On its own, the first shard would place Nagpur in Gujarat
+            first = os.path.join(data_dir, 'part_0.csv')
+            shard(first, ['Nagpur', 'Gujarat'], [440024, 440024])
+            shard(os.path.join(data_dir, 'part_1.csv'), ['Maharashtra'] * 2, [440024, 440024])
+
+            with names_memo(os.path.join(tmp, 'names.json')):
+                df = load_datasets({'enrolment': data_dir}, workers=1, use_cache=False)['enrolment']
+                self.assertEqual(df.loc[df['pincode'] == 440024, 'state'].value_counts()['Maharashtra'], 3)
+                # Chunks follow the same decisions as whole shards
+                chunks = list(iter_file('enrolment', first, chunksize=1))
+                self.assertEqual([c['state'].iloc[0] for c in chunks], ['Maharashtra', 'Gujarat'])
+
+                # New rows that change a decision change the digest of the shards using it only
+                digests = [shard_digest(os.path.join(data_dir, f'part_{i}.csv')) for i in range(2)]
+                shard(os.path.join(data_dir, 'part_2.csv'), ['Gujarat'] * 3, [440024] * 3)
+                refresh_pincode_reference({'enrolment': data_dir}, workers=1)
+                self.assertNotEqual(shard_digest(first), digests[0])
+                self.assertEqual(shard_digest(os.path.join(data_dir, 'part_1.csv')), digests[1])
+
+    def test_memo_location_follows_names_memo(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ['first.json', 'second.json']:
+                with names_memo(os.path.join(tmp, name)):
+                    canonicalize_names(_frame())
+            with open(os.path.join(tmp, 'second.json')) as f:
+                self.assertEqual(json.load(f)['states']['Orissa'], 'Odisha')
+            self.assertEqual(sorted(os.listdir(tmp)), ['first.json', 'second.json'])
+
+if __name__ == '__main__':
+    unittest.main()
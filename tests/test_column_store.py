@@ -0,0 +1,65 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+import pandas as pd
+from src import column_store
+from src.column_store import ColumnStore
+from src.cube import AggregateCube, as_cube
+
+def write_shard(path, dates, counts):
+    pd.DataFrame({'date': dates, 'state': ['B', 'A', 'B'][:len(dates)], 'district': 'D',
+                  'pincode': 560001, 'age_0_5': counts, 'age_5_17': 1, 'age_18_greater': 0}) \
+        .to_csv(path, index=False)
+
+class TestColumnStore(unittest.TestCase):
+    def test_sync_and_lazy_reads(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            data_dir = os.path.join(tmp, 'enrolment')
+            os.makedirs(data_dir)
+            write_shard(os.path.join(data_dir, 'part_0.csv'), ['02-01-2023', '01-01-2023', '03-01-2023'], [1, 2, 3])
+            store = ColumnStore(os.path.join(tmp, 'store'))
+
+            stored = store.sync({'enrolment': data_dir}, workers=1, use_cache=False)['enrolment']
+            self.assertEqual(len(stored), 3)
+            frame = stored.frame()
+            self.assertTrue(frame['date'].is_monotonic_increasing)
+            self.assertIsInstance(frame['state'].dtype, pd.CategoricalDtype)
+            self.assertIn('YearMonth', frame.columns)
+
+            # Date ranges map to row slices; chunks split on date boundaries
+            window = stored.frame(['date', 'age_0_5'], start='2023-01-02', end='2023-01-02')
+            self.assertEqual(window['age_0_5'].tolist(), [1])
+            chunks = list(stored.iter_frames(['state', 'district', 'date', 'age_0_5'], chunk_rows=1))
+            self.assertEqual([len(c) for c in chunks], [1, 1, 1])
+            pd.testing.assert_frame_equal(as_cube(stored).data,
+                                          AggregateCube.from_frame(frame, stored.numeric_cols).data)
+
+            # A new shard adds its own segment; the unchanged one is not reloaded
+            write_shard(os.path.join(data_dir, 'part_1.csv'), ['04-01-2023'], [4])
+            with mock.patch.object(column_store, 'load_shards', wraps=column_store.load_shards) as load:
+                stored = store.sync({'enrolment': data_dir}, workers=1, use_cache=False)['enrolment']
+            loaded = [f for call in load.call_args_list for f in call.args[0]['enrolment']]
+            self.assertEqual([os.path.basename(f) for f in loaded], ['part_1.csv'])
+            self.assertEqual(stored.column('age_0_5').tolist(), [2, 1, 3, 4])
+            self.assertEqual(len(stored.segments), 2)
+
+    def test_changed_shard_replaces_its_segment(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            data_dir = os.path.join(tmp, 'enrolment')
+            os.makedirs(data_dir)
+            write_shard(os.path.join(data_dir, 'part_0.csv'), ['01-01-2023', '02-01-2023'], [1, 2])
+            write_shard(os.path.join(data_dir, 'part_1.csv'), ['01-01-2023'], [5])
+            store = ColumnStore(os.path.join(tmp, 'store'))
+            before = store.sync({'enrolment': data_dir}, workers=1, use_cache=False)['enrolment']
+
+            write_shard(os.path.join(data_dir, 'part_0.csv'), ['01-01-2023', '02-01-2023'], [7, 8])
+            after = store.sync({'enrolment': data_dir}, workers=1, use_cache=False)['enrolment']
+            self.assertEqual(after.column('age_0_5').tolist(), [7, 5, 8])
+            # The old segment is dropped only after the manifest swap; nothing is left staged
+            kept = {os.path.basename(s.path) for s in after.segments}
+            self.assertEqual(set(os.listdir(store.path_for('enrolment'))), kept | {'manifest.json', '.lock'})
+            self.assertIn(os.path.basename(before.segments[1].path), kept)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import pandas as pd
+from src.cube import AggregateCube, ROW_COUNT, as_cube, calendar_key
+
+class TestAggregateCube(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'date': pd.to_datetime(['2025-01-01', '2025-01-01', '2025-01-01', '2025-01-02', '2025-01-06']),
+            'state': pd.Categorical(['StateA', 'StateA', 'StateB', 'StateA', 'StateB']),
+            'district': ['D1', 'D1', 'D2', 'D3', 'D2'],
+            'pincode': [111, 112, 222, 113, 222],
+            'enc_count': [100, 10, 200, 110, 5],
+            'upd_count': [50, 5, 100, 55, 1],
+        })
+        self.cube = AggregateCube.from_frame(self.df)
+
+    def test_cells_and_columns(self):
+        self.assertEqual(len(self.cube), 4)  # (A,D1,01) collapses two pincodes
+        self.assertEqual(self.cube.numeric_cols, ['enc_count', 'upd_count'])
+        self.assertEqual(self.cube.rows, 5)
+
+    def test_query_matches_raw_groupby(self):
+        expected = self.df.groupby('state', observed=True)[['enc_count', 'upd_count']].sum().reset_index()
+        pd.testing.assert_frame_equal(self.cube.query('state'), expected, check_dtype=False)
+
+    def test_calendar_keys_and_row_counts(self):
+        result = self.cube.total('day_name', rows=True).set_index('day_name')
+        self.assertEqual(result.loc['Wednesday', 'Total'], 100 + 10 + 200 + 50 + 5 + 100)
+        self.assertEqual(result.loc['Wednesday', ROW_COUNT], 3)
+        self.assertEqual(result.loc['Monday', ROW_COUNT], 1)
+
+    def test_calendar_key_maps_distinct_dates(self):
+        dates = pd.Series(pd.to_datetime(['2023-01-07', '2023-01-02', '2023-01-07']))
+        self.assertEqual(list(calendar_key(dates, 'day_name')), ['Saturday', 'Monday', 'Saturday'])
+        self.assertEqual(list(calendar_key(dates, 'dayofweek')), [5, 0, 5])
+
+    def test_calendar_lookups_share_the_cube_calendar(self):
+        table = self.cube.calendar
+        self.cube.query('day_name')
+        self.cube.query('month')
+        self.assertIs(self.cube.calendar, table)
+        self.assertEqual(len(table), len(self.cube.dates))
+        self.assertTrue({'day_name', 'month'} <= set(table.columns))
+
+    def test_as_cube_is_idempotent(self):
+        self.assertIs(as_cube(self.cube), self.cube)
+
+if __name__ == '__main__':
+    unittest.main()
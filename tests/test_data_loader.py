@@ -1,7 +1,9 @@
 import unittest
 import pandas as pd
 import os
-from src.data_loader import clean_data
+import tempfile
+from unittest import mock
+from src.data_loader import clean_data, iter_file, load_data, load_datasets, read_file, stream_aggregate
 
 class TestDataLoader(unittest.TestCase):
     def test_clean_data_basic(self):
@@ -21,5 +23,119 @@ class TestDataLoader(unittest.TestCase):
         self.assertTrue('YearMonth' in cleaned.columns, "Should create derived feature")
         self.assertTrue(pd.api.types.is_datetime64_any_dtype(cleaned['date']), "Date should be datetime")
 
+    def test_clean_data_applies_compact_schema(self):
+        df = pd.DataFrame({
+            'date': ['01-01-2023', '02-01-2023'],
+            'state': ['B', 'A'],
+            'district': ['X', 'Y'],
+            'pincode': [560001, 110001],
+            'age_0_5': [3, 250],
+            'age_5_17': [1000, None],
+            'age_18_greater': [0, 1]
+        })
+        cleaned = clean_data(df, 'enrolment')
+
+        self.assertIsInstance(cleaned['state'].dtype, pd.CategoricalDtype)
+        self.assertEqual(list(cleaned['state'].cat.categories), ['A', 'B'])
+        self.assertEqual(cleaned['pincode'].dtype, 'uint32')
+        self.assertEqual(cleaned['age_0_5'].dtype, 'uint8')
+        self.assertEqual(cleaned['age_5_17'].dtype, 'uint16')
+        self.assertEqual(cleaned['age_5_17'].sum(), 1000)
+
+    def test_clean_data_canonicalizes_names(self):
+        df = pd.DataFrame({
+            'date': ['01-01-2023', '01-01-2023', '02-01-2023', '02-01-2023'],
+            'state': ['Orissa', 'ODISHA', 'Nagpur', 'Maharashtra'],
+            'district': ['Puri', 'puri', 'Nagpur', 'Nagpur'],
+            'pincode': [752001, 752001, 440024, 440024],
+            'age_0_5': [1, 2, 3, 4],
+        })
+        cleaned = clean_data(df, 'enrolment')
+
+        self.assertEqual(list(cleaned['state']), ['Odisha', 'Odisha', 'Maharashtra', 'Maharashtra'])
+        self.assertEqual(list(cleaned['district']), ['Puri', 'Puri', 'Nagpur', 'Nagpur'])
+
+    def test_iter_file_cleans_each_chunk(self):
+        data = pd.DataFrame({
+            'date': ['01-01-2023', '01-01-2023', '02-01-2023', 'invalid', '02-01-2023'],
+            'state': ['A', 'B', 'A', 'B', 'B'],
+            'pincode': [1, 2, 1, 2, 2],
+            'count': [10, 20, 30, 40, 50]
+        })
+        with tempfile.TemporaryDirectory() as tmp:
+            data.to_csv(os.path.join(tmp, 'part.csv'), index=False)
+            chunks = list(iter_file('test_category', os.path.join(tmp, 'part.csv'), chunksize=2))
+
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(sum(len(c) for c in chunks), 4, "Invalid dates dropped per chunk")
+        totals = pd.concat(chunks).groupby('state', observed=True)['count'].sum()
+        self.assertEqual(totals.to_dict(), {'A': 40, 'B': 70})
+
+    def test_stream_aggregate_matches_full_load(self):
+        data = pd.DataFrame({
+            'date': ['01-01-2023', '01-01-2023', '02-01-2023', 'invalid', '02-01-2023'],
+            'state': ['B', 'A', 'A', 'B', 'B'],
+            'pincode': [1, 2, 1, 2, 2],
+            'count': [10, 20, 30, 40, 250]
+        })
+        with tempfile.TemporaryDirectory() as tmp:
+            data.to_csv(os.path.join(tmp, 'part.csv'), index=False)
+            chunks = list(load_data('test_category', tmp, chunksize=2))
+            result = stream_aggregate('test_category', tmp, by='state', chunksize=2)
+            sliced = stream_aggregate('test_category', tmp, by='state', chunksize=2, states=['B'])
+
+        self.assertEqual([len(c) for c in chunks], [2, 1, 1])
+        # Each chunk narrows its counts on its own (uint8 here): sums are widened, not wrapped
+        self.assertEqual(result.set_index('state')['count'].to_dict(), {'A': 50, 'B': 260})
+        self.assertIsInstance(result['state'].dtype, pd.CategoricalDtype)
+        self.assertNotIn('pincode', result.columns)
+        self.assertEqual(sliced['state'].tolist(), ['B'])
+
+    def test_load_datasets_parallel_matches_serial(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            dirs = {}
+            for category, states in [('cat_a', ['X', 'Y']), ('cat_b', ['Z', 'X'])]:
+                dirs[category] = os.path.join(tmp, category)
+                os.makedirs(dirs[category])
+                for i, state in enumerate(states):
+                    pd.DataFrame({'date': [f'0{i + 1}-01-2023'], 'state': [state], 'count': [i + 1]}) \
+                        .to_csv(os.path.join(dirs[category], f'part_{i}.csv'), index=False)
+            # Shard failing schema validation is skipped, not fatal
+            pd.DataFrame({'date': ['01-01-2023'], 'count': [5]}) \
+                .to_csv(os.path.join(dirs['cat_a'], 'part_bad.csv'), index=False)
+
+            parallel = load_datasets(dirs, workers=2, use_cache=False)
+            serial = load_datasets(dirs, workers=1, use_cache=False)
+
+        self.assertEqual(sorted(parallel), ['cat_a', 'cat_b'])
+        for category in parallel:
+            pd.testing.assert_frame_equal(parallel[category], serial[category])
+        self.assertEqual(list(parallel['cat_b']['state']), ['Z', 'X'])
+
+    def test_load_data_pushdown(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            data_dir, cache_dir = os.path.join(tmp, 'data'), os.path.join(tmp, 'cache')
+            os.makedirs(data_dir)
+            for month, states in [('01', ['Orissa', 'Bihar', 'Goa']), ('02', ['Odisha', 'Goa', 'Kerala'])]:
+                pd.DataFrame({'date': [f'1{i}-{month}-2025' for i in range(3)], 'state': states,
+                              'district': ['D'] * 3, 'pincode': [751001, 800001, 403001],
+                              'age_0_5': [1, 2, 3], 'age_5_17': [4, 5, 6]}) \
+                    .to_csv(os.path.join(data_dir, f'part_{month}.csv'), index=False)
+
+            df = load_data('enrolment', data_dir, start='2025-01-11', states=['Odisha', 'Goa'],
+                           columns=['age_0_5'], cache_dir=cache_dir)
+            # Key columns are always read; district and age_5_17 are never parsed
+            self.assertEqual(list(df.columns), ['date', 'state', 'pincode', 'age_0_5'])
+            self.assertEqual(df['age_0_5'].tolist(), [3, 1, 2])
+            self.assertEqual(list(clean_data(df, 'enrolment')['state']), ['Goa', 'Odisha', 'Goa'])
+
+            # The first load recorded the shards' date ranges: January is skipped unread
+            with mock.patch('src.data_loader.read_file', wraps=read_file) as reads:
+                df = load_data('enrolment', data_dir, start='2025-02-01', cache_dir=cache_dir)
+                self.assertEqual(reads.call_count, 1)
+                self.assertEqual(len(df), 3)
+                self.assertIsNone(load_data('enrolment', data_dir, start='2025-03-01', cache_dir=cache_dir))
+                self.assertEqual(reads.call_count, 1)
+
 if __name__ == '__main__':
     unittest.main()
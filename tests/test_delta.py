@@ -0,0 +1,98 @@
+import functools
+import unittest
+import os
+import tempfile
+import pandas as pd
+from src.cube import AggregateCube
+from src.data_loader import load_datasets
+from src.delta import AggregateStore, update_aggregates
+
+class TestAggregateStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_dir = os.path.join(self.tmp.name, 'enrolment')
+        os.makedirs(self.data_dir)
+        self.dirs = {'enrolment': self.data_dir}
+        self.store = AggregateStore(os.path.join(self.tmp.name, 'state'))
+        self.write_shard('part_1.csv', ['01-01-2025', '01-01-2025'], ['A', 'B'], [10, 20])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_shard(self, name, dates, states, counts):
+        pd.DataFrame({'date': dates, 'state': states, 'district': ['D'] * len(dates),
+                      'pincode': [110001] * len(dates), 'age_0_5': counts}) \
+            .to_csv(os.path.join(self.data_dir, name), index=False)
+
+    def update(self):
+        return self.store.update(self.dirs, workers=1, use_cache=False)
+
+    def assert_matches_full_rebuild(self, cube):
+        full = AggregateCube.from_frame(load_datasets(self.dirs, workers=1, use_cache=False)['enrolment'])
+        pd.testing.assert_frame_equal(cube.total('state', rows=True), full.total('state', rows=True),
+                                      check_dtype=False, check_categorical=False)
+        pd.testing.assert_frame_equal(cube.total('date'), full.total('date'), check_dtype=False)
+
+    def test_unchanged_run_is_a_no_op(self):
+        _, changed = self.update()
+        self.assertEqual(changed, {'enrolment'})
+        cubes, changed = self.update()
+        self.assertEqual(changed, set())
+        self.assert_matches_full_rebuild(cubes['enrolment'])
+
+    def test_new_changed_and_removed_shards(self):
+        self.update()
+        self.write_shard('part_2.csv', ['02-01-2025'], ['A'], [5])
+        cubes, changed = self.update()
+        self.assertEqual(changed, {'enrolment'})
+        self.assert_matches_full_rebuild(cubes['enrolment'])
+
+        self.write_shard('part_1.csv', ['01-01-2025'], ['C'], [7])
+        cubes, _ = self.update()
+        self.assert_matches_full_rebuild(cubes['enrolment'])
+
+        os.remove(os.path.join(self.data_dir, 'part_2.csv'))
+        cubes, changed = self.update()
+        self.assertEqual(changed, {'enrolment'})
+        self.assertEqual(list(cubes['enrolment'].query('state')['state']), ['C'])
+
+    def test_changes_stay_pending_until_their_outputs_are_regenerated(self):
+        self.update()
+        self.assertEqual(self.store.pending(), {'enrolment'})
+        # The run that folded the shard failed: the next one has no new shard but still redoes it
+        self.store.update = functools.partial(self.store.update, use_cache=False)
+        _, changed = update_aggregates(self.dirs, workers=1, store=self.store)
+        self.assertEqual(changed, {'enrolment'})
+
+        self.store.clear_pending(changed)
+        _, changed = update_aggregates(self.dirs, workers=1, store=self.store)
+        self.assertEqual(changed, set())
+        self.assertEqual(AggregateStore(self.store.state_dir).pending(), set())
+
+    def test_pending_categories_keep_their_first_changed_date(self):
+        self.update()
+        self.store.clear_pending({'enrolment'})
+        self.write_shard('part_2.csv', ['03-01-2025'], ['A'], [5])
+        self.update()
+        self.assertEqual(self.store.pending_since(), {'enrolment': pd.Timestamp('2025-01-03')})
+        # Not regenerated yet: a later change to an earlier day moves the date back
+        self.write_shard('part_3.csv', ['02-01-2025', '04-01-2025'], ['A', 'B'], [1, 2])
+        self.update()
+        self.assertEqual(self.store.pending_since(), {'enrolment': pd.Timestamp('2025-01-02')})
+
+    def test_stores_sharing_a_state_dir_fold_each_shard_once(self):
+        # A long-lived store (the query service) and a delta run's store over one state dir
+        service = AggregateStore(self.store.state_dir)
+        service.update(self.dirs, workers=1, use_cache=False)
+        self.write_shard('part_2.csv', ['02-01-2025'], ['A'], [5])
+        self.update()
+
+        cubes, changed = service.update(self.dirs, workers=1, use_cache=False)
+        # The run folded the shard: the service reloads the cube instead of adding it again
+        self.assertEqual(changed, {'enrolment'})
+        self.assert_matches_full_rebuild(cubes['enrolment'])
+        _, changed = service.update(self.dirs, workers=1, use_cache=False)
+        self.assertEqual(changed, set())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import os
+import unittest
+import tempfile
+import pandas as pd
+from src.holiday_calendar import HolidayCalendar
+from src.analysis_date_holiday import classify_day_type, state_day_types
+
+class TestHolidayCalendar(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.calendar = HolidayCalendar.load([2025], cache_dir=self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_national_holiday_applies_to_every_state(self):
+        states = pd.Series(['Kerala', 'Bihar', 'Not A State'], dtype='category')
+        dates = pd.to_datetime(['2025-01-26'] * 3)
+        self.assertTrue(self.calendar.is_holiday(states, dates).all())
+        self.assertTrue(self.calendar.is_national(dates).all())
+
+    def test_regular_and_out_of_range_days(self):
+        states = pd.Series(['Kerala', 'Kerala'])
+        dates = pd.to_datetime(['2025-01-27', '2031-01-26'])
+        self.assertFalse(self.calendar.is_holiday(states, dates).any())
+
+    def test_reload_from_disk(self):
+        # Written through a staging file that is renamed into place
+        self.assertEqual([f for f in os.listdir(self.tmp.name) if not f.endswith('.npz')], [])
+        reloaded = HolidayCalendar.load([2025], cache_dir=self.tmp.name)
+        self.assertEqual(reloaded.codes, self.calendar.codes)
+        self.assertTrue((reloaded.mask == self.calendar.mask).all())
+
+    def test_classify_day_type_precedence(self):
+        result = classify_day_type([True, True, False, False], [True, False, True, False])
+        self.assertEqual(list(result), ['Holiday', 'Holiday', 'Weekend', 'Weekday'])
+
+    def test_state_day_types(self):
+        states = ['Kerala', 'Kerala', 'Bihar', 'Kerala']
+        dates = pd.to_datetime(['2025-01-26', '2025-01-25', '2025-01-27', '2025-01-26'])
+        result = state_day_types(states, dates, self.calendar)
+        self.assertEqual(list(result), ['Holiday', 'Weekend', 'Weekday', 'Holiday'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from src.column_store import ColumnStore
+from src.location_index import LocationIndex, build_location_indexes
+
+class TestLocationIndex(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'date': pd.to_datetime(['2025-01-01', '2025-01-02', '2025-01-02', '2025-01-03', '2025-01-03']),
+            'state': pd.Categorical(['Bihar', 'Bihar', 'Maharashtra', 'Maharashtra', 'Bihar']),
+            'district': pd.Categorical(['Aurangabad', 'Aurangabad', 'Aurangabad', 'Pune', 'Patna']),
+            'pincode': [824101, 824101, 431001, 411001, 800001],
+            'age_0_5': [1, 2, 3, 4, 6],
+            'age_5_17': [10, 0, 0, 1, 0],
+        })
+        self.index = LocationIndex.from_frame(self.df)
+
+    def test_csr_layout(self):
+        self.assertEqual(self.index.locations['pincode'].tolist(), [411001, 431001, 800001, 824101])
+        self.assertEqual(self.index.offsets.tolist(), [0, 1, 2, 3, 5])
+        self.assertEqual(len(self.index), 5)
+
+    def test_queries(self):
+        # Aurangabad exists in two states: districts are keyed by (state, district)
+        districts = self.index.totals('district').set_index(['state', 'district'])['Total']
+        self.assertEqual(districts[('Bihar', 'Aurangabad')], 13)
+        self.assertEqual(districts[('Maharashtra', 'Aurangabad')], 3)
+
+        top = self.index.top_k(2, 'pincode')
+        self.assertEqual(top['pincode'].tolist(), [824101, 800001])
+        window = self.index.top_k(1, 'state', start='2025-01-03')
+        self.assertEqual(window[['state', 'Total']].values.tolist(), [['Bihar', 6]])
+
+        in_range = self.index.pincode_range(400000, 499999)
+        self.assertEqual(in_range['pincode'].tolist(), [411001, 431001])
+        self.assertEqual(self.index.series(824101).tolist(), [11, 2])
+        self.assertEqual(self.index.daily('state')['Total'].sum(), self.df[['age_0_5', 'age_5_17']].sum().sum())
+
+    def test_zero_rows_store_no_cells(self):
+        df = self.df.copy()
+        df.loc[len(df)] = [pd.Timestamp('2025-01-04'), 'Bihar', 'Patna', 800001, 0, 0]
+        index = LocationIndex.from_frame(df)
+        self.assertEqual(len(index), len(self.index))
+        self.assertNotIn(pd.Timestamp('2025-01-04'), index.dates)
+
+    def test_stored_dataset_is_indexed_chunk_by_chunk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            stored = ColumnStore(os.path.join(tmp, 'store')).write('enrolment', self.df)
+            # One date per chunk: the cells of the chunks are combined, not the rows
+            index = build_location_indexes({'enrolment': stored}, chunk_rows=1)['enrolment']
+        pd.testing.assert_frame_equal(index.locations, self.index.locations)
+        np.testing.assert_array_equal(index.offsets, self.index.offsets)
+        np.testing.assert_array_equal(index.date_codes, self.index.date_codes)
+        np.testing.assert_array_equal(index.values, self.index.values)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import io
+import subprocess
+import sys
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from src.main import STAGES, build_parser, cli, drop_stages_without_inputs, run, select_stages, stage_categories
+from src.pipeline import Stage
+
+class TestCommandLine(unittest.TestCase):
+    def test_select_stages(self):
+        stages = [Stage(name, print) for name in ['eda_enrolment', 'eda_biometric', 'omi', 'pdf']]
+        self.assertEqual([s.name for s in select_stages(stages, ['eda', 'pdf'])],
+                         ['eda_enrolment', 'eda_biometric', 'pdf'])
+        with self.assertRaises(ValueError):
+            select_stages(stages, ['omi', 'fortune_telling'])
+
+    def test_stage_categories(self):
+        # A run loads what its stages need, all categories if a stage takes any
+        self.assertEqual(stage_categories(['temporal_heatmap', 'date_intelligence']), ['enrolment'])
+        self.assertEqual(stage_categories(['advanced_ml']), ['biometric', 'enrolment'])
+        self.assertEqual(sorted(stage_categories(['omi'])), ['biometric', 'demographic', 'enrolment'])
+        self.assertEqual(sorted(stage_categories(['eda', 'temporal_heatmap'])),
+                         ['biometric', 'demographic', 'enrolment'])
+        self.assertEqual(stage_categories(['eda'], ['demographic']), ['demographic'])
+        # OMI over enrolment alone would chart every state at zero
+        with self.assertRaises(ValueError):
+            stage_categories(['omi'], ['enrolment'])
+        with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            cli(['run', '--stages', 'omi', '--categories', 'enrolment'])
+
+    def test_stages_need_loaded_inputs(self):
+        stages = [Stage(name, print) for name in ['eda_enrolment', 'omi', 'clustering', 'temporal_heatmap']]
+        # An empty biometric folder loads nothing for it, even when it was asked for
+        with redirect_stdout(io.StringIO()):
+            kept = drop_stages_without_inputs(stages, {'enrolment': None, 'demographic': None})
+        self.assertEqual([s.name for s in kept], ['eda_enrolment', 'temporal_heatmap'])
+
+    def test_stages_command(self):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            cli(['stages'])
+        self.assertEqual([line.split()[0] for line in out.getvalue().splitlines()], list(STAGES))
+
+    def test_slice_options(self):
+        args = build_parser().parse_args(['run', '--start', '2025-12-01', '--states', 'Bihar', 'West Bengal'])
+        self.assertEqual((args.start, args.end, args.states), ('2025-12-01', None, ['Bihar', 'West Bengal']))
+        # The delta store folds whole shards into the full history: a slice has no place there
+        with self.assertRaises(ValueError):
+            run(delta=True, states=['Bihar'])
+        # Nor do the anomaly series and clustering centroids carried between full runs
+        with self.assertRaises(ValueError):
+            run(stages=['forecast', 'anomalies'], start='2025-12-01')
+
+    def test_startup_skips_heavy_imports(self):
+        # Listing stages must not pull in the analysis libraries
+        code = ("import sys; from src.main import cli; cli(['stages']); "
+                "print(sorted(m for m in ['pandas', 'sklearn', 'matplotlib', 'seaborn', 'holidays', 'fpdf'] "
+                "if m in sys.modules))")
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.splitlines()[-1], '[]')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from src.cube import build_cubes
+from src.data_loader import load_datasets
+from src.location_index import build_location_indexes
+from src.partitioned import load_partitioned, load_streamed
+
+def write_shard(path, dates, states, counts):
+    pd.DataFrame({'date': dates, 'state': states, 'district': [f'{s} D' for s in states],
+                  'pincode': [560001 + i % 3 for i in range(len(dates))], 'age_0_5': counts,
+                  'age_5_17': 1, 'age_18_greater': 0}).to_csv(path, index=False)
+
+def plain(cube):
+    df = cube.data.reset_index()
+    df['state'] = df['state'].astype(str)
+    df['district'] = df['district'].astype(str)
+    return df
+
+class TestPartitioned(unittest.TestCase):
+    def test_matches_in_memory_path(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            data_dir = os.path.join(tmp, 'enrolment')
+            os.makedirs(data_dir)
+            # Shards overlap in dates and states, and have different categories
+            write_shard(os.path.join(data_dir, 'part_0.csv'), ['02-01-2023', '01-01-2023', '02-01-2023', 'bad'],
+                        ['B', 'A', 'B', 'A'], [1, 2, 3, 4])
+            write_shard(os.path.join(data_dir, 'part_1.csv'), ['02-01-2023', '03-01-2023', '01-01-2023'],
+                        ['C', 'B', 'A'], [5, 300, 7])
+            data_dirs = {'enrolment': data_dir}
+
+            datasets = load_datasets(data_dirs, workers=1, use_cache=False)
+            # The streaming backend folds the same chunks in one process
+            for cubes, indexes in [load_partitioned(data_dirs, workers=1, chunksize=2),
+                                   load_streamed(data_dirs, chunksize=2)]:
+                expected = build_cubes(datasets)['enrolment']
+                pd.testing.assert_frame_equal(plain(cubes['enrolment']), plain(expected), check_dtype=False)
+                self.assertEqual(cubes['enrolment'].rows, 6)
+
+                index = indexes['enrolment']
+                expected = build_location_indexes(datasets)['enrolment']
+                pd.testing.assert_frame_equal(index.locations, expected.locations)
+                np.testing.assert_array_equal(index.values, expected.values)
+                np.testing.assert_array_equal(index.offsets, expected.offsets)
+                pd.testing.assert_frame_equal(index.totals('state'), expected.totals('state'))
+
+    def test_slice_matches_in_memory_slice(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            data_dir = os.path.join(tmp, 'enrolment')
+            os.makedirs(data_dir)
+            write_shard(os.path.join(data_dir, 'part_0.csv'), ['01-01-2023', '02-01-2023', '02-01-2023'],
+                        ['A', 'B', 'C'], [1, 2, 3])
+            write_shard(os.path.join(data_dir, 'part_1.csv'), ['03-01-2023', '01-01-2023'], ['B', 'B'], [4, 5])
+            data_dirs = {'enrolment': data_dir}
+            window = dict(start='2023-01-02', states=['B', 'C'])
+
+            cubes, _ = load_partitioned(data_dirs, workers=1, chunksize=2, **window)
+            datasets = load_datasets(data_dirs, workers=1, use_cache=False, **window)
+        self.assertEqual(sorted(datasets['enrolment']['state'].cat.categories), ['B', 'C'])
+        expected = build_cubes(datasets)['enrolment']
+        pd.testing.assert_frame_equal(plain(cubes['enrolment']), plain(expected), check_dtype=False)
+        self.assertEqual(cubes['enrolment'].rows, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import os
+import tempfile
+from src.pipeline import Stage, run_pipeline, resolve_dependencies
+from src.plotting import FigureRenderer, PlotSpec, submit_figure
+
+def write_file(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+    return text
+
+def concat_files(target, *paths):
+    contents = []
+    for path in paths:
+        with open(path) as f:
+            contents.append(f.read())
+    return write_file(target, '+'.join(contents))
+
+def plot_line(path):
+    submit_figure(PlotSpec('lines', path, series=[dict(x=[0, 1, 2], y=[1, 3, 2], label='y')],
+                           title='Test', legend=True))
+
+class TestPipeline(unittest.TestCase):
+    def make_stages(self, tmp):
+        a, b, report = (os.path.join(tmp, name) for name in ['a.txt', 'b.txt', 'report.txt'])
+        # Declared out of order on purpose: the scheduler must wait for a and b
+        return [
+            Stage('report', concat_files, (report, a, b), requires=[a, b], produces=[report]),
+            Stage('a', write_file, (a, 'A'), produces=[a]),
+            Stage('b', write_file, (b, 'B'), produces=[b]),
+        ]
+
+    def test_dependencies(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            deps = resolve_dependencies(self.make_stages(tmp))
+        self.assertEqual(deps, {'report': {'a', 'b'}, 'a': set(), 'b': set()})
+
+    def test_serial_and_parallel_runs(self):
+        for workers in [1, 2]:
+            with tempfile.TemporaryDirectory() as tmp:
+                results = run_pipeline(self.make_stages(tmp), workers=workers)
+            self.assertEqual(results['report'], 'A+B')
+
+    def test_stage_waits_for_figures(self):
+        for workers in [1, 2]:
+            with tempfile.TemporaryDirectory() as tmp, FigureRenderer(workers=workers) as renderer:
+                png = os.path.join(tmp, 'figures', 'line.png')
+                stages = [Stage('check', os.path.exists, (png,), requires=[png]),
+                          Stage('plot', plot_line, (png,), produces=[png])]
+                results = run_pipeline(stages, workers=workers, renderer=renderer)
+            # The figure is rendered outside the stage, but before its dependents start
+            self.assertTrue(results['check'])
+
+    def test_function_reference_is_imported_by_the_stage(self):
+        for workers in [1, 2]:
+            with tempfile.TemporaryDirectory() as tmp:
+                target = os.path.join(tmp, 'a.txt')
+                stages = [Stage('a', 'tests.test_pipeline:write_file', (target, 'A'), produces=[target])]
+                results = run_pipeline(stages, workers=workers)
+            self.assertEqual(results['a'], 'A')
+
+    def test_cycle_is_reported(self):
+        stages = [Stage('x', write_file, requires=['y.txt'], produces=['x.txt']),
+                  Stage('y', write_file, requires=['x.txt'], produces=['y.txt'])]
+        with self.assertRaises(RuntimeError):
+            run_pipeline(stages, workers=1)
+
+if __name__ == '__main__':
+    unittest.main()
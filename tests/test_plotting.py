@@ -0,0 +1,44 @@
+import unittest
+import os
+import tempfile
+import pandas as pd
+from src.plotting import FigureRenderer, PlotSpec, spec_key
+
+def bar_spec(path, values):
+    data = pd.DataFrame({'state': ['A', 'B', 'C'], 'Total': values})
+    return PlotSpec('barplot', path, data=data, x='Total', y='state', title='Top States', x_formatter=True)
+
+class TestFigureCache(unittest.TestCase):
+    def test_spec_key(self):
+        self.assertEqual(spec_key(bar_spec('a.png', [3, 2, 1])), spec_key(bar_spec('a.png', [3, 2, 1])))
+        self.assertNotEqual(spec_key(bar_spec('a.png', [3, 2, 1])), spec_key(bar_spec('a.png', [3, 2, 0])))
+
+    def test_unchanged_figures_are_skipped(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'top_states.png')
+            with FigureRenderer(workers=1) as renderer:
+                renderer.submit(bar_spec(path, [3, 2, 1])).result()
+            self.assertTrue(os.path.exists(path))
+            mtime = os.stat(path).st_mtime_ns
+
+            # Same data in a new run: served from the manifest
+            with FigureRenderer(workers=1) as renderer:
+                renderer.submit(bar_spec(path, [3, 2, 1])).result()
+            self.assertEqual((renderer.rendered, renderer.skipped), (0, 1))
+            self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+
+            # Changed data (or a missing file) is redrawn
+            with FigureRenderer(workers=1) as renderer:
+                renderer.submit(bar_spec(path, [3, 2, 5])).result()
+                os.remove(path)
+                renderer.submit(bar_spec(path, [3, 2, 5])).result()
+            self.assertEqual((renderer.rendered, renderer.skipped), (2, 0))
+            self.assertTrue(os.path.exists(path))
+
+class TestIndianFormatter(unittest.TestCase):
+    def test_formatter_stays_importable_from_utils(self):
+        from src.utils import indian_formatter
+        self.assertEqual([indian_formatter(x) for x in [950, 2.5e5, 3e7]], ['950', '2.5 L', '3.0 Cr'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import os
+import json
+import tempfile
+import numpy as np
+import pandas as pd
+from src.pipeline import Stage, run_pipeline
+from src.profiling import Profiler, activate, reset_peak_rss, track
+
+def square(x):
+    return x * x
+
+class TestProfiling(unittest.TestCase):
+    def test_records_and_run_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            profiler = Profiler(dump_dir=os.path.join(tmp, 'profiles'))
+            with activate(profiler):
+                with track('sum', kind='load') as record:
+                    record['rows'] = len(range(1000))
+                    sum(range(1000))
+                run_pipeline([Stage('square', square, (3,), rows=1)], workers=1)
+
+            names = [(r['kind'], r['name']) for r in profiler.records]
+            self.assertEqual(names, [('load', 'sum'), ('stage', 'square')])
+            for record in profiler.records:
+                self.assertGreaterEqual(record['wall_s'], 0)
+                self.assertGreaterEqual(record['cpu_s'], 0)
+            self.assertEqual(profiler.records[0]['rows'], 1000)
+            self.assertTrue(os.path.exists(os.path.join(tmp, 'profiles', 'stage_square.prof')))
+
+            # JSON holds the latest run, CSV accumulates every run
+            profiler.write(tmp)
+            profiler.write(tmp)
+            with open(os.path.join(tmp, 'run_profile.json')) as f:
+                self.assertEqual(len(json.load(f)['records']), 2)
+            self.assertEqual(len(pd.read_csv(os.path.join(tmp, 'run_profile.csv'))), 4)
+
+    @unittest.skipUnless(reset_peak_rss(), "peak RSS cannot be reset on this platform")
+    def test_memory_is_measured_per_step(self):
+        profiler = Profiler()
+        with activate(profiler):
+            with track('outer'):
+                with track('large'):
+                    np.ones(200 * 2 ** 17).sum()   # 200 MB
+                with track('small'):
+                    np.ones(20 * 2 ** 17).sum()    # 20 MB
+        memory = {r['name']: r['added_rss_mb'] for r in profiler.records}
+        # The small step does not inherit the peak of the large one before it
+        self.assertGreater(memory['large'], 150)
+        self.assertLess(memory['small'], 100)
+        # The enclosing step sees the peak of its nested steps
+        self.assertGreaterEqual(memory['outer'], memory['large'])
+
+    def test_history_header_is_upgraded(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            pd.DataFrame({'run_id': ['old'], 'name': ['load'], 'wall_s': [1.0]}) \
+                .to_csv(os.path.join(tmp, 'run_profile.csv'), index=False)
+            profiler = Profiler()
+            with profiler.stage('new'):
+                pass
+            profiler.write(tmp)
+            history = pd.read_csv(os.path.join(tmp, 'run_profile.csv'))
+        self.assertEqual(history['name'].tolist(), ['load', 'new'])
+        self.assertIn('added_rss_mb', history.columns)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import functools
+import json
+import os
+import tempfile
+import threading
+import unittest
+from urllib.error import HTTPError
+from urllib.request import urlopen
+import pandas as pd
+from src.delta import AggregateStore
+from src.query_service import LRUCache, QueryError, QueryService, make_server
+
+class TestQueryService(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dirs = {}
+        for category in ['enrolment', 'biometric']:
+            self.dirs[category] = os.path.join(self.tmp.name, category)
+            os.makedirs(self.dirs[category])
+        # 2025-01-06 is a Monday
+        self.write_shard('enrolment', 'part_1.csv', ['06-01-2025', '06-01-2025', '07-01-2025'],
+                         ['Assam', 'Bihar', 'Assam'], [10, 20, 30])
+        self.write_shard('biometric', 'part_1.csv', ['06-01-2025', '07-01-2025'], ['Assam', 'Bihar'], [30, 60])
+        store = AggregateStore(os.path.join(self.tmp.name, 'state'))
+        store.update = functools.partial(store.update, workers=1, use_cache=False)
+        self.service = QueryService(self.dirs, cache_size=4, store=store)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_shard(self, category, name, dates, states, counts):
+        col = 'age_0_5' if category == 'enrolment' else 'bio_age_5_17'
+        pd.DataFrame({'date': dates, 'state': states, 'district': ['D'] * len(dates),
+                      'pincode': [110001] * len(dates), col: counts}) \
+            .to_csv(os.path.join(self.dirs[category], name), index=False)
+
+    def query(self, endpoint, **params):
+        return json.loads(self.service.query(endpoint, {k: [v] for k, v in params.items()}))
+
+    def test_endpoints(self):
+        stats = self.query('state_stats', category='enrolment')['rows']
+        self.assertEqual({row['state']: row['Total'] for row in stats}, {'Assam': 40, 'Bihar': 20})
+
+        totals = self.query('totals', category='enrolment', by='state,day_name', state='Assam', end='2025-01-06')
+        self.assertEqual(totals['rows'], [{'state': 'Assam', 'day_name': 'Monday', 'age_0_5': 10, 'Total': 10}])
+
+        omi = {row['state']: row['OMI'] for row in self.query('omi')['rows']}
+        self.assertAlmostEqual(omi['Assam'], 30 / 70)
+        self.assertAlmostEqual(omi['Bihar'], 60 / 80)
+
+        pmr = self.query('pmr', category='enrolment', state='Assam,Bihar')
+        # Region: Monday 30, Tuesday 30, other weekdays 0 -> max / mean = 30 / (60 / 7)
+        self.assertAlmostEqual(pmr['region'], 3.5)
+        self.assertEqual(set(pmr['states']), {'Assam', 'Bihar'})
+        self.assertIn('Server Load', self.query('server_load', category='enrolment')['insights'])
+
+        for endpoint, params, status in [('totals', {'category': 'enrolment', 'by': 'fortnight'}, 400),
+                                         ('totals', {'category': 'demographic'}, 404),
+                                         ('pmr', {'category': 'enrolment', 'state': 'Goa'}, 404),
+                                         ('nowhere', {}, 404)]:
+            with self.assertRaises(QueryError) as raised:
+                self.query(endpoint, **params)
+            self.assertEqual(raised.exception.status, status)
+
+    def test_results_are_cached_until_the_data_changes(self):
+        self.query('state_stats', category='enrolment')
+        self.query('state_stats', category='enrolment')
+        self.assertEqual((self.service.cache.hits, self.service.cache.misses), (1, 1))
+        self.assertEqual(self.service.refresh(), set())
+
+        self.write_shard('enrolment', 'part_2.csv', ['08-01-2025'], ['Bihar'], [5])
+        self.assertEqual(self.service.refresh(), {'enrolment'})
+        self.assertEqual(len(self.service.cache), 0)
+        stats = self.query('state_stats', category='enrolment')['rows']
+        self.assertEqual({row['state']: row['Total'] for row in stats}, {'Assam': 40, 'Bihar': 25})
+
+    def test_http_round_trip(self):
+        server = make_server(self.service, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_address[1]}'
+        try:
+            with urlopen(f'{url}/totals?category=biometric&by=state') as response:
+                rows = json.loads(response.read())['rows']
+            self.assertEqual([row['Total'] for row in rows], [30, 60])
+            with self.assertRaises(HTTPError) as raised:
+                urlopen(f'{url}/totals?category=biometric&start=soon')
+            self.assertEqual(raised.exception.code, 400)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c'), len(cache)), (1, 3, 2))
+
+if __name__ == '__main__':
+    unittest.main()
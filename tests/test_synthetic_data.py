@@ -0,0 +1,28 @@
+import unittest
+import tempfile
+import pandas as pd
+from src.data_loader import load_clean_data
+from src.synthetic_data import SyntheticGenerator, generate_datasets
+
+class TestSyntheticData(unittest.TestCase):
+    def test_schema_and_effects(self):
+        df = SyntheticGenerator(seed=1).sample('enrolment', 50_000)
+        self.assertEqual(list(df.columns),
+                         ['date', 'state', 'district', 'pincode', 'age_0_5', 'age_5_17', 'age_18_greater'])
+
+        # Population skew and quiet Sundays
+        states = df['state'].value_counts()
+        self.assertEqual(states.index[0], 'Uttar Pradesh')
+        self.assertGreater(states['Uttar Pradesh'], 50 * states.get('Lakshadweep', 1))
+        days = pd.to_datetime(df['date'], format='%d-%m-%Y').dt.dayofweek.value_counts()
+        self.assertLess(days[6], days[0] / 2)
+
+    def test_shards_load_like_real_data(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            data_dirs = generate_datasets(2_500, tmp, categories=['demographic'], shard_rows=1_000)
+            df = load_clean_data('demographic', data_dirs['demographic'], use_cache=False)
+        self.assertEqual(len(df), 2_500)
+        self.assertTrue(df['date'].is_monotonic_increasing)
+
+if __name__ == '__main__':
+    unittest.main()